@@ -0,0 +1,251 @@
+import abc
+import json
+import math
+import os
+import random
+import re
+import threading
+import time
+import zlib
+
+from google.api_core import exceptions as google_exceptions
+
+
+class AIBackend(abc.ABC):
+    """Text generation backend used by AIService.
+
+    ``operation`` names the AIService call being served ('generate_quiz',
+    'generate_study_guide', 'score_essay' or 'daily_quote'), which lets a
+    backend route or simulate calls without parsing the prompt.
+    """
+
+    name = 'base'
+
+    @abc.abstractmethod
+    def generate(self, operation, prompt, temperature=None):
+        """Return the complete response text for ``prompt``."""
+
+    def stream(self, operation, prompt, temperature=None):
+        """Yield the response text in pieces as it is produced.
+
+        Backends without a streaming API yield the whole response at once.
+        """
+        yield self.generate(operation, prompt, temperature=temperature)
+
+
+class GeminiBackend(AIBackend):
+    name = 'gemini'
+
+    def __init__(self, api_key=None, model_name='gemini-2.0-flash-exp'):
+        import google.generativeai as genai
+
+        api_key = api_key or os.getenv("GEMINI_API_KEY")
+        if not api_key:
+            raise ValueError("GEMINI_API_KEY environment variable is required")
+        self._genai = genai
+        genai.configure(api_key=api_key)
+        self.model = genai.GenerativeModel(model_name)
+
+    def generate(self, operation, prompt, temperature=None):
+        kwargs = {}
+        if temperature is not None:
+            kwargs['generation_config'] = self._genai.types.GenerationConfig(temperature=temperature)
+        return self.model.generate_content(prompt, **kwargs).text
+
+    def stream(self, operation, prompt, temperature=None):
+        kwargs = {}
+        if temperature is not None:
+            kwargs['generation_config'] = self._genai.types.GenerationConfig(temperature=temperature)
+        for chunk in self.model.generate_content(prompt, stream=True, **kwargs):
+            if chunk.text:
+                yield chunk.text
+
+
+# Characters per streamed piece from the fake backend
+STREAM_PIECE_SIZE = 48
+
+# Median latency in seconds per operation, roughly what Gemini Flash takes
+FAKE_MEDIAN_LATENCY = {
+    'generate_quiz': 8.0,
+    'generate_study_guide': 10.0,
+    'score_essay': 2.0,
+    'daily_quote': 0.5,
+}
+
+_WORD_RE = re.compile(r"[A-Za-z][A-Za-z\-]{3,}")
+_MATERIAL_RE = re.compile(r"(?:MATERIAL CONTENT:|course materials:)(.*?)(?:CONTEXT:|Context:|\*\*Please)", re.S)
+_STOPWORDS = {
+    'that', 'this', 'with', 'from', 'have', 'will', 'your', 'which', 'their', 'there',
+    'about', 'would', 'these', 'other', 'into', 'more', 'some', 'such', 'only', 'than',
+    'also', 'based', 'provided', 'material', 'materials', 'content', 'course', 'question',
+    'questions', 'answer', 'json', 'array', 'format', 'must', 'should', 'create', 'return',
+}
+
+
+class FakeBackend(AIBackend):
+    """Deterministic local backend for tests and load testing.
+
+    Responses match the JSON and HTML shapes the real prompts ask for and
+    are derived from the prompt text, so the same prompt always produces the
+    same output. Latency is drawn from a log-normal distribution around the
+    per-operation medians above, multiplied by ``latency_scale``; with
+    ``error_rate`` set, that fraction of calls raises ResourceExhausted like a
+    throttled provider would.
+    """
+
+    name = 'fake'
+
+    def __init__(self, latency_scale=1.0, latency_sigma=0.35, error_rate=0.0, seed=0,
+                 sleep=time.sleep):
+        self.latency_scale = latency_scale
+        self.latency_sigma = latency_sigma
+        self.error_rate = error_rate
+        self.seed = seed
+        self.sleep = sleep
+        self._rng = random.Random(seed)
+        self._rng_lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            latency_scale=float(os.getenv('AI_FAKE_LATENCY_SCALE', '1.0')),
+            latency_sigma=float(os.getenv('AI_FAKE_LATENCY_SIGMA', '0.35')),
+            error_rate=float(os.getenv('AI_FAKE_ERROR_RATE', '0')),
+            seed=int(os.getenv('AI_FAKE_SEED', '0')),
+        )
+
+    def latency(self, operation):
+        median = FAKE_MEDIAN_LATENCY.get(operation, 1.0) * self.latency_scale
+        if median <= 0:
+            return 0.0
+        with self._rng_lock:
+            return median * math.exp(self._rng.gauss(0, self.latency_sigma))
+
+    def _should_fail(self):
+        if self.error_rate <= 0:
+            return False
+        with self._rng_lock:
+            return self._rng.random() < self.error_rate
+
+    def generate(self, operation, prompt, temperature=None):
+        self.sleep(self.latency(operation))
+        if self._should_fail():
+            raise google_exceptions.ResourceExhausted('Simulated quota exhaustion')
+        return self._respond(operation, prompt)
+
+    def stream(self, operation, prompt, temperature=None):
+        """Yield the response in small pieces, spreading the latency across them.
+
+        The first piece arrives after a tenth of the simulated latency, like
+        the time-to-first-token of a streaming provider.
+        """
+        total = self.latency(operation)
+        self.sleep(total * 0.1)
+        if self._should_fail():
+            raise google_exceptions.ResourceExhausted('Simulated quota exhaustion')
+        text = self._respond(operation, prompt)
+        pieces = [text[i:i + STREAM_PIECE_SIZE] for i in range(0, len(text), STREAM_PIECE_SIZE)]
+        for index, piece in enumerate(pieces):
+            if index:
+                self.sleep(total * 0.9 / len(pieces))
+            yield piece
+
+    def _respond(self, operation, prompt):
+        rng = random.Random(zlib.crc32(prompt.encode('utf-8')) ^ self.seed)
+        if operation == 'generate_quiz':
+            return self._quiz(prompt, rng)
+        if operation == 'generate_study_guide':
+            return self._study_guide(prompt, rng)
+        if operation == 'score_essay':
+            return self._essay_score(prompt)
+        return "Programs must be written for people to read, and only incidentally for machines to execute."
+
+    @staticmethod
+    def _terms(prompt, rng, count):
+        # Draw terms from the embedded course material, not the instructions around it
+        match = _MATERIAL_RE.search(prompt)
+        words = []
+        for word in _WORD_RE.findall(match.group(1) if match else prompt):
+            lowered = word.lower()
+            if lowered not in _STOPWORDS and lowered not in words:
+                words.append(lowered)
+        if not words:
+            words = ['concept']
+        return [words[rng.randrange(len(words))] for _ in range(count)]
+
+    def _quiz(self, prompt, rng):
+        if 'multiple choice' in prompt:
+            quiz_type, default_count = 'mcq', 20
+        elif 'true/false' in prompt:
+            quiz_type, default_count = 'true_false', 20
+        else:
+            quiz_type, default_count = 'essay', 3
+        match = re.search(r"[Cc]reate (\d+)", prompt)
+        count = int(match.group(1)) if match else default_count
+
+        questions = []
+        for term in self._terms(prompt, rng, count):
+            if quiz_type == 'mcq':
+                correct = rng.choice('ABCD')
+                questions.append({
+                    'question': f"Which statement best applies the idea of '{term}' from the material?",
+                    'options': [f"{letter}) Interpretation {letter} of {term}" for letter in 'ABCD'],
+                    'correct_answer': correct,
+                    'explanation': f"Option {correct} follows from how the material uses '{term}'.",
+                })
+            elif quiz_type == 'true_false':
+                answer = rng.choice(['True', 'False'])
+                questions.append({
+                    'question': f"The material implies that '{term}' is central to the topic.",
+                    'correct_answer': answer,
+                    'explanation': f"The material supports '{answer}' for this statement about '{term}'.",
+                })
+            else:
+                questions.append({
+                    'question': f"Analyse the role of '{term}' in the material and evaluate its consequences.",
+                    'key_points': [f"Define {term}", f"Relate {term} to the main topic", "Give an example"],
+                    'suggested_length': '3-4 paragraphs',
+                })
+        return json.dumps(questions, indent=2)
+
+    def _study_guide(self, prompt, rng):
+        terms = self._terms(prompt, rng, 8)
+        concepts = ''.join(f"<li><strong>{t.title()}</strong>: as described in the material.</li>" for t in terms[:4])
+        topics = ''.join(f"<li>How {t} relates to the other topics</li>" for t in terms[4:])
+        review = ''.join(f"<li>Explain {t} in your own words.</li>" for t in terms[:3])
+        return (
+            "<h2>Key Concepts and Definitions</h2>"
+            f"<ul>{concepts}</ul>"
+            "<h2>Important Topics Summary</h2>"
+            f"<ul>{topics}</ul>"
+            "<h2>Learning Objectives</h2>"
+            "<ul><li>Recall the key terms</li><li>Apply them to new problems</li></ul>"
+            "<h2>Review Questions for Self-Assessment</h2>"
+            f"<ol>{review}</ol>"
+        )
+
+    @staticmethod
+    def _essay_score(prompt):
+        match = re.search(r"Student's answer:(.*?)IMPORTANT:", prompt, re.S)
+        answer = match.group(1).strip() if match else ''
+        score = min(95, 20 + len(answer.split()) // 2)
+        return json.dumps({
+            'score': score,
+            'feedback': f"Simulated feedback for a {len(answer.split())}-word answer.",
+        })
+
+
+BACKENDS = {
+    'gemini': GeminiBackend,
+    'fake': FakeBackend.from_env,
+}
+
+
+def create_backend(name=None):
+    """Build the backend named by ``name`` or the AI_BACKEND environment variable."""
+    name = (name or os.getenv('AI_BACKEND') or 'gemini').lower()
+    try:
+        factory = BACKENDS[name]
+    except KeyError:
+        raise ValueError(f"Unknown AI backend: {name}")
+    return factory()
@@ -1,24 +1,29 @@
-import os
 import json
-import google.generativeai as genai
-from typing import List, Dict, Tuple
+from typing import List, Dict, Tuple, Iterator
 import logging
+import threading
 from simple_vector import SimpleVectorSearch
+from ai_backends import AIBackend, create_backend
+from json_stream import JSONArrayParser, parse_array
+import rate_limiter
+import scoring
 
 class AIService:
-    def __init__(self):
-        self.api_key = os.getenv("GEMINI_API_KEY")
-        if not self.api_key:
-            raise ValueError("GEMINI_API_KEY environment variable is required")
-        
-        # Configure Google Generative AI with the API key
-        genai.configure(api_key=self.api_key)
-        self.model = genai.GenerativeModel('gemini-2.0-flash-exp')
+    def __init__(self, backend: AIBackend = None):
+        # AI_BACKEND selects the implementation; 'gemini' requires GEMINI_API_KEY
+        self.backend = backend or create_backend()
         self.vector_search = SimpleVectorSearch()
+
+    def _generate(self, operation: str, prompt: str, temperature: float = None) -> str:
+        """Call the backend through the shared rate limiter and return the response text"""
+        return rate_limiter.call(operation, lambda: self.backend.generate(operation, prompt, temperature=temperature))
     
-    def generate_study_guide(self, content: str, subject: str) -> str:
-        """Generate a comprehensive study guide from the provided content"""
-        prompt = f"""
+    def _stream(self, operation: str, prompt: str, temperature: float = None) -> Iterator[str]:
+        """Stream the backend response through the shared rate limiter"""
+        return rate_limiter.stream(operation, lambda: self.backend.stream(operation, prompt, temperature=temperature))
+
+    def _study_guide_prompt(self, content: str, subject: str) -> str:
+        return f"""
         You are an AI tutor that ONLY uses the provided course materials. Do NOT use any external knowledge.
 
         Create a comprehensive study guide for "{subject}" based STRICTLY on the following uploaded course materials:
@@ -39,16 +44,24 @@ class AIService:
 
         **Return ONLY the HTML, with no extra commentary or markdown.**
         """
-        
+
+    def generate_study_guide(self, content: str, subject: str) -> str:
+        """Generate a comprehensive study guide from the provided content"""
+        prompt = self._study_guide_prompt(content, subject)
         try:
-            response = self.model.generate_content(prompt)
-            return response.text
+            return self._generate('generate_study_guide', prompt)
+        except Exception as e:
+            raise Exception(f"Error generating study guide: {str(e)}")
+
+    def stream_study_guide(self, content: str, subject: str) -> Iterator[str]:
+        """Yield the study guide HTML in pieces as the model produces it"""
+        prompt = self._study_guide_prompt(content, subject)
+        try:
+            yield from self._stream('generate_study_guide', prompt)
         except Exception as e:
             raise Exception(f"Error generating study guide: {str(e)}")
     
-    def generate_quiz(self, content: str, quiz_type: str, context: str = "") -> List[Dict]:
-        """Generate quiz questions based on content and type"""
-        
+    def _quiz_prompt(self, content: str, quiz_type: str, context: str = "") -> str:
         if quiz_type == "mcq":
             prompt = f"""
             Create 20 higher-order thinking multiple choice questions based on the provided course material.
@@ -124,12 +137,17 @@ class AIService:
         
         else:
             raise ValueError(f"Unsupported quiz type: {quiz_type}")
+        return prompt
+
+    def generate_quiz(self, content: str, quiz_type: str, context: str = "") -> List[Dict]:
+        """Generate quiz questions based on content and type"""
+        prompt = self._quiz_prompt(content, quiz_type, context)
         
         try:
-            response = self.model.generate_content(prompt)
+            response = self._generate('generate_quiz', prompt)
             
             # Extract JSON from response
-            response_text = response.text.strip()
+            response_text = response.strip()
             
             # Clean up response text
             if response_text.startswith('```json'):
@@ -150,66 +168,58 @@ class AIService:
             return questions
         
         except json.JSONDecodeError as e:
-            logging.error(f"JSON parse error. Response was: {response.text[:500]}...")
+            # Keep whatever complete questions arrived before the response broke off
+            questions, _ = parse_array(response)
+            questions = [q for q in questions if self._is_valid_question(q, quiz_type)]
+            if questions:
+                logging.warning(f"Quiz response was truncated; kept {len(questions)} complete questions")
+                return questions
+            logging.error(f"JSON parse error. Response was: {response[:500]}...")
             raise Exception(f"AI response format error - please try generating the quiz again")
         except Exception as e:
             logging.error(f"Quiz generation error: {str(e)}")
             raise Exception(f"Error generating quiz: {str(e)}")
+
+    @staticmethod
+    def _is_valid_question(question: Dict, quiz_type: str) -> bool:
+        """Check that a generated question has the fields the quiz page needs"""
+        if not isinstance(question.get('question'), str):
+            return False
+        if quiz_type == "mcq":
+            return isinstance(question.get('options'), list) and bool(question.get('correct_answer'))
+        if quiz_type == "true_false":
+            return question.get('correct_answer') in ("True", "False")
+        return True
+
+    def stream_quiz(self, content: str, quiz_type: str, context: str = "") -> Iterator[Dict]:
+        """Yield quiz questions one at a time as the model finishes writing each.
+
+        If the stream breaks off, the questions already yielded stand; the
+        error is raised afterwards so the caller can decide whether to keep them.
+        """
+        prompt = self._quiz_prompt(content, quiz_type, context)
+        parser = JSONArrayParser()
+        try:
+            for piece in self._stream('generate_quiz', prompt):
+                for question in parser.feed(piece):
+                    if self._is_valid_question(question, quiz_type):
+                        yield question
+        except Exception as e:
+            logging.error(f"Quiz stream error: {str(e)}")
+            raise Exception(f"Error generating quiz: {str(e)}")
+        if parser.truncated:
+            logging.warning("Quiz stream ended before the question array was closed")
     
     def score_quiz(self, questions: List[Dict], answers: List[str], quiz_type: str) -> Tuple[float, List[Dict]]:
         """Score a quiz and provide feedback"""
         
-        if quiz_type == "mcq":
-            return self._score_mcq(questions, answers)
-        elif quiz_type == "true_false":
-            return self._score_true_false(questions, answers)
+        if quiz_type in scoring.OBJECTIVE_TYPES:
+            return scoring.AnswerKey(questions).score(answers)
         elif quiz_type == "essay":
             return self._score_essay(questions, answers)
         else:
             raise ValueError(f"Unsupported quiz type: {quiz_type}")
     
-    def _score_mcq(self, questions: List[Dict], answers: List[str]) -> Tuple[float, List[Dict]]:
-        """Score multiple choice questions"""
-        correct_count = 0
-        feedback = []
-        
-        for i, (question, answer) in enumerate(zip(questions, answers)):
-            is_correct = answer == question.get('correct_answer')
-            if is_correct:
-                correct_count += 1
-            
-            feedback.append({
-                'question_index': i,
-                'is_correct': is_correct,
-                'correct_answer': question.get('correct_answer'),
-                'explanation': question.get('explanation', ''),
-                'user_answer': answer
-            })
-        
-        score = (correct_count / len(questions)) * 100 if questions else 0
-        return score, feedback
-    
-    def _score_true_false(self, questions: List[Dict], answers: List[str]) -> Tuple[float, List[Dict]]:
-        """Score true/false questions"""
-        correct_count = 0
-        feedback = []
-        
-        for i, (question, answer) in enumerate(zip(questions, answers)):
-            is_correct = answer == question.get('correct_answer')
-            if is_correct:
-                correct_count += 1
-            
-            feedback.append({
-                'question_index': i,
-                'is_correct': is_correct,
-                'correct_answer': question.get('correct_answer'),
-                'explanation': question.get('explanation', ''),
-                'user_answer': answer
-            })
-        
-        score = (correct_count / len(questions)) * 100 if questions else 0
-        return score, feedback
-    
     def _score_essay(self, questions: List[Dict], answers: List[str]) -> Tuple[float, List[Dict]]:
         """Score essay questions using AI"""
         feedback = []
@@ -245,8 +255,8 @@ class AIService:
                 """
                 
                 try:
-                    response = self.model.generate_content(prompt)
-                    result = json.loads(response.text)
+                    response = self._generate('score_essay', prompt)
+                    result = json.loads(response)
                     score = result.get('score', 0)
                     ai_feedback = result.get('feedback', 'Unable to generate feedback.')
                 except:
@@ -282,8 +292,32 @@ class AIService:
             "sentences."
         )
         try:
-            config = genai.types.GenerationConfig(temperature=0.8)
-            response = self.model.generate_content(prompt, generation_config=config)
-            return response.text.strip()
+            response = self._generate('daily_quote', prompt, temperature=0.8)
+            return response.strip()
         except Exception as e:
             raise Exception(f"Error getting daily quote: {str(e)}")
+
+
+_service = None
+_service_lock = threading.Lock()
+
+
+def get_service() -> AIService:
+    """Return the process-wide service, built on first use rather than at import.
+
+    Building it configures the provider client, so workers only pay for
+    that once they actually generate something.
+    """
+    global _service
+    with _service_lock:
+        if _service is None:
+            _service = AIService()
+    return _service
+
+
+def set_service(service: AIService) -> AIService:
+    """Replace the process-wide service, returning the previous one."""
+    global _service
+    with _service_lock:
+        previous, _service = _service, service
+    return previous
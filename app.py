@@ -14,15 +14,16 @@ from werkzeug.middleware.proxy_fix import ProxyFix
 from datetime import date
 from markupsafe import Markup
 import markdown
-import bleach
-import re
 # from flask_moment import Moment # Removed: Not using Flask-Moment
 
 logging.debug(f"Markdown module imported: {markdown is not None}")
 
 from extensions import db, Base # Import db and Base from new extensions.py
 
-from ai_service import AIService
+import ai_service
+from fragment_cache import FragmentCacheExtension
+import identity
+import sanitize
 # Configure logging
 logging.basicConfig(level=logging.DEBUG)
 
@@ -30,73 +31,138 @@ logging.basicConfig(level=logging.DEBUG)
 # db = SQLAlchemy(model_class=Base) # Removed - now in extensions.py
 login_manager = LoginManager()
 csrf = CSRFProtect()
+migrate = Migrate()
 # moment = Moment() # Removed: Not using Flask-Moment
 # markdown = Markdown() # Removed: Using custom markdown filter
 
-# Create the Flask app
-app = Flask(__name__)
-app.secret_key = os.getenv("SESSION_SECRET", "dev-secret-key")
-app.wsgi_app = ProxyFix(app.wsgi_app, x_proto=1, x_host=1)
-
-# Add chr function to Jinja2 globals
-app.jinja_env.globals['chr'] = chr
-
-# Allowed HTML tags and attributes for sanitized markdown
-ALLOWED_TAGS = [
-    'p', 'br', 'div', 'span', 'a', 'ul', 'ol', 'li',
-    'strong', 'em', 'b', 'i', 'u', 'blockquote', 'code', 'pre',
-    'h1', 'h2', 'h3', 'h4', 'h5', 'h6',
-    'table', 'thead', 'tbody', 'tr', 'th', 'td',
-    'img', 'hr'
-]
-ALLOWED_ATTRS = {
-    '*': ['class', 'id', 'style', re.compile(r'^data-.*$')],
-    'a': ['href', 'title'],
-    'img': ['src', 'alt', 'title'],
-    'th': ['colspan', 'rowspan', 'style'],
-    'td': ['colspan', 'rowspan', 'style'],
-    'table': ['style', 'border', 'cellpadding', 'cellspacing']
-}
-
-# Register custom markdown filter
-def markdown_filter(text):
-    html = markdown.markdown(text)
-    cleaned = bleach.clean(html, tags=ALLOWED_TAGS, attributes=ALLOWED_ATTRS)
-    return Markup(cleaned)
-app.jinja_env.filters['markdown'] = markdown_filter
-
-# Configure the database
-database_url = os.getenv("DATABASE_URL")
-
-# Added safeguard: If the env var contains '=', take the part after it.
-# This handles cases where load_dotenv might not parse correctly.
-if database_url and '=' in database_url:
-    database_url = database_url.split('=', 1)[1]
-
-if database_url and database_url.startswith("postgres://"):
-    database_url = database_url.replace("postgres://", "postgresql://", 1)
-
-app.config["SQLALCHEMY_DATABASE_URI"] = database_url or "sqlite:///classroom.db"
-app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
-    "pool_recycle": 300,
-    "pool_pre_ping": True,
-}
-app.config["UPLOAD_FOLDER"] = "uploads"
-app.config["MAX_CONTENT_LENGTH"] = 16 * 1024 * 1024  # 16MB max file size
-
-# Initialize Flask extensions
-db.init_app(app)
-migrate = Migrate(app, db)
-login_manager.init_app(app)
-csrf.init_app(app)
-# moment.init_app(app) # Removed: Not using Flask-Moment
-# markdown.init_app(app) # Removed: Using custom markdown filter
-
 login_manager.login_view = 'auth_login'
 login_manager.login_message = 'Please log in to access this page.'
 login_manager.login_message_category = 'info'
 
-@app.context_processor
+
+# Register custom markdown filter. Pass the stored HTML rendering, when the
+# model keeps one, to skip rendering: {{ text | markdown(text_html) }}
+def markdown_filter(text, rendered=None):
+    if rendered:
+        return Markup(rendered)
+    return Markup(sanitize.render_markdown(text or ''))
+
+
+def _database_url():
+    database_url = os.getenv("DATABASE_URL")
+
+    # Added safeguard: If the env var contains '=', take the part after it.
+    # This handles cases where load_dotenv might not parse correctly.
+    if database_url and '=' in database_url:
+        database_url = database_url.split('=', 1)[1]
+
+    if database_url and database_url.startswith("postgres://"):
+        database_url = database_url.replace("postgres://", "postgresql://", 1)
+
+    return database_url or "sqlite:///classroom.db"
+
+
+def _configure(app):
+    """Load the settings from the environment."""
+    app.secret_key = os.getenv("SESSION_SECRET", "dev-secret-key")
+    app.config["SQLALCHEMY_DATABASE_URI"] = _database_url()
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
+        "pool_recycle": 300,
+        "pool_pre_ping": True,
+    }
+    app.config["UPLOAD_FOLDER"] = "uploads"
+    # Pending materials that have not advanced for this many seconds can be retried
+    app.config["INGESTION_STALE_AFTER"] = int(os.getenv("INGESTION_STALE_AFTER", "600"))
+    app.config["MAX_CONTENT_LENGTH"] = 16 * 1024 * 1024  # 16MB max request body (single upload or one part)
+    # Larger files are sent with the chunked upload protocol in parts of UPLOAD_PART_SIZE bytes
+    app.config["UPLOAD_PART_SIZE"] = 8 * 1024 * 1024
+    app.config["MAX_UPLOAD_SIZE"] = int(os.getenv("MAX_UPLOAD_SIZE", str(512 * 1024 * 1024)))
+    # Let the front-end server stream uploads: '' (in-process), 'x-accel' (nginx) or 'x-sendfile'
+    app.config["UPLOAD_SEND_MODE"] = os.getenv("UPLOAD_SEND_MODE", "")
+    app.config["UPLOAD_ACCEL_PREFIX"] = os.getenv("UPLOAD_ACCEL_PREFIX", "/protected-uploads")
+    app.config["UPLOAD_AUTH_CACHE_TTL"] = int(os.getenv("UPLOAD_AUTH_CACHE_TTL", "30"))
+    # Stream study guides and AI quiz questions to the browser over Server-Sent Events as they are generated
+    app.config["STUDY_GUIDE_STREAMING"] = os.getenv("STUDY_GUIDE_STREAMING", "1") == "1"
+    app.config["QUIZ_STREAMING"] = os.getenv("QUIZ_STREAMING", "1") == "1"
+    # A second stream of the same quiz takes over generation once the first has been silent this long
+    app.config["QUIZ_GENERATION_STALE_AFTER"] = int(os.getenv("QUIZ_GENERATION_STALE_AFTER", "120"))
+    # Question sets pre-generated per quiz type for each material, refilled below the low-water mark
+    app.config["QUIZ_POOL_SIZE"] = int(os.getenv("QUIZ_POOL_SIZE", "2"))
+    app.config["QUIZ_POOL_LOW_WATER"] = int(os.getenv("QUIZ_POOL_LOW_WATER", "1"))
+    # Students listed per page of a quiz's results
+    app.config["QUIZ_RESULTS_PER_PAGE"] = int(os.getenv("QUIZ_RESULTS_PER_PAGE", "50"))
+    # Attempts loaded per request of a classroom's results table
+    app.config["RESULTS_ATTEMPTS_PER_PAGE"] = int(os.getenv("RESULTS_ATTEMPTS_PER_PAGE", "50"))
+
+
+def create_app(config=None):
+    """Build an app from the environment, with ``config`` applied on top.
+
+    Each call returns an independent app with its own settings and database
+    binding, so tests can run several side by side.
+    """
+    app = Flask(__name__)
+    _configure(app)
+    if config:
+        app.config.update(config)
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_proto=1, x_host=1)
+
+    # Add chr function to Jinja2 globals
+    app.jinja_env.globals['chr'] = chr
+    # {% cache key, classroom_id[, ttl] %} reuses rendered partials until the classroom's data changes
+    app.jinja_env.add_extension(FragmentCacheExtension)
+    app.jinja_env.filters['markdown'] = markdown_filter
+
+    # Initialize Flask extensions
+    db.init_app(app)
+    migrate.init_app(app, db)
+    login_manager.init_app(app)
+    csrf.init_app(app)
+    # moment.init_app(app) # Removed: Not using Flask-Moment
+    # markdown.init_app(app) # Removed: Using custom markdown filter
+
+    app.context_processor(inject_unread_notifications_count)
+    app.context_processor(inject_daily_quote)
+
+    import routes
+    routes.init_app(app)
+
+    # Create upload folder if it doesn't exist
+    os.makedirs(app.config["UPLOAD_FOLDER"], exist_ok=True)
+    return app
+
+
+def preload(app):
+    """Warm the state every worker would otherwise build on its first requests.
+
+    Meant for the gunicorn master before it forks (see gunicorn.conf.py), so
+    the workers share these pages copy-on-write instead of each holding a
+    copy. Compiles every template and the URL map, configures the mappers,
+    loads the MIME table and the sanitizer, and imports the dependencies
+    that are otherwise loaded on first use. It opens no database
+    connections, since those must not be shared across the fork.
+    """
+    from sqlalchemy.orm import configure_mappers
+    import mimetypes
+
+    templates = app.jinja_env.list_templates(extensions=('html',))
+    for name in templates:
+        app.jinja_env.get_template(name)
+    app.url_map.update()
+    configure_mappers()
+    mimetypes.init()
+    sanitize.render_markdown('*warm*')
+
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot  # noqa: F401
+    from sklearn.feature_extraction.text import TfidfVectorizer  # noqa: F401
+    from sklearn.metrics.pairwise import cosine_similarity  # noqa: F401
+    import PyPDF2  # noqa: F401
+    import docx  # noqa: F401
+    return templates
+
+
 def inject_unread_notifications_count():
     if current_user.is_authenticated:
         from models import Notification
@@ -106,7 +172,6 @@ def inject_unread_notifications_count():
     return {'unread_notifications_count': count}
 
 
-@app.context_processor
 def inject_daily_quote():
     from models import DailyQuoteCache
     today = date.today()
@@ -115,27 +180,16 @@ def inject_daily_quote():
         quote = cached.quote
     else:
         try:
-            quote = AIService().get_daily_quote()
+            quote = ai_service.get_service().get_daily_quote()
         except Exception as e:
+            # Don't cache the fallback, or a rate-limit timeout would stick for the whole day
             logging.error(f"Daily quote retrieval failed: {e}")
-            quote = "Keep learning!"
+            return {'daily_quote': "Keep learning!"}
         db.session.add(DailyQuoteCache(date=today, quote=quote))
         db.session.commit()
     return {'daily_quote': quote}
 
-# User loader
+# User loader; the user is cached until their row, classrooms or enrollments change
 @login_manager.user_loader
 def load_user(user_id):
-    from models import User
-    return User.query.get(int(user_id))
-
-# Create upload folder if it doesn't exist
-os.makedirs(app.config["UPLOAD_FOLDER"], exist_ok=True)
-
-# Application context: import models & routes, optionally create tables
-with app.app_context():
-    import models  # ensure models are loaded
-    import routes  # ensure routes are registered
-
-    # Optionally create tables (not needed if using flask-migrate)
-    # db.create_all()
+    return identity.load_user(user_id)
@@ -0,0 +1,59 @@
+import json
+
+import numpy as np
+
+import question_sets
+
+
+def pack_bits(correct):
+    """Pack a boolean correctness array into bytes, eight questions per byte."""
+    return np.packbits(np.asarray(correct, dtype=bool)).tobytes()
+
+
+def unpack_bits(bitmap, count):
+    return np.unpackbits(np.frombuffer(bitmap, dtype=np.uint8), count=count).astype(bool)
+
+
+def save_objective(evaluation, key, answers):
+    """Score ``answers`` against ``key`` and store them with a correctness bitmap.
+
+    Correct answers and explanations live in the question set, so no
+    per-question feedback is written. Returns the score.
+    """
+    correct = key.check(answers)
+    evaluation.answers_json = json.dumps(answers)
+    evaluation.score = key.percentage(correct)
+    evaluation.correct_bitmap = pack_bits(correct)
+    evaluation.feedback_json = None
+    return evaluation.score
+
+
+def compact_essay_feedback(feedback):
+    """Keep only what the AI produced for each essay question."""
+    return [{'score': item.get('score', 0), 'feedback': item.get('feedback', '')} for item in feedback]
+
+
+def save_essay(evaluation, answers, score, feedback):
+    evaluation.answers_json = json.dumps(answers)
+    evaluation.score = score
+    evaluation.correct_bitmap = None
+    evaluation.feedback_json = json.dumps(compact_essay_feedback(feedback))
+
+
+def feedback_for(evaluation, answers=None):
+    """Rebuild the full per-question feedback of a completed attempt.
+
+    Objective attempts are expanded from their bitmap and question set;
+    essay attempts, and attempts stored before the compact format, from
+    feedback_json.
+    """
+    if answers is None:
+        answers = json.loads(evaluation.answers_json or '[]')
+    if evaluation.correct_bitmap is not None:
+        key = question_sets.answer_key_for(evaluation)
+        return key.feedback(answers, unpack_bits(evaluation.correct_bitmap, len(key)))
+    stored = json.loads(evaluation.feedback_json) if evaluation.feedback_json else []
+    return [
+        {'question_index': i, 'user_answer': answers[i] if i < len(answers) else None, **item}
+        for i, item in enumerate(stored)
+    ]
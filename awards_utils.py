@@ -1,6 +1,10 @@
 from collections import defaultdict
 from typing import Dict, Tuple
 
+from sqlalchemy import func, select
+
+import cache
+from extensions import db
 from models import SelfEvaluation, Material, Enrollment
 
 AWARD_STAR_VALUES = {
@@ -10,6 +14,7 @@ AWARD_STAR_VALUES = {
 }
 
 
+@cache.classroom_cached()
 def calculate_awards_for_student(classroom_id: int, student_id: int) -> Dict[int, dict]:
     """Return award info by material for a student in a classroom."""
     evaluations = (
@@ -58,6 +63,37 @@ def calculate_awards_for_student(classroom_id: int, student_id: int) -> Dict[int
     return awards
 
 
+@cache.classroom_cached()
+def count_gold_awards(classroom_id: int) -> Dict[int, int]:
+    """Return the number of gold awards of every student with one in a classroom.
+
+    Same rule as calculate_awards_for_student: a material earns gold when
+    the student's first completed AI quiz on it scores at least 80%.
+    """
+    first_attempts = (
+        select(
+            SelfEvaluation.student_id,
+            SelfEvaluation.score,
+            func.row_number().over(
+                partition_by=(SelfEvaluation.student_id, func.coalesce(SelfEvaluation.material_id, 0)),
+                order_by=(SelfEvaluation.created_at, SelfEvaluation.id),
+            ).label('attempt'),
+        )
+        .where(
+            SelfEvaluation.classroom_id == classroom_id,
+            SelfEvaluation.is_ai_generated.is_(True),
+            SelfEvaluation.completed_at.isnot(None),
+        )
+        .subquery()
+    )
+    rows = db.session.execute(
+        select(first_attempts.c.student_id, func.count())
+        .where(first_attempts.c.attempt == 1, first_attempts.c.score >= 80)
+        .group_by(first_attempts.c.student_id)
+    )
+    return {student_id: count for student_id, count in rows}
+
+
 def calculate_star_total(awards: Dict[int, dict]) -> int:
     """Calculate total stars from award mapping."""
     total = 0
@@ -66,6 +102,7 @@ def calculate_star_total(awards: Dict[int, dict]) -> int:
     return total
 
 
+@cache.classroom_cached()
 def get_classroom_star_rankings(classroom_id: int) -> Tuple[Dict[int, dict], int]:
     """Return star totals and ranks for all students in a classroom."""
     enrollments = Enrollment.query.filter_by(classroom_id=classroom_id).all()
@@ -0,0 +1,83 @@
+"""Time HTML sanitizing on a study-guide-sized document.
+
+    python benchmarks/sanitize_bench.py [--repeat N]
+
+Compares bleach and nh3 (when installed) called directly, and the memoized
+sanitize.clean_html / sanitize.render_markdown used when pages render, and
+checks that every backend produces the same HTML.
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import markdown  # noqa: E402
+
+import sanitize  # noqa: E402
+
+SECTION = """
+<h2 id="section-{n}">Topic {n}</h2>
+<p class="lead">Key ideas for <strong>topic {n}</strong>, with a <a href="https://example.com/{n}" title="more">link</a>.</p>
+<ul><li>First point <em>explained</em></li><li>Second point with <code>inline code</code></li></ul>
+<table border="1"><thead><tr><th colspan="2">Terms</th></tr></thead>
+<tbody><tr><td>Term</td><td data-note="{n}" style="color: red">Definition</td></tr></tbody></table>
+<script>alert({n})</script><p onclick="steal()">Unsafe attributes are dropped.</p>
+"""
+MARKDOWN_SECTION = """
+## Week {n}
+
+Read **chapter {n}** and answer the questions. See [the notes](https://example.com/{n}).
+
+1. Summarise the *main* argument
+2. Compare it with `week {m}`
+
+> Submit before Friday. <script>alert({n})</script>
+"""
+
+
+def _time(function, text, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = function(text)
+    return (time.perf_counter() - start) / repeat, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+
+    html = ''.join(SECTION.format(n=n) for n in range(40))
+    text = ''.join(MARKDOWN_SECTION.format(n=n, m=n - 1) for n in range(40))
+    print(f"study guide: {len(html)} chars, assignment markdown: {len(text)} chars, {args.repeat} runs each\n")
+
+    rows = []
+    reference = None
+    for name, clean in sanitize.BACKENDS.items():
+        try:
+            seconds, result = _time(clean, html, args.repeat)
+        except ImportError:
+            print(f"{name}: not installed, skipped")
+            continue
+        if reference is None:
+            reference = result
+        rows.append((f"{name} clean", seconds, result == reference))
+        seconds, _ = _time(lambda text: clean(markdown.markdown(text)), text, args.repeat)
+        rows.append((f"{name} markdown + clean", seconds, None))
+
+    sanitize.clear_cache()
+    seconds, result = _time(sanitize.clean_html, html, args.repeat)
+    rows.append(("memoized clean_html", seconds, result == reference))
+    seconds, _ = _time(sanitize.render_markdown, text, args.repeat)
+    rows.append(("memoized render_markdown", seconds, None))
+
+    for label, seconds, same in rows:
+        note = '' if same is None else ('  same output' if same else '  OUTPUT DIFFERS')
+        print(f"{label:<28}{seconds * 1000:10.3f} ms{note}")
+    print(f"\nmemo: {sanitize.cache_info()}")
+
+
+if __name__ == '__main__':
+    main()
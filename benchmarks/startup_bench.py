@@ -0,0 +1,80 @@
+"""Measure how long a worker takes to import the app and how much memory it holds.
+
+    python benchmarks/startup_bench.py [--runs N] [--top N] [--module main]
+
+Each run imports the module in a fresh interpreter under ``-X importtime``.
+The report gives the median import time, the peak RSS after import, the
+packages that spent the most time importing, and which of the optional
+heavy dependencies were loaded eagerly.
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from collections import defaultdict
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Dependencies only some requests need; none of them should load at boot
+HEAVY_MODULES = ('matplotlib', 'sklearn', 'PyPDF2', 'docx', 'google.generativeai')
+
+CHILD = """
+import resource, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(elapsed, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+print('loaded:' + ','.join(name for name in {heavy!r} if name in sys.modules))
+"""
+
+
+def _run(module, env):
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', CHILD.format(module=module, heavy=HEAVY_MODULES)],
+        cwd=ROOT, env=env, capture_output=True, text=True, check=True,
+    )
+    timing, loaded = result.stdout.strip().splitlines()[-2:]
+    seconds, rss_kb = timing.split()
+    loaded = loaded[len('loaded:'):]
+    return float(seconds), int(rss_kb), [name for name in loaded.split(',') if name], result.stderr
+
+
+def _self_time_by_package(importtime_output):
+    """Sum ``-X importtime`` self times (microseconds) by top-level package."""
+    totals = defaultdict(int)
+    for line in importtime_output.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, _, name = line[len('import time:'):].split('|')
+        totals[name.strip().split('.')[0]] += int(self_us)
+    return sorted(totals.items(), key=lambda item: item[1], reverse=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--top', type=int, default=15)
+    parser.add_argument('--module', default='main')
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    env.setdefault('GEMINI_API_KEY', 'dummy')
+    env.setdefault('DATABASE_URL', 'sqlite:///' + os.path.join(tempfile.gettempdir(), 'atlverse-startup-bench.db'))
+
+    runs = [_run(args.module, env) for _ in range(args.runs)]
+    seconds = [run[0] for run in runs]
+    rss_mb = [run[1] / 1024 for run in runs]
+    print(f"import {args.module}: median {statistics.median(seconds) * 1000:.0f} ms "
+          f"(min {min(seconds) * 1000:.0f}, max {max(seconds) * 1000:.0f}) over {args.runs} runs")
+    print(f"peak RSS after import: median {statistics.median(rss_mb):.1f} MB")
+    loaded = runs[-1][2]
+    print(f"heavy modules loaded at import: {', '.join(loaded) if loaded else 'none'}\n")
+
+    print(f"{'package':<30}{'self time':>12}")
+    for package, self_us in _self_time_by_package(runs[-1][3])[:args.top]:
+        print(f"{package:<30}{self_us / 1000:>9.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
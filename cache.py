@@ -0,0 +1,509 @@
+import fcntl
+import functools
+import hashlib
+import logging
+import os
+import pickle
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+from flask import current_app, has_app_context
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session, object_session
+
+from extensions import db
+import invalidation
+from models import Assignment, AssignmentSubmission, Classroom, Enrollment, Material, Quiz, SelfEvaluation
+
+# Returned by backends for keys they do not hold, so None can be cached
+MISSING = object()
+
+DEFAULT_TTL = 300
+# Expired entries are swept from the shared backends once per this many writes
+CULL_EVERY = 100
+
+
+class LRUBackend:
+    """In-process cache, evicting the least recently used entry when full.
+
+    Versions live beside the entries and are never evicted, so a counter
+    cannot fall back to a value that older entries were stored under.
+    Other workers' changes arrive through the invalidation bus.
+    """
+
+    process_local = True
+
+    def __init__(self, max_entries=1024, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.clock = clock
+        self._entries = OrderedDict()
+        self._versions = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return MISSING
+            expires_at, value = entry
+            if expires_at is not None and expires_at <= self.clock():
+                del self._entries[key]
+                return MISSING
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        expires_at = self.clock() + ttl if ttl else None
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def get_version(self, name):
+        return self._versions.get(name, 0)
+
+    def incr_version(self, name):
+        with self._lock:
+            self._versions[name] = self._versions.get(name, 0) + 1
+            return self._versions[name]
+
+
+class FileSystemBackend:
+    """One pickle file per entry, shared by every worker that uses the directory.
+
+    Files are replaced atomically, so readers never see a partial entry.
+    Version counters are small files incremented under an exclusive lock.
+    """
+
+    process_local = False
+
+    def __init__(self, directory, clock=time.time):
+        self.directory = directory
+        self.clock = clock
+        self._writes = 0
+        os.makedirs(os.path.join(directory, 'versions'), exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, hashlib.sha256(key.encode()).hexdigest())
+
+    def get(self, key):
+        try:
+            with open(self._path(key), 'rb') as f:
+                stored_key, expires_at, value = pickle.load(f)
+        except FileNotFoundError:
+            return MISSING
+        except (EOFError, pickle.UnpicklingError, ValueError) as e:
+            logging.warning(f"Discarding unreadable cache entry for {key}: {e}")
+            self.delete(key)
+            return MISSING
+        if stored_key != key or (expires_at is not None and expires_at <= self.clock()):
+            return MISSING
+        return value
+
+    def set(self, key, value, ttl=None):
+        expires_at = self.clock() + ttl if ttl else None
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, prefix='.entry-')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump((key, expires_at, value), f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temp_path, self._path(key))
+        except BaseException:
+            os.remove(temp_path)
+            raise
+        self._writes += 1
+        if self._writes % CULL_EVERY == 0:
+            self.cull()
+
+    def delete(self, key):
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def cull(self):
+        """Remove expired entries, including those orphaned by version bumps."""
+        now = self.clock()
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if not os.path.isfile(path) or name.startswith('.'):
+                continue
+            try:
+                with open(path, 'rb') as f:
+                    _, expires_at, _ = pickle.load(f)
+            except FileNotFoundError:
+                continue
+            except Exception:
+                expires_at = 0
+            if expires_at is not None and expires_at <= now:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+
+    def clear(self):
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if os.path.isfile(path):
+                os.remove(path)
+
+    def _version_path(self, name):
+        return os.path.join(self.directory, 'versions', hashlib.sha256(name.encode()).hexdigest())
+
+    def get_version(self, name):
+        try:
+            with open(self._version_path(name)) as f:
+                return int(f.read() or 0)
+        except FileNotFoundError:
+            return 0
+
+    def incr_version(self, name):
+        with open(self._version_path(name), 'a+') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                f.seek(0)
+                version = int(f.read() or 0) + 1
+                f.seek(0)
+                f.truncate()
+                f.write(str(version))
+                f.flush()
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+        return version
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entry (
+    key TEXT PRIMARY KEY,
+    value BLOB NOT NULL,
+    expires_at REAL
+);
+CREATE TABLE IF NOT EXISTS version (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+"""
+
+
+class SQLiteBackend:
+    """Cache shared by every worker process on the host, like the AI rate limiter."""
+
+    process_local = False
+
+    def __init__(self, path, clock=time.time):
+        self.path = path
+        self.clock = clock
+        self._writes = 0
+        self._local = threading.local()
+        self._connect().executescript(_SCHEMA)
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        row = self._connect().execute(
+            'SELECT value, expires_at FROM entry WHERE key = ?', (key,)
+        ).fetchone()
+        if row is None or (row[1] is not None and row[1] <= self.clock()):
+            return MISSING
+        return pickle.loads(row[0])
+
+    def set(self, key, value, ttl=None):
+        expires_at = self.clock() + ttl if ttl else None
+        conn = self._connect()
+        conn.execute(
+            'INSERT OR REPLACE INTO entry (key, value, expires_at) VALUES (?, ?, ?)',
+            (key, pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL), expires_at),
+        )
+        self._writes += 1
+        if self._writes % CULL_EVERY == 0:
+            conn.execute('DELETE FROM entry WHERE expires_at <= ?', (self.clock(),))
+
+    def delete(self, key):
+        self._connect().execute('DELETE FROM entry WHERE key = ?', (key,))
+
+    def clear(self):
+        self._connect().execute('DELETE FROM entry')
+
+    def get_version(self, name):
+        row = self._connect().execute('SELECT value FROM version WHERE name = ?', (name,)).fetchone()
+        return row[0] if row else 0
+
+    def incr_version(self, name):
+        conn = self._connect()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.execute(
+                'INSERT INTO version (name, value) VALUES (?, 1) '
+                'ON CONFLICT(name) DO UPDATE SET value = value + 1',
+                (name,),
+            )
+            version = conn.execute('SELECT value FROM version WHERE name = ?', (name,)).fetchone()[0]
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return version
+
+
+class NullBackend:
+    """Stores nothing; every lookup recomputes."""
+
+    process_local = False
+
+    def get(self, key):
+        return MISSING
+
+    def set(self, key, value, ttl=None):
+        pass
+
+    def delete(self, key):
+        pass
+
+    def clear(self):
+        pass
+
+    def get_version(self, name):
+        return 0
+
+    def incr_version(self, name):
+        return 0
+
+
+def _default_location(suffix):
+    """A per-database path in the temp directory, so two apps on one host never share entries."""
+    if has_app_context():
+        uri = current_app.config.get('SQLALCHEMY_DATABASE_URI', '')
+    else:
+        uri = os.getenv('DATABASE_URL', '')
+    digest = hashlib.sha256(uri.encode()).hexdigest()[:12]
+    return os.path.join(tempfile.gettempdir(), f'atlverse-cache-{digest}{suffix}')
+
+
+def create_backend(name=None):
+    """Build the backend named by ``name`` or the CACHE_BACKEND environment variable."""
+    name = (name or os.getenv('CACHE_BACKEND') or 'sqlite').lower()
+    if name == 'sqlite':
+        return SQLiteBackend(os.getenv('CACHE_PATH') or _default_location('.sqlite3'))
+    if name == 'filesystem':
+        return FileSystemBackend(os.getenv('CACHE_PATH') or _default_location(''))
+    if name == 'lru':
+        return LRUBackend(max_entries=int(os.getenv('CACHE_MAX_ENTRIES', '1024')))
+    if name == 'none':
+        return NullBackend()
+    raise ValueError(f"Unknown cache backend: {name}")
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_backend():
+    """Return the process-wide backend configured from the environment."""
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            _backend = create_backend()
+    return _backend
+
+
+def set_backend(backend):
+    """Replace the process-wide backend, returning the previous one."""
+    global _backend
+    with _backend_lock:
+        previous, _backend = _backend, backend
+    return previous
+
+
+def _default_ttl():
+    return int(os.getenv('CACHE_DEFAULT_TTL', str(DEFAULT_TTL)))
+
+
+def _usable(backend):
+    """Whether ``backend`` may serve entries: a process-local one only once it has caught up with the bus."""
+    return not backend.process_local or invalidation.sync_if_due()
+
+
+def get(key, default=None):
+    backend = get_backend()
+    value = backend.get(key) if _usable(backend) else MISSING
+    return default if value is MISSING else value
+
+
+def put(key, value, ttl=None):
+    get_backend().set(key, value, ttl or _default_ttl())
+
+
+def delete(key):
+    get_backend().delete(key)
+
+
+def clear():
+    get_backend().clear()
+
+
+def get_or_set(key, compute, ttl=None):
+    """Return the cached value for ``key``, computing and storing it on a miss."""
+    backend = get_backend()
+    if not _usable(backend):
+        return compute()
+    value = backend.get(key)
+    if value is MISSING:
+        value = compute()
+        backend.set(key, value, ttl or _default_ttl())
+    return value
+
+
+def _classroom_version_name(classroom_id):
+    return f'classroom:{classroom_id}'
+
+
+def classroom_version(classroom_id):
+    return get_backend().get_version(_classroom_version_name(classroom_id))
+
+
+def bump_classroom(classroom_id):
+    """Invalidate every cached computation for the classroom."""
+    return get_backend().incr_version(_classroom_version_name(classroom_id))
+
+
+def _make_key(fn, args, kwargs):
+    return f'{fn.__module__}.{fn.__qualname__}:{args!r}:{sorted(kwargs.items())!r}'
+
+
+def cached(ttl=None):
+    """Cache a function's result by its arguments for ``ttl`` seconds."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            return get_or_set(_make_key(fn, args, kwargs), lambda: fn(*args, **kwargs), ttl)
+        wrapper.uncached = fn
+        return wrapper
+    return decorator
+
+
+def classroom_get_or_set(classroom_id, key, compute, ttl=None):
+    """``get_or_set`` for a value derived from a classroom's data.
+
+    The classroom's version is added to the key, so any change to the
+    classroom's data picked up by the model listeners below makes the next
+    call recompute.
+    """
+    # Autoflush would have run before the query; do it now so pending changes bump the version
+    if db.session.new or db.session.dirty or db.session.deleted:
+        db.session.flush()
+    return versioned_get_or_set([_classroom_version_name(classroom_id)], key, compute, ttl)
+
+
+def versioned_get_or_set(version_names, key, compute, ttl=None):
+    """``get_or_set`` with the current value of each named version counter added to the key.
+
+    A process-local backend catches up with the bus before the versions are
+    read, so a change announced by another worker is reflected in the key.
+    """
+    backend = get_backend()
+    if not _usable(backend):
+        return compute()
+    versions = ':'.join(f'v{backend.get_version(name)}' for name in version_names)
+    return get_or_set(f'{key}:{versions}', compute, ttl)
+
+
+def classroom_cached(ttl=None):
+    """Cache a function whose first argument is a classroom id, see ``classroom_get_or_set``."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(classroom_id, *args, **kwargs):
+            return classroom_get_or_set(
+                classroom_id,
+                _make_key(fn, (classroom_id,) + args, kwargs),
+                lambda: fn(classroom_id, *args, **kwargs),
+                ttl,
+            )
+        wrapper.uncached = fn
+        return wrapper
+    return decorator
+
+
+def invalidate_classroom(classroom_id, session=None, entity='Classroom'):
+    """Bump the classroom's version now and again once ``session`` commits.
+
+    The first bump covers reads later in the same transaction; the second
+    drops anything another worker cached from the pre-commit data in
+    between, and is broadcast on the invalidation bus as a change to
+    ``entity``. Bulk UPDATEs skip the model listeners, so code issuing them
+    calls this directly.
+    """
+    if classroom_id is None:
+        return
+    version = bump_classroom(classroom_id)
+    if session is None:
+        invalidation.publish(entity, classroom_id, version)
+    else:
+        session.info.setdefault('cache_classrooms', {})[classroom_id] = entity
+
+
+def _submission_classroom(connection, target):
+    return connection.execute(
+        select(Assignment.classroom_id).where(Assignment.id == target.assignment_id)
+    ).scalar()
+
+
+# How to find the classroom a changed row belongs to. Classrooms themselves are
+# watched because SQLite can reuse the id of a deleted classroom.
+WATCHED_MODELS = {
+    SelfEvaluation: lambda connection, target: target.classroom_id,
+    AssignmentSubmission: _submission_classroom,
+    Material: lambda connection, target: target.classroom_id,
+    Quiz: lambda connection, target: target.classroom_id,
+    Enrollment: lambda connection, target: target.classroom_id,
+    Classroom: lambda connection, target: target.id,
+}
+
+
+def _on_change(mapper, connection, target):
+    classroom_id = WATCHED_MODELS[mapper.class_](connection, target)
+    invalidate_classroom(classroom_id, object_session(target), mapper.class_.__name__)
+
+
+for _model in WATCHED_MODELS:
+    for _name in ('after_insert', 'after_update', 'after_delete'):
+        event.listen(_model, _name, _on_change)
+
+
+@event.listens_for(Session, 'after_commit')
+def _bump_committed(session):
+    for classroom_id, entity in session.info.pop('cache_classrooms', {}).items():
+        invalidation.publish(entity, classroom_id, bump_classroom(classroom_id))
+
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_rolled_back(session):
+    session.info.pop('cache_classrooms', None)
+
+
+@invalidation.subscribe
+def _apply_remote_change(event):
+    backend = get_backend()
+    if not backend.process_local:
+        # Shared backends already hold the version the other worker bumped
+        return
+    if event is invalidation.RESET:
+        backend.clear()
+    elif event.classroom_id is not None:
+        backend.incr_version(_classroom_version_name(event.classroom_id))
@@ -0,0 +1,152 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+import uuid
+from datetime import datetime, timedelta
+
+from flask import current_app
+
+from extensions import db
+from models import UploadSession
+import storage
+
+# Default part size; each PUT body stays well under MAX_CONTENT_LENGTH
+DEFAULT_PART_SIZE = 8 * 1024 * 1024
+# Abandoned sessions are purged after this long
+SESSION_TTL = timedelta(hours=24)
+
+
+class UploadError(Exception):
+    """Raised when a chunked upload request is invalid"""
+
+
+def _parts_dir(upload_id):
+    return os.path.join(current_app.config['UPLOAD_FOLDER'], '.parts', upload_id)
+
+
+def _part_path(upload_id, part_number):
+    return os.path.join(_parts_dir(upload_id), f"{part_number}.part")
+
+
+def create_session(classroom_id, teacher_id, filename, total_size, title=None, cpmk_ids=None):
+    """Start a chunked upload and return its UploadSession."""
+    max_size = current_app.config.get('MAX_UPLOAD_SIZE', 512 * 1024 * 1024)
+    if total_size <= 0:
+        raise UploadError('File is empty.')
+    if total_size > max_size:
+        raise UploadError(f'File too large. Maximum size is {max_size // (1024 * 1024)}MB.')
+
+    part_size = current_app.config.get('UPLOAD_PART_SIZE', DEFAULT_PART_SIZE)
+    session = UploadSession(
+        id=uuid.uuid4().hex,
+        classroom_id=classroom_id,
+        teacher_id=teacher_id,
+        filename=filename,
+        title=title or filename,
+        cpmk_ids=json.dumps(cpmk_ids or []),
+        total_size=total_size,
+        part_size=part_size,
+    )
+    db.session.add(session)
+    os.makedirs(_parts_dir(session.id), exist_ok=True)
+    return session
+
+
+def received_parts(session):
+    """Return the sorted part numbers that have been fully written."""
+    directory = _parts_dir(session.id)
+    if not os.path.isdir(directory):
+        return []
+    return sorted(
+        int(name[:-len('.part')]) for name in os.listdir(directory)
+        if name.endswith('.part') and name[:-len('.part')].isdigit()
+    )
+
+
+def write_part(session, part_number, stream):
+    """Stream one part from ``stream`` to disk, hashing it as it is written.
+
+    The part is written to a temporary name and renamed into place only once
+    complete, so a dropped connection never leaves a truncated part behind.
+    Returns the part's size and SHA-256 hex digest.
+    """
+    if part_number < 1 or part_number > session.part_count:
+        raise UploadError(f'Part number must be between 1 and {session.part_count}.')
+    expected_size = session.expected_part_size(part_number)
+
+    os.makedirs(_parts_dir(session.id), exist_ok=True)
+    digest = hashlib.sha256()
+    size = 0
+    fd, temp_path = tempfile.mkstemp(dir=_parts_dir(session.id), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            while True:
+                block = stream.read(storage.CHUNK_SIZE)
+                if not block:
+                    break
+                size += len(block)
+                if size > expected_size:
+                    raise UploadError(f'Part {part_number} exceeds {expected_size} bytes.')
+                digest.update(block)
+                out.write(block)
+        if size != expected_size:
+            raise UploadError(f'Part {part_number} is {size} bytes, expected {expected_size}.')
+        os.replace(temp_path, _part_path(session.id, part_number))
+    except Exception:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    return size, digest.hexdigest()
+
+
+def assemble(session):
+    """Concatenate all parts into content-addressed storage.
+
+    The whole-file digest is computed while the parts are copied, so memory
+    use is bounded by the copy buffer. Returns the acquired StoredFile; the
+    caller commits the session and then calls ``discard``.
+    """
+    missing = sorted(set(range(1, session.part_count + 1)) - set(received_parts(session)))
+    if missing:
+        raise UploadError(f'Missing parts: {", ".join(str(n) for n in missing[:10])}')
+
+    upload_folder = current_app.config['UPLOAD_FOLDER']
+    digest = hashlib.sha256()
+    size = 0
+    fd, temp_path = tempfile.mkstemp(dir=upload_folder, prefix='.upload-')
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            for part_number in range(1, session.part_count + 1):
+                with open(_part_path(session.id, part_number), 'rb') as part:
+                    while True:
+                        block = part.read(storage.CHUNK_SIZE)
+                        if not block:
+                            break
+                        digest.update(block)
+                        out.write(block)
+                        size += len(block)
+    except Exception:
+        os.remove(temp_path)
+        raise
+    extension = session.filename.rsplit('.', 1)[1].lower() if '.' in session.filename else ''
+    return storage.acquire(digest.hexdigest(), extension, temp_path, size)
+
+
+def discard(session):
+    """Remove a session's parts from disk and delete the session row."""
+    shutil.rmtree(_parts_dir(session.id), ignore_errors=True)
+    db.session.delete(session)
+
+
+def purge_stale_sessions():
+    """Discard sessions that were abandoned before completion."""
+    cutoff = datetime.utcnow() - SESSION_TTL
+    stale = UploadSession.query.filter(UploadSession.created_at < cutoff).all()
+    for session in stale:
+        logging.info(f"Discarding abandoned upload {session.id}")
+        discard(session)
+    if stale:
+        db.session.commit()
@@ -0,0 +1,122 @@
+import base64
+import json
+from datetime import datetime, timedelta
+
+from sqlalchemy import and_, case, distinct, func, or_, select
+
+from extensions import db
+from models import Material, Quiz, SelfEvaluation, User
+
+# Sort orders of the attempts table: (column expression, descending)
+SORTS = {
+    'newest': (SelfEvaluation.created_at, True),
+    'oldest': (SelfEvaluation.created_at, False),
+    'score_high': (func.coalesce(SelfEvaluation.score, -1.0), True),
+    'score_low': (func.coalesce(SelfEvaluation.score, -1.0), False),
+}
+QUIZ_TYPES = ('mcq', 'true_false', 'essay')
+
+
+def student_summaries(classroom_id):
+    """Per-student attempt counts and average completed score, for students with attempts."""
+    completed = and_(SelfEvaluation.completed_at.isnot(None), SelfEvaluation.score.isnot(None))
+    return db.session.execute(
+        select(
+            User,
+            func.count(SelfEvaluation.id).label('total_evaluations'),
+            func.count(case((completed, 1))).label('completed_count'),
+            (func.count(SelfEvaluation.id) - func.count(case((completed, 1)))).label('in_progress_count'),
+            func.count(distinct(SelfEvaluation.material_id)).label('materials_attempted'),
+            func.avg(case((completed, SelfEvaluation.score))).label('avg_score'),
+        )
+        .join(SelfEvaluation, SelfEvaluation.student_id == User.id)
+        .where(SelfEvaluation.classroom_id == classroom_id)
+        .group_by(User.id)
+        .order_by(User.last_name, User.first_name, User.id)
+    ).all()
+
+
+def totals(classroom_id):
+    """Classroom-wide attempt totals for the summary cards."""
+    return db.session.execute(
+        select(
+            func.count(SelfEvaluation.id).label('evaluations'),
+            func.count(SelfEvaluation.completed_at).label('completed'),
+            func.avg(case((SelfEvaluation.completed_at.isnot(None), SelfEvaluation.score))).label('avg_score'),
+            func.count(distinct(SelfEvaluation.student_id)).label('active_students'),
+        )
+        .where(SelfEvaluation.classroom_id == classroom_id)
+    ).one()
+
+
+def encode_cursor(value, evaluation_id):
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    return base64.urlsafe_b64encode(json.dumps([value, evaluation_id]).encode()).decode()
+
+
+def decode_cursor(cursor, sort):
+    """Return the ``(value, id)`` a cursor points after; raises ValueError if it is malformed."""
+    try:
+        value, evaluation_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        if sort in ('newest', 'oldest'):
+            value = datetime.fromisoformat(value)
+        return value, int(evaluation_id)
+    except (TypeError, ValueError, json.JSONDecodeError) as e:
+        raise ValueError('Invalid cursor') from e
+
+
+def attempts_page(classroom_id, per_page, sort='newest', cursor=None,
+                  material_id=None, quiz_type=None, date_from=None, date_to=None):
+    """Return one keyset page of the classroom's attempts and the cursor of the next, or None.
+
+    ``date_from`` and ``date_to`` are dates, both inclusive, matched against
+    when the attempt was created.
+    """
+    if sort not in SORTS:
+        raise ValueError(f'Unknown sort {sort!r}')
+    column, descending = SORTS[sort]
+    sort_value = column.label('sort_value')
+    query = (
+        select(
+            SelfEvaluation.id,
+            SelfEvaluation.student_id,
+            SelfEvaluation.quiz_id,
+            SelfEvaluation.quiz_type,
+            SelfEvaluation.is_ai_generated,
+            SelfEvaluation.score,
+            SelfEvaluation.created_at,
+            SelfEvaluation.completed_at,
+            User.first_name,
+            User.last_name,
+            Material.title.label('material_title'),
+            Quiz.title.label('quiz_title'),
+            sort_value,
+        )
+        .join(User, User.id == SelfEvaluation.student_id)
+        .outerjoin(Material, Material.id == SelfEvaluation.material_id)
+        .outerjoin(Quiz, Quiz.id == SelfEvaluation.quiz_id)
+        .where(SelfEvaluation.classroom_id == classroom_id)
+    )
+    if material_id:
+        query = query.where(SelfEvaluation.material_id == material_id)
+    if quiz_type:
+        query = query.where(SelfEvaluation.quiz_type == quiz_type)
+    if date_from:
+        query = query.where(SelfEvaluation.created_at >= datetime.combine(date_from, datetime.min.time()))
+    if date_to:
+        query = query.where(SelfEvaluation.created_at < datetime.combine(date_to + timedelta(days=1), datetime.min.time()))
+    if cursor:
+        value, last_id = decode_cursor(cursor, sort)
+        if descending:
+            query = query.where(or_(column < value, and_(column == value, SelfEvaluation.id < last_id)))
+        else:
+            query = query.where(or_(column > value, and_(column == value, SelfEvaluation.id > last_id)))
+    order = (column.desc(), SelfEvaluation.id.desc()) if descending else (column, SelfEvaluation.id)
+    rows = db.session.execute(query.order_by(*order).limit(per_page + 1)).all()
+
+    next_cursor = None
+    if len(rows) > per_page:
+        rows = rows[:per_page]
+        next_cursor = encode_cursor(rows[-1].sort_value, rows[-1].id)
+    return rows, next_cursor
@@ -0,0 +1,131 @@
+import mimetypes
+import os
+import threading
+import time
+
+from flask import current_app, make_response, send_file
+from sqlalchemy import and_
+from werkzeug.security import safe_join
+
+from extensions import db
+from models import Material, Classroom, Enrollment
+import invalidation
+
+# Upper bound on cached authorization decisions per process
+AUTH_CACHE_MAX_ENTRIES = 10000
+
+_auth_cache = {}
+_auth_cache_lock = threading.Lock()
+
+
+def _check_access(user, filename):
+    """Return ``(allowed, download_name)`` for the user and uploaded file.
+
+    One query outer-joins every material stored under the filename to the
+    user's classrooms, so unreferenced files, granted and denied downloads
+    are told apart in a single round trip. ``download_name`` is the original
+    name of a material the user can see, or None if it has none.
+    """
+    if user.role == 'teacher':
+        grant = Classroom.id
+        query = db.session.query(Material.original_filename, grant).outerjoin(
+            Classroom, and_(Classroom.id == Material.classroom_id, Classroom.teacher_id == user.id)
+        )
+    elif user.role == 'student':
+        grant = Enrollment.id
+        query = db.session.query(Material.original_filename, grant).outerjoin(
+            Enrollment, and_(Enrollment.classroom_id == Material.classroom_id, Enrollment.student_id == user.id)
+        )
+    else:
+        return True, None
+    row = query.filter(Material.file_path == filename).order_by(grant.is_(None)).first()
+    if row is None:
+        # Files no material references keep the previous open behaviour
+        return True, None
+    download_name, granted = row
+    return (True, download_name) if granted is not None else (False, None)
+
+
+def authorize(user, filename):
+    """Check download access, caching the decision for UPLOAD_AUTH_CACHE_TTL seconds.
+
+    Returns ``(allowed, download_name)``. Revoked enrollments therefore take
+    effect within one TTL, or within the invalidation bus interval when the
+    change was made by another worker.
+    """
+    if not invalidation.sync_if_due():
+        return _check_access(user, filename)
+    ttl = current_app.config.get('UPLOAD_AUTH_CACHE_TTL', 30)
+    key = (user.id, filename)
+    now = time.monotonic()
+    with _auth_cache_lock:
+        cached = _auth_cache.get(key)
+        if cached and cached[1] > now:
+            return cached[0]
+
+    decision = _check_access(user, filename)
+
+    with _auth_cache_lock:
+        if len(_auth_cache) >= AUTH_CACHE_MAX_ENTRIES:
+            _auth_cache.clear()
+        _auth_cache[key] = (decision, now + ttl)
+    return decision
+
+
+def clear_auth_cache():
+    with _auth_cache_lock:
+        _auth_cache.clear()
+
+
+@invalidation.subscribe
+def _on_remote_change(event):
+    if event is invalidation.RESET or event.entity in ('Enrollment', 'Material', 'Classroom'):
+        clear_auth_cache()
+
+
+def _etag_for(filename):
+    """Content-addressed files are named by their digest, which is a strong ETag."""
+    stem = filename.split('.', 1)[0]
+    if len(stem) == 64 and all(c in '0123456789abcdef' for c in stem):
+        return stem
+    return True
+
+
+def send_upload(filename, download_name=None):
+    """Serve a file from the upload folder.
+
+    With UPLOAD_SEND_MODE set to 'x-accel' or 'x-sendfile' only headers are
+    returned and the front-end server streams the bytes. Otherwise the file
+    is sent in-process with ETag, Last-Modified and Range support.
+    ``download_name`` is offered to the browser in Content-Disposition.
+    Raises FileNotFoundError if the file does not exist.
+    """
+    upload_folder = os.path.abspath(current_app.config['UPLOAD_FOLDER'])
+    path = safe_join(upload_folder, filename)
+    if path is None or not os.path.isfile(path):
+        raise FileNotFoundError(filename)
+
+    mode = current_app.config.get('UPLOAD_SEND_MODE')
+    if mode in ('x-accel', 'x-sendfile'):
+        response = make_response('')
+        response.mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        if mode == 'x-accel':
+            prefix = current_app.config.get('UPLOAD_ACCEL_PREFIX', '/protected-uploads').rstrip('/')
+            response.headers['X-Accel-Redirect'] = f"{prefix}/{filename}"
+        else:
+            response.headers['X-Sendfile'] = path
+        if download_name:
+            response.headers.set('Content-Disposition', 'inline', filename=download_name)
+    else:
+        response = send_file(
+            path,
+            conditional=True,
+            etag=_etag_for(filename),
+            last_modified=os.path.getmtime(path),
+            max_age=current_app.config.get('UPLOAD_MAX_AGE', 3600),
+            download_name=download_name,
+        )
+    # Downloads are access controlled, so shared caches must not store them
+    response.cache_control.public = False
+    response.cache_control.private = True
+    return response
@@ -0,0 +1,60 @@
+from flask import current_app, g
+from flask_login import current_user
+from flask_wtf.csrf import generate_csrf
+from jinja2 import nodes
+from jinja2.ext import Extension
+from markupsafe import Markup
+
+import cache
+
+# Stands in for the per-session CSRF token inside cached fragments
+CSRF_PLACEHOLDER = '\x00csrf-token\x00'
+
+
+def _csrf_field_name():
+    return current_app.config.get('WTF_CSRF_FIELD_NAME', 'csrf_token')
+
+
+class FragmentCacheExtension(Extension):
+    """``{% cache key, classroom_id[, ttl] %}...{% endcache %}``
+
+    Caches the rendered block in the app cache under the template name, the
+    key, the viewer's role and the classroom's version, so it is rendered
+    again once the classroom's data changes. Anything else the block shows
+    that differs between viewers, such as the student's own results, must
+    be part of the key. CSRF tokens rendered inside are swapped for the
+    current request's token when the fragment is reused.
+    """
+
+    tags = {'cache'}
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        args = [nodes.Const(parser.name), parser.parse_expression()]
+        parser.stream.expect('comma')
+        args.append(parser.parse_expression())
+        if parser.stream.skip_if('comma'):
+            args.append(parser.parse_expression())
+        else:
+            args.append(nodes.Const(None))
+        body = parser.parse_statements(('name:endcache',), drop_needle=True)
+        return nodes.CallBlock(self.call_method('_render', args), [], [], body).set_lineno(lineno)
+
+    def _render(self, template_name, key, classroom_id, ttl, caller):
+        role = current_user.role if current_user.is_authenticated else 'anonymous'
+        fragment = cache.classroom_get_or_set(
+            classroom_id,
+            f'fragment:{template_name}:{key!r}:{role}:classroom={classroom_id}',
+            lambda: self._render_uncached(caller),
+            ttl,
+        )
+        if CSRF_PLACEHOLDER in fragment:
+            fragment = fragment.replace(CSRF_PLACEHOLDER, generate_csrf())
+        return Markup(fragment)
+
+    def _render_uncached(self, caller):
+        fragment = str(caller())
+        token = g.get(_csrf_field_name())
+        if token:
+            fragment = fragment.replace(token, CSRF_PLACEHOLDER)
+        return fragment
@@ -0,0 +1,20 @@
+"""gunicorn settings: gunicorn -c gunicorn.conf.py main:app
+
+The app is imported and warmed once in the master before it forks, so the
+workers share that memory copy-on-write instead of each building their own.
+"""
+import gc
+import os
+
+bind = os.getenv('BIND', '0.0.0.0:5000')
+workers = int(os.getenv('WEB_CONCURRENCY', '2'))
+preload_app = True
+
+
+def when_ready(server):
+    from app import preload
+
+    preload(server.app.wsgi())
+    # Move everything loaded so far out of the collector's generations; collecting
+    # them would write to their headers and copy the shared pages into each worker
+    gc.freeze()
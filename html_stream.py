@@ -0,0 +1,129 @@
+import re
+
+import bleach
+
+# Elements that never have a closing tag
+VOID_ELEMENTS = {'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link', 'meta', 'source', 'wbr'}
+# Block-level start tags that implicitly close an open <p>, as in the HTML parsing rules
+_CLOSES_P = {
+    'address', 'article', 'aside', 'blockquote', 'div', 'dl', 'fieldset', 'footer', 'form',
+    'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'header', 'hr', 'main', 'nav', 'ol', 'p', 'pre',
+    'section', 'table', 'ul',
+}
+# Start tags that implicitly close an open element of the listed kinds
+IMPLIED_END = {name: {'p'} for name in _CLOSES_P}
+IMPLIED_END.update({
+    'li': {'li', 'p'},
+    'dt': {'dt', 'dd', 'p'},
+    'dd': {'dt', 'dd', 'p'},
+    'tr': {'tr', 'td', 'th'},
+    'td': {'td', 'th'},
+    'th': {'td', 'th'},
+    'option': {'option'},
+})
+# Without a top-level boundary, split inside a wrapper element once this much is buffered
+SPLIT_THRESHOLD = 2 * 1024
+# Flush even without a balanced boundary once this much HTML is buffered
+MAX_BUFFER = 16 * 1024
+
+_TAG_RE = re.compile(r"<(/?)([a-zA-Z][a-zA-Z0-9]*)\b[^<>]*?(/?)>")
+_OPENING_FENCE_RE = re.compile(r"^\s*```[a-zA-Z]*[ \t]*\n?")
+_CLOSING_FENCE_RE = re.compile(r"\s*```\s*$")
+
+
+class IncrementalSanitizer:
+    """Sanitize streamed HTML one balanced fragment at a time.
+
+    Text is buffered until the top-level element it belongs to has closed,
+    then that fragment is cleaned with bleach on its own. Every emitted
+    fragment is therefore well-formed and safe, and appending fragments in
+    order never lets markup from one reopen or escape another. Markdown code
+    fences around the response are stripped.
+
+    Elements left open are closed the way a browser would (a new ``<p>``
+    ends the previous one, a new ``<li>`` the previous item). When the whole
+    response sits inside one wrapper element, the buffer is split after the
+    wrapper's last completed child once SPLIT_THRESHOLD is reached: the
+    wrapper is closed in the emitted fragment and reopened for the rest.
+    """
+
+    def __init__(self, tags, attributes):
+        self.tags = tags
+        self.attributes = attributes
+        self._buffer = ''
+        self._started = False
+
+    def _clean(self, html):
+        return bleach.clean(html, tags=self.tags, attributes=self.attributes)
+
+    def _scan(self):
+        """Walk the buffered tags.
+
+        Returns the offset just after the last closed top-level element, and
+        the last ``(offset, open_elements)`` at which a child of the shallowest
+        enclosing element completed.
+        """
+        stack = []
+        boundary = 0
+        split = None
+        for match in _TAG_RE.finditer(self._buffer):
+            closing, name, self_closing = match.group(1), match.group(2).lower(), match.group(3)
+            if closing:
+                if name not in [open_name for open_name, _ in stack]:
+                    continue
+                while stack and stack.pop()[0] != name:
+                    pass
+                end = match.end()
+            else:
+                implied = IMPLIED_END.get(name, ())
+                while stack and stack[-1][0] in implied:
+                    stack.pop()
+                if not stack:
+                    # Everything before this tag is complete, including implicitly closed elements
+                    boundary = match.start()
+                if name in VOID_ELEMENTS or self_closing:
+                    end = match.end()
+                else:
+                    stack.append((name, match.group(0)))
+                    continue
+            if not stack:
+                boundary = end
+            elif split is None or len(stack) <= len(split[1]):
+                split = (end, list(stack))
+        return boundary, split
+
+    def _take(self, offset, reopen=()):
+        """Emit the buffer up to ``offset``, closing and then reopening ``reopen``."""
+        fragment = self._buffer[:offset] + ''.join(f"</{name}>" for name, _ in reversed(reopen))
+        self._buffer = ''.join(tag for _, tag in reopen) + self._buffer[offset:]
+        return self._clean(fragment)
+
+    def feed(self, text):
+        """Add streamed text and return any sanitized HTML that is now complete."""
+        self._buffer += text
+        if not self._started:
+            # Wait until an opening code fence, if any, can be recognised whole
+            if '\n' not in self._buffer and '<' not in self._buffer and len(self._buffer) < 16:
+                return ''
+            self._buffer = _OPENING_FENCE_RE.sub('', self._buffer, count=1)
+            self._started = True
+
+        boundary, split = self._scan()
+        if boundary:
+            return self._take(boundary)
+        if split and len(self._buffer) > SPLIT_THRESHOLD:
+            return self._take(*split)
+        if len(self._buffer) > MAX_BUFFER:
+            # Unbalanced output: flush up to the last complete tag rather than hold it all
+            last_close = self._buffer.rfind('>')
+            if last_close > self._buffer.rfind('<'):
+                return self._take(last_close + 1)
+        return ''
+
+    def close(self):
+        """Return whatever is left once the stream has ended."""
+        remainder = _CLOSING_FENCE_RE.sub('', self._buffer)
+        if not self._started:
+            remainder = _OPENING_FENCE_RE.sub('', remainder, count=1)
+        self._buffer = ''
+        return self._clean(remainder) if remainder.strip() else ''
@@ -0,0 +1,154 @@
+import os
+
+from flask import abort, g
+from flask_login import current_user
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session, make_transient_to_detached, object_session
+
+from extensions import db
+import cache
+import invalidation
+from models import Classroom, Enrollment, User
+
+DEFAULT_TTL = 60
+# Columns left out of the cached copy; they are loaded from the database if read
+UNCACHED_COLUMNS = {'password_hash'}
+# Bumped in a worker with a process-local cache when another worker changes any identity
+GENERATION = 'identity'
+
+
+def _version_name(user_id):
+    return f'user:{user_id}'
+
+
+def _ttl():
+    return int(os.getenv('IDENTITY_CACHE_TTL', str(DEFAULT_TTL)))
+
+
+def _snapshot(user):
+    """What a request needs to know about a user: their columns and the classrooms they can open."""
+    if user is None:
+        return None
+    owned = enrolled = frozenset()
+    if user.role == 'teacher':
+        owned = frozenset(db.session.scalars(select(Classroom.id).where(Classroom.teacher_id == user.id)))
+    elif user.role == 'student':
+        enrolled = frozenset(db.session.scalars(
+            select(Enrollment.classroom_id).where(Enrollment.student_id == user.id)
+        ))
+    columns = {attr.key: getattr(user, attr.key) for attr in User.__mapper__.column_attrs
+               if attr.key not in UNCACHED_COLUMNS}
+    return {'columns': columns, 'owned': owned, 'enrolled': enrolled}
+
+
+def _get_snapshot(user_id, loaded=None):
+    def compute():
+        user = db.session.get(User, user_id)
+        if loaded is not None:
+            loaded['user'] = user
+        return _snapshot(user)
+    return cache.versioned_get_or_set(
+        [_version_name(user_id), GENERATION], f'identity:{user_id}', compute, _ttl()
+    )
+
+
+def load_user(user_id):
+    """Flask-Login user loader that serves the user from the cache when nothing about them changed.
+
+    A cached user is attached to the session without a query; attributes
+    that were not cached, and relationships, load on first access.
+    """
+    user_id = int(user_id)
+    loaded = {}
+    snapshot = _get_snapshot(user_id, loaded)
+    g.identity = (user_id, snapshot)
+    if snapshot is None:
+        return None
+    if loaded.get('user') is not None:
+        return loaded['user']
+    user = User(**snapshot['columns'])
+    make_transient_to_detached(user)
+    return db.session.merge(user, load=False)
+
+
+def _current():
+    """The logged-in user's snapshot, memoized for the rest of the request."""
+    memo = g.get('identity')
+    if memo is None or memo[0] != current_user.id:
+        memo = g.identity = (current_user.id, _get_snapshot(current_user.id))
+    return memo[1]
+
+
+def owned_classroom_ids():
+    """Ids of the classrooms the logged-in teacher owns."""
+    snapshot = _current()
+    return snapshot['owned'] if snapshot else frozenset()
+
+
+def enrolled_classroom_ids():
+    """Ids of the classrooms the logged-in student is enrolled in."""
+    snapshot = _current()
+    return snapshot['enrolled'] if snapshot else frozenset()
+
+
+def owned_classroom_or_404(classroom_id):
+    """The classroom, if the logged-in teacher owns it; the ownership check makes no query."""
+    if classroom_id not in owned_classroom_ids():
+        abort(404)
+    return db.get_or_404(Classroom, classroom_id)
+
+
+def enrolled_classroom_or_404(classroom_id):
+    """The classroom, if the logged-in student is enrolled in it; the enrollment check makes no query."""
+    if classroom_id not in enrolled_classroom_ids():
+        abort(404)
+    return db.get_or_404(Classroom, classroom_id)
+
+
+def invalidate_user(user_id, session=None):
+    """Drop the user's cached identity now and again once ``session`` commits, like ``cache.invalidate_classroom``."""
+    if user_id is None:
+        return
+    version = cache.get_backend().incr_version(_version_name(user_id))
+    if session is None:
+        invalidation.publish('User', None, version)
+    else:
+        session.info.setdefault('identity_users', set()).add(user_id)
+
+
+# Whose identity a changed row belongs to: the user's own columns, a teacher's
+# classrooms and a student's enrollments
+WATCHED_MODELS = {
+    User: lambda target: target.id,
+    Classroom: lambda target: target.teacher_id,
+    Enrollment: lambda target: target.student_id,
+}
+
+
+def _on_change(mapper, connection, target):
+    invalidate_user(WATCHED_MODELS[mapper.class_](target), object_session(target))
+
+
+for _model in WATCHED_MODELS:
+    for _name in ('after_insert', 'after_update', 'after_delete'):
+        event.listen(_model, _name, _on_change)
+
+
+@event.listens_for(Session, 'after_commit')
+def _bump_committed(session):
+    backend = cache.get_backend()
+    for user_id in session.info.pop('identity_users', ()):
+        invalidation.publish('User', None, backend.incr_version(_version_name(user_id)))
+
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_rolled_back(session):
+    session.info.pop('identity_users', None)
+
+
+@invalidation.subscribe
+def _apply_remote_change(event):
+    # Events do not say which user changed, so a process-local cache drops every identity
+    backend = cache.get_backend()
+    if backend.process_local and event.entity == 'User':
+        backend.incr_version(GENERATION)
@@ -0,0 +1,196 @@
+import json
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from flask import current_app
+
+from extensions import db
+from models import (
+    Material, Enrollment, Notification,
+    MATERIAL_STAGES, MATERIAL_READY, MATERIAL_SEARCHABLE,
+)
+from simple_vector import SimpleVectorSearch
+import quiz_pool
+from utils import extract_text_from_file
+
+# Pipeline stages in the order they run. A material's ``status`` holds the
+# last stage that completed; 'stored' is reached inside the upload request.
+STAGES = MATERIAL_STAGES
+READY_STATUS = MATERIAL_READY
+FAILED_STATUS = 'failed'
+# Materials in these states have content that retrieval can use
+SEARCHABLE_STATUSES = MATERIAL_SEARCHABLE
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor(app):
+    """Return the process-local worker pool, creating it on first use.
+
+    The pool is created lazily so that it is never inherited across a fork.
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=app.config.get('INGESTION_WORKERS', 2),
+                thread_name_prefix='ingestion',
+            )
+    return _executor
+
+
+def _extract(material, notify_link):
+    """Extract plain text from the stored file, reusing a cached result."""
+    stored_file = material.stored_file
+    if stored_file is not None and stored_file.content is not None:
+        material.content = stored_file.content
+        return
+    file_path = os.path.join(current_app.config['UPLOAD_FOLDER'], material.file_path)
+    material.content = extract_text_from_file(file_path, material.file_path, strict=True)
+    if stored_file is not None:
+        stored_file.content = material.content
+
+
+def _chunk(material, notify_link):
+    """Split the extracted text into retrieval chunks, reusing a cached result."""
+    stored_file = material.stored_file
+    if stored_file is not None and stored_file.chunks_json is not None:
+        material.chunks_json = stored_file.chunks_json
+        return
+    chunks = SimpleVectorSearch().chunk_text(material.content or '')
+    material.chunks_json = json.dumps(chunks)
+    if stored_file is not None:
+        stored_file.chunks_json = material.chunks_json
+
+
+def _index(material, notify_link):
+    """Admit the stored chunks into the searchable set.
+
+    Retrieval builds its TF-IDF matrix at query time, so there is nothing to
+    precompute; reaching this stage is what makes the material searchable.
+    """
+    if material.chunks_json is None:
+        raise ValueError('Material has not been chunked')
+
+
+def _notify(material, notify_link):
+    """Notify enrolled students that the material is available."""
+    enrollments = Enrollment.query.filter_by(classroom_id=material.classroom_id).all()
+    for enrollment in enrollments:
+        db.session.add(Notification(
+            user_id=enrollment.student_id,
+            message=f'New material available: {material.title}',
+            link=notify_link
+        ))
+
+
+_STAGE_HANDLERS = {
+    'extracted': _extract,
+    'chunked': _chunk,
+    'indexed': _index,
+    'notified': _notify,
+}
+
+
+def pending_stages(material):
+    """Return the stages still to run for a material, resuming after a failure."""
+    if material.status == FAILED_STATUS:
+        resume_from = material.failed_stage or STAGES[1]
+        return list(STAGES[STAGES.index(resume_from):])
+    if material.status not in STAGES:
+        return list(STAGES[1:])
+    return list(STAGES[STAGES.index(material.status) + 1:])
+
+
+def is_stale(material):
+    """True if a pending material has not advanced for INGESTION_STALE_AFTER seconds.
+
+    Jobs run in an in-process pool, so a worker restart or deploy drops them;
+    such materials are retried like failed ones.
+    """
+    if material.status in (READY_STATUS, FAILED_STATUS):
+        return False
+    changed_at = material.status_updated_at or material.uploaded_at
+    if changed_at is None:
+        return True
+    stale_after = current_app.config.get('INGESTION_STALE_AFTER', 600)
+    return datetime.utcnow() - changed_at > timedelta(seconds=stale_after)
+
+
+def can_retry(material):
+    return material.status == FAILED_STATUS or is_stale(material)
+
+
+def prepare_retry(material):
+    """Move a failed or stalled material back to its last completed stage.
+
+    The material no longer looks failed or stale afterwards, so a second
+    retry cannot queue the pipeline twice. The caller commits.
+    """
+    if material.status == FAILED_STATUS:
+        failed_index = STAGES.index(material.failed_stage or STAGES[1])
+        material.status = STAGES[max(failed_index - 1, 0)]
+    material.failed_stage = None
+    material.status_message = None
+    material.status_updated_at = datetime.utcnow()
+
+
+def progress_percent(material):
+    """Return how far through the pipeline a material is, as a percentage."""
+    status = material.status
+    if status == FAILED_STATUS:
+        status = STAGES[max(STAGES.index(material.failed_stage or STAGES[1]) - 1, 0)]
+    if status not in STAGES:
+        return 0
+    return int((STAGES.index(status) + 1) * 100 / len(STAGES))
+
+
+def run_pipeline(app, material_id, notify_link):
+    """Run the remaining stages for a material, stopping at the first failure."""
+    with app.app_context():
+        material = db.session.get(Material, material_id)
+        if material is None:
+            return
+        for stage in pending_stages(material):
+            try:
+                _STAGE_HANDLERS[stage](material, notify_link)
+                material.status = stage
+                material.failed_stage = None
+                material.status_message = None
+                material.status_updated_at = datetime.utcnow()
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                logging.error(f"Ingestion of material {material_id} failed at '{stage}': {str(e)}")
+                material = db.session.get(Material, material_id)
+                if material is None:
+                    return
+                material.status = FAILED_STATUS
+                material.failed_stage = stage
+                material.status_message = str(e)[:255]
+                material.status_updated_at = datetime.utcnow()
+                db.session.commit()
+                return
+
+        if material.status == READY_STATUS:
+            try:
+                quiz_pool.warm_material(material_id)
+            except Exception as e:
+                logging.error(f"Could not schedule quiz pre-generation for material {material_id}: {str(e)}")
+
+
+def submit(material_id, notify_link):
+    """Queue a material for ingestion on the local worker pool.
+
+    With ``INGESTION_SYNC`` set the pipeline runs inline, which keeps tests
+    and single-process scripts deterministic.
+    """
+    app = current_app._get_current_object()
+    if app.config.get('INGESTION_SYNC'):
+        run_pipeline(app, material_id, notify_link)
+        return None
+    return _get_executor(app).submit(run_pipeline, app, material_id, notify_link)
@@ -0,0 +1,273 @@
+import hashlib
+import json
+import logging
+import os
+import select
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+from collections import namedtuple
+
+from flask import current_app, has_app_context
+from sqlalchemy.engine import make_url
+
+# (entity, classroom_id, version) broadcast to every worker after a commit.
+# ``entity`` names the model that changed; ``version`` is the publisher's
+# classroom version once the change was applied.
+Event = namedtuple('Event', 'entity classroom_id version')
+
+# Delivered instead of events when a worker may have missed some, for
+# example after its Postgres listener reconnected; drop everything cached.
+RESET = Event('*', None, None)
+
+# A worker syncs before serving from a process-local cache if it last synced
+# this many seconds ago, so it has applied every event committed before then
+DEFAULT_INTERVAL = 1.0
+# Events older than this are pruned from the polled table
+RETENTION = 3600
+PRUNE_EVERY = 100
+
+CHANNEL = 'atlverse_invalidation'
+
+_subscribers = []
+
+
+def subscribe(handler):
+    """Call ``handler(event)`` for every event published by another worker, and with RESET."""
+    _subscribers.append(handler)
+    return handler
+
+
+def _dispatch(events):
+    for event in events:
+        for handler in _subscribers:
+            try:
+                handler(event)
+            except Exception as e:
+                logging.error(f"Invalidation handler {handler.__name__} failed on {event}: {e}")
+
+
+class Bus:
+    """Publishes events and applies those from other workers on ``sync``.
+
+    Nothing runs in the background: readers call ``sync_if_due`` before using
+    a process-local cache, so the staleness bound does not depend on a thread
+    being scheduled. If the transport cannot be reached the call returns
+    False and the caller must not serve cached data.
+    """
+
+    def __init__(self, interval=DEFAULT_INTERVAL, clock=time.monotonic):
+        self.interval = interval
+        self.clock = clock
+        self.origin = uuid.uuid4().hex
+        self.last_sync = None
+        self._lock = threading.Lock()
+
+    def publish(self, entity, classroom_id, version):
+        raise NotImplementedError
+
+    def _receive(self):
+        """Return new events from other workers, or [RESET] if some may have been missed."""
+        raise NotImplementedError
+
+    def sync(self):
+        with self._lock:
+            events = self._receive()
+            self.last_sync = self.clock()
+        _dispatch(events)
+        return events
+
+    def sync_if_due(self):
+        """Apply pending events unless that was done within the interval; False if the bus is unreachable."""
+        if self.last_sync is not None and self.clock() - self.last_sync < self.interval:
+            return True
+        try:
+            self.sync()
+        except Exception as e:
+            logging.warning(f"Cache invalidation bus unavailable, bypassing local caches: {e}")
+            return False
+        return True
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS event (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    origin TEXT NOT NULL,
+    entity TEXT NOT NULL,
+    classroom_id INTEGER,
+    version INTEGER,
+    created_at REAL NOT NULL
+);
+"""
+
+
+class SQLiteBus(Bus):
+    """Events appended to a table that every worker on the host polls."""
+
+    def __init__(self, path, interval=DEFAULT_INTERVAL, clock=time.monotonic, wall_clock=time.time):
+        super().__init__(interval, clock)
+        self.path = path
+        self.wall_clock = wall_clock
+        self._published = 0
+        self._local = threading.local()
+        conn = self._connect()
+        conn.executescript(_SCHEMA)
+        # A new worker has nothing cached, so earlier events do not concern it
+        self.last_seq = conn.execute('SELECT COALESCE(MAX(seq), 0) FROM event').fetchone()[0]
+        self.last_sync = self.clock()
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            self._local.conn = conn
+        return conn
+
+    def publish(self, entity, classroom_id, version):
+        conn = self._connect()
+        conn.execute(
+            'INSERT INTO event (origin, entity, classroom_id, version, created_at) VALUES (?, ?, ?, ?, ?)',
+            (self.origin, entity, classroom_id, version, self.wall_clock()),
+        )
+        self._published += 1
+        if self._published % PRUNE_EVERY == 0:
+            conn.execute('DELETE FROM event WHERE created_at < ?', (self.wall_clock() - RETENTION,))
+
+    def _receive(self):
+        conn = self._connect()
+        rows = conn.execute(
+            'SELECT seq, origin, entity, classroom_id, version FROM event WHERE seq > ? ORDER BY seq',
+            (self.last_seq,),
+        ).fetchall()
+        if not rows:
+            return []
+        # Rows between our watermark and the oldest left were pruned before we read them
+        if rows[0][0] > self.last_seq + 1:
+            oldest = conn.execute('SELECT MIN(seq) FROM event').fetchone()[0]
+            if oldest > self.last_seq + 1:
+                self.last_seq = rows[-1][0]
+                return [RESET]
+        self.last_seq = rows[-1][0]
+        return [Event(entity, classroom_id, version) for _, origin, entity, classroom_id, version in rows
+                if origin != self.origin]
+
+
+class PostgresBus(Bus):
+    """Events sent with NOTIFY and picked up from a dedicated LISTEN connection."""
+
+    def __init__(self, dsn, interval=DEFAULT_INTERVAL, clock=time.monotonic):
+        import psycopg2
+
+        super().__init__(interval, clock)
+        self._psycopg2 = psycopg2
+        self.dsn = dsn
+        self._listener = None
+        self._publisher = None
+        self._listen()
+        self.last_sync = self.clock()
+
+    def _connect(self):
+        conn = self._psycopg2.connect(self.dsn)
+        conn.autocommit = True
+        return conn
+
+    def _listen(self):
+        self._listener = self._connect()
+        with self._listener.cursor() as cursor:
+            cursor.execute(f'LISTEN {CHANNEL}')
+
+    def publish(self, entity, classroom_id, version):
+        payload = json.dumps({'origin': self.origin, 'entity': entity,
+                              'classroom_id': classroom_id, 'version': version})
+        with self._lock:
+            for attempt in range(2):
+                try:
+                    if self._publisher is None or self._publisher.closed:
+                        self._publisher = self._connect()
+                    with self._publisher.cursor() as cursor:
+                        cursor.execute('SELECT pg_notify(%s, %s)', (CHANNEL, payload))
+                    return
+                except self._psycopg2.OperationalError:
+                    self._publisher = None
+                    if attempt:
+                        raise
+
+    def _receive(self):
+        try:
+            if self._listener is None or self._listener.closed:
+                raise self._psycopg2.OperationalError('listener connection closed')
+            # Non-blocking: only reads notifications that have already arrived
+            if select.select([self._listener], [], [], 0)[0]:
+                self._listener.poll()
+        except self._psycopg2.OperationalError:
+            # Notifications sent while we were disconnected are lost
+            self._listen()
+            return [RESET]
+        events = []
+        while self._listener.notifies:
+            payload = json.loads(self._listener.notifies.pop(0).payload)
+            if payload['origin'] != self.origin:
+                events.append(Event(payload['entity'], payload['classroom_id'], payload['version']))
+        return events
+
+
+def _database_uri():
+    if has_app_context():
+        return current_app.config.get('SQLALCHEMY_DATABASE_URI', '')
+    return os.getenv('DATABASE_URL', '')
+
+
+def create_bus(uri=None):
+    """Build a bus for the database at ``uri``: NOTIFY on Postgres, a polled SQLite table otherwise."""
+    uri = uri if uri is not None else _database_uri()
+    interval = float(os.getenv('CACHE_BUS_INTERVAL', str(DEFAULT_INTERVAL)))
+    if uri.startswith('postgres'):
+        # libpq does not understand SQLAlchemy's driver suffix
+        dsn = make_url(uri).set(drivername='postgresql').render_as_string(hide_password=False)
+        return PostgresBus(dsn, interval=interval)
+    path = os.getenv('CACHE_BUS_PATH')
+    if not path:
+        # One bus per database, like the default cache location
+        digest = hashlib.sha256(uri.encode()).hexdigest()[:12]
+        path = os.path.join(tempfile.gettempdir(), f'atlverse-bus-{digest}.sqlite3')
+    return SQLiteBus(path, interval=interval)
+
+
+_bus = None
+_bus_lock = threading.Lock()
+
+
+def get_bus():
+    """Return the process-wide bus for the current database."""
+    global _bus
+    with _bus_lock:
+        if _bus is None:
+            _bus = create_bus()
+    return _bus
+
+
+def set_bus(bus):
+    """Replace the process-wide bus, returning the previous one."""
+    global _bus
+    with _bus_lock:
+        previous, _bus = _bus, bus
+    return previous
+
+
+def publish(entity, classroom_id, version):
+    """Broadcast a committed change; failures are logged, since the write itself succeeded."""
+    try:
+        get_bus().publish(entity, classroom_id, version)
+    except Exception as e:
+        logging.error(f"Could not publish invalidation of classroom {classroom_id}: {e}")
+
+
+def sync_if_due():
+    try:
+        return get_bus().sync_if_due()
+    except Exception as e:
+        logging.warning(f"Cache invalidation bus unavailable, bypassing local caches: {e}")
+        return False
@@ -0,0 +1,158 @@
+import json
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from sqlalchemy import and_, or_
+
+from extensions import db
+from models import SelfEvaluation
+import question_sets
+from scoring import OBJECTIVE_TYPES
+
+# Quizzes whose answer matrices are kept per process
+CACHE_SIZE = 64
+# Code for an answer that is not one of the question's choices
+NO_CHOICE = -1
+TRUE_FALSE_CHOICES = ('True', 'False')
+
+
+def choices_for(question, quiz_type):
+    """Return the answer values a question offers, in display order."""
+    if quiz_type == 'true_false':
+        return TRUE_FALSE_CHOICES
+    return tuple(option[0] for option in question.get('options', []) if option)
+
+
+class ItemMatrix:
+    """The latest completed answers of every student, as a students x questions array of choice codes.
+
+    Rows are added or replaced as attempts complete, so refreshing only
+    reads attempts completed since the last refresh.
+    """
+
+    def __init__(self, questions, quiz_type):
+        self.choices = [choices_for(q, quiz_type) for q in questions]
+        self._codes = [{choice: i for i, choice in enumerate(choices)} for choices in self.choices]
+        self.key = np.array(
+            [codes.get(q.get('correct_answer'), NO_CHOICE - 1) for q, codes in zip(questions, self._codes)],
+            dtype=np.int8,
+        )
+        self.answers = np.empty((0, len(questions)), dtype=np.int8)
+        self.rows = {}
+        # (completed_at, id) of the last attempt read
+        self.watermark = None
+
+    def add(self, attempts):
+        """Record ``(student_id, answers)`` pairs, each replacing that student's earlier row."""
+        appended = []
+        for student_id, answers in attempts:
+            if len(answers) != len(self.choices):
+                continue
+            row = [codes.get(answer, NO_CHOICE) for codes, answer in zip(self._codes, answers)]
+            index = self.rows.get(student_id)
+            if index is None:
+                self.rows[student_id] = len(self.answers) + len(appended)
+                appended.append(row)
+            elif index < len(self.answers):
+                self.answers[index] = row
+            else:
+                appended[index - len(self.answers)] = row
+        if appended:
+            self.answers = np.vstack([self.answers, np.array(appended, dtype=np.int8)])
+
+    def refresh(self, quiz_id):
+        """Read the attempts completed since the last refresh, oldest first."""
+        query = db.session.query(
+            SelfEvaluation.id,
+            SelfEvaluation.student_id,
+            SelfEvaluation.answers_json,
+            SelfEvaluation.completed_at,
+        ).filter(SelfEvaluation.quiz_id == quiz_id, SelfEvaluation.completed_at.isnot(None))
+        if self.watermark is not None:
+            completed_at, last_id = self.watermark
+            query = query.filter(or_(
+                SelfEvaluation.completed_at > completed_at,
+                and_(SelfEvaluation.completed_at == completed_at, SelfEvaluation.id > last_id),
+            ))
+        rows = query.order_by(SelfEvaluation.completed_at, SelfEvaluation.id).all()
+        if rows:
+            self.add((row.student_id, json.loads(row.answers_json or '[]')) for row in rows)
+            self.watermark = (rows[-1].completed_at, rows[-1].id)
+
+    def report(self):
+        """Compute the item statistics of the current matrix.
+
+        Returns a dict with the number of students, KR-20 reliability and,
+        per question, the p-value (share answering correctly), the
+        point-biserial correlation between the item and the rest of the
+        test, and the selection rate of every choice. Statistics that are
+        undefined for the cohort (for example with no score variance) are
+        None.
+        """
+        students, count = self.answers.shape
+        correct = (self.answers == self.key).astype(np.float64)
+        items = []
+        if students:
+            p_values = correct.mean(axis=0)
+            totals = correct.sum(axis=1)
+            # Correlate each item with the score on the other items, so it is not correlated with itself
+            rest = totals[:, None] - correct
+            item_dev = correct - p_values
+            rest_dev = rest - rest.mean(axis=0)
+            denominator = np.sqrt((item_dev ** 2).sum(axis=0) * (rest_dev ** 2).sum(axis=0))
+            with np.errstate(invalid='ignore', divide='ignore'):
+                discrimination = (item_dev * rest_dev).sum(axis=0) / denominator
+            for q, choices in enumerate(self.choices):
+                column = self.answers[:, q]
+                items.append({
+                    'index': q,
+                    'p_value': float(p_values[q]),
+                    'discrimination': None if np.isnan(discrimination[q]) else float(discrimination[q]),
+                    'correct_choice': choices[self.key[q]] if 0 <= self.key[q] < len(choices) else None,
+                    'choices': {choice: float((column == i).mean()) for i, choice in enumerate(choices)},
+                    'no_choice': float((column == NO_CHOICE).mean()),
+                })
+        return {'students': students, 'reliability': self._kr20(correct), 'items': items}
+
+    @staticmethod
+    def _kr20(correct):
+        students, count = correct.shape
+        if students < 2 or count < 2:
+            return None
+        p = correct.mean(axis=0)
+        variance = correct.sum(axis=1).var()
+        if variance == 0:
+            return None
+        return float(count / (count - 1) * (1 - (p * (1 - p)).sum() / variance))
+
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def analyze(quiz):
+    """Return the item analysis report of an objective quiz against its current key.
+
+    The matrix is cached per quiz and rebuilt when the quiz's questions
+    change; otherwise only newly completed attempts are read.
+    """
+    if quiz.quiz_type not in OBJECTIVE_TYPES:
+        raise ValueError('Item analysis needs a multiple choice or true/false quiz.')
+    digest = question_sets.content_hash(quiz.questions_json)
+    with _cache_lock:
+        cached = _cache.get(quiz.id)
+        if cached is None or cached[0] != digest:
+            cached = (digest, ItemMatrix(json.loads(quiz.questions_json), quiz.quiz_type))
+        _cache[quiz.id] = cached
+        _cache.move_to_end(quiz.id)
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+        matrix = cached[1]
+        matrix.refresh(quiz.id)
+        return matrix.report()
+
+
+def clear_cache():
+    with _cache_lock:
+        _cache.clear()
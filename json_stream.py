@@ -0,0 +1,119 @@
+import json
+import logging
+
+
+class JSONArrayParser:
+    """Incrementally parse a streamed JSON array of objects.
+
+    ``feed`` returns each top-level object as soon as its closing brace
+    arrives, so callers can use the first items while the rest of the array
+    is still being generated. Text before the array (such as a markdown code
+    fence or a sentence like "Here are the [20] questions:") is skipped: a
+    ``[`` only opens the array when it starts a fenced block or is followed
+    by ``{`` or ``]``. An object that fails to decode is logged and dropped
+    without affecting the ones around it.
+    """
+
+    def __init__(self):
+        self._buffer = ''
+        self._pos = 0
+        self._in_array = False
+        self._depth = 0
+        self._object_start = None
+        self._in_string = False
+        self._escaped = False
+        # Skipped text on the current line, and whether the previous line was a code fence
+        self._line = ''
+        self._after_fence = False
+        self.closed = False
+        self.skipped = 0
+
+    def feed(self, text):
+        """Consume streamed text and return the objects completed by it."""
+        self._buffer += text
+        items = []
+        buffer = self._buffer
+        i = self._pos
+        while i < len(buffer) and not self.closed:
+            char = buffer[i]
+            if not self._in_array:
+                if char == '[':
+                    opens = self._opens_array(buffer, i)
+                    if opens is None:
+                        # Wait for the next character to decide
+                        break
+                    self._in_array = opens
+                    self._after_fence = False
+                elif char == '\n':
+                    self._after_fence = self._line.strip().startswith('```')
+                    self._line = ''
+                else:
+                    self._line += char
+                    if not char.isspace():
+                        self._after_fence = False
+            elif self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == '\\':
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                if self._depth:
+                    self._in_string = True
+            elif char in '{[':
+                if self._depth == 0:
+                    self._object_start = i
+                self._depth += 1
+            elif char in '}]':
+                if self._depth == 0:
+                    if char == ']':
+                        self.closed = True
+                else:
+                    self._depth -= 1
+                    if self._depth == 0:
+                        self._emit(buffer[self._object_start:i + 1], items)
+                        self._object_start = None
+            i += 1
+
+        # Drop consumed text so the buffer only holds the object in progress
+        keep_from = self._object_start if self._object_start is not None else i
+        self._buffer = buffer[keep_from:]
+        self._pos = i - keep_from
+        if self._object_start is not None:
+            self._object_start = 0
+        return items
+
+    def _opens_array(self, buffer, i):
+        """Return whether the ``[`` at ``i`` opens the array, or None if undecided."""
+        if self._after_fence:
+            return True
+        j = i + 1
+        while j < len(buffer) and buffer[j].isspace():
+            j += 1
+        if j == len(buffer):
+            return None
+        return buffer[j] in '{]'
+
+    def _emit(self, raw, items):
+        try:
+            item = json.loads(raw)
+        except json.JSONDecodeError as e:
+            self.skipped += 1
+            logging.warning(f"Skipping malformed streamed item: {str(e)}")
+            return
+        if isinstance(item, dict):
+            items.append(item)
+        else:
+            self.skipped += 1
+
+    @property
+    def truncated(self):
+        """True if the stream ended before the array was closed."""
+        return not self.closed
+
+
+def parse_array(text):
+    """Parse every complete object from a possibly truncated JSON array."""
+    parser = JSONArrayParser()
+    return parser.feed(text), parser
@@ -1,5 +1,8 @@
 import os
-from app import app
+from app import create_app
+
+# The default app, for gunicorn (main:app) and the development server below
+app = create_app()
 
 
 def str_to_bool(value: str) -> bool:
@@ -0,0 +1,26 @@
+"""Index material.file_path for upload lookups
+
+Revision ID: 0e6a3f71d5b8
+Revises: 7d2b95e0c6fa
+Create Date: 2026-10-19 10:41:52.904417
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0e6a3f71d5b8'
+down_revision = '7d2b95e0c6fa'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('material', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_material_file_path'), ['file_path'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('material', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_material_file_path'))
@@ -0,0 +1,26 @@
+"""Index self_evaluation by quiz and student for latest-attempt statistics
+
+Revision ID: 1c8d5f3a2e70
+Revises: f4b7e2c90a16
+Create Date: 2026-10-19 20:31:52.904417
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '1c8d5f3a2e70'
+down_revision = 'f4b7e2c90a16'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('self_evaluation', schema=None) as batch_op:
+        batch_op.create_index('ix_self_evaluation_quiz_student', ['quiz_id', 'student_id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('self_evaluation', schema=None) as batch_op:
+        batch_op.drop_index('ix_self_evaluation_quiz_student')
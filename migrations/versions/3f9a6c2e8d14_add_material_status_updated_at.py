@@ -0,0 +1,26 @@
+"""Add material.status_updated_at to detect stalled ingestion
+
+Revision ID: 3f9a6c2e8d14
+Revises: 5b8e2d94c3a1
+Create Date: 2026-10-19 15:41:09.204117
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f9a6c2e8d14'
+down_revision = '5b8e2d94c3a1'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('material', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('status_updated_at', sa.DateTime(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('material', schema=None) as batch_op:
+        batch_op.drop_column('status_updated_at')
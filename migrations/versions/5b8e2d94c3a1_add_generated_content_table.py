@@ -0,0 +1,36 @@
+"""Add generated_content table for pre-generated quizzes and study guides
+
+Revision ID: 5b8e2d94c3a1
+Revises: 9a4c1d7e2f60
+Create Date: 2026-10-19 13:02:41.518203
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5b8e2d94c3a1'
+down_revision = '9a4c1d7e2f60'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('generated_content',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('content_hash', sa.String(length=64), nullable=False),
+    sa.Column('kind', sa.String(length=20), nullable=False),
+    sa.Column('payload', sa.Text(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('generated_content', schema=None) as batch_op:
+        batch_op.create_index('ix_generated_content_hash_kind', ['content_hash', 'kind'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('generated_content', schema=None) as batch_op:
+        batch_op.drop_index('ix_generated_content_hash_kind')
+
+    op.drop_table('generated_content')
@@ -0,0 +1,43 @@
+"""Add content-addressed stored_file table
+
+Revision ID: 7d2b95e0c6fa
+Revises: c41f8e2a9b13
+Create Date: 2026-10-19 10:03:17.552190
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7d2b95e0c6fa'
+down_revision = 'c41f8e2a9b13'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('stored_file',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('digest', sa.String(length=64), nullable=False),
+    sa.Column('file_path', sa.String(length=500), nullable=False),
+    sa.Column('size', sa.Integer(), nullable=True),
+    sa.Column('ref_count', sa.Integer(), nullable=False),
+    sa.Column('content', sa.Text(), nullable=True),
+    sa.Column('chunks_json', sa.Text(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('digest')
+    )
+    # Existing materials keep their timestamped files and no stored_file reference
+    with op.batch_alter_table('material', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('stored_file_id', sa.Integer(), nullable=True))
+        batch_op.create_foreign_key('fk_material_stored_file_id', 'stored_file', ['stored_file_id'], ['id'])
+
+
+def downgrade():
+    with op.batch_alter_table('material', schema=None) as batch_op:
+        batch_op.drop_constraint('fk_material_stored_file_id', type_='foreignkey')
+        batch_op.drop_column('stored_file_id')
+
+    op.drop_table('stored_file')
@@ -0,0 +1,26 @@
+"""Index self_evaluation by classroom and creation time for the paginated results table
+
+Revision ID: 8e3a6b9d4f21
+Revises: 1c8d5f3a2e70
+Create Date: 2026-10-19 21:14:37.118520
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8e3a6b9d4f21'
+down_revision = '1c8d5f3a2e70'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('self_evaluation', schema=None) as batch_op:
+        batch_op.create_index('ix_self_evaluation_classroom_created', ['classroom_id', 'created_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('self_evaluation', schema=None) as batch_op:
+        batch_op.drop_index('ix_self_evaluation_classroom_created')
@@ -0,0 +1,58 @@
+"""Add quiz_regrade and quiz_regrade_entry tables for reversible bulk regrades
+
+Revision ID: a83f5d1c7e26
+Revises: e2a7c91d4f38
+Create Date: 2026-10-19 18:20:14.662091
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a83f5d1c7e26'
+down_revision = 'e2a7c91d4f38'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('quiz_regrade',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('quiz_id', sa.Integer(), nullable=False),
+    sa.Column('teacher_id', sa.Integer(), nullable=False),
+    sa.Column('changed_count', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('reverted_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['quiz_id'], ['quiz.id'], ),
+    sa.ForeignKeyConstraint(['teacher_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('quiz_regrade', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_quiz_regrade_quiz_id'), ['quiz_id'], unique=False)
+
+    op.create_table('quiz_regrade_entry',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('regrade_id', sa.Integer(), nullable=False),
+    sa.Column('evaluation_id', sa.Integer(), nullable=False),
+    sa.Column('old_score', sa.Float(), nullable=True),
+    sa.Column('new_score', sa.Float(), nullable=True),
+    sa.Column('old_questions_json', sa.Text(), nullable=True),
+    sa.Column('old_feedback_json', sa.Text(), nullable=True),
+    sa.ForeignKeyConstraint(['evaluation_id'], ['self_evaluation.id'], ),
+    sa.ForeignKeyConstraint(['regrade_id'], ['quiz_regrade.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('quiz_regrade_entry', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_quiz_regrade_entry_regrade_id'), ['regrade_id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('quiz_regrade_entry', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_quiz_regrade_entry_regrade_id'))
+
+    op.drop_table('quiz_regrade_entry')
+    with op.batch_alter_table('quiz_regrade', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_quiz_regrade_quiz_id'))
+
+    op.drop_table('quiz_regrade')
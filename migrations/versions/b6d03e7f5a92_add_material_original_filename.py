@@ -0,0 +1,26 @@
+"""Add material.original_filename for download names
+
+Revision ID: b6d03e7f5a92
+Revises: 3f9a6c2e8d14
+Create Date: 2026-10-19 16:12:47.581903
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b6d03e7f5a92'
+down_revision = '3f9a6c2e8d14'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('material', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('original_filename', sa.String(length=255), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('material', schema=None) as batch_op:
+        batch_op.drop_column('original_filename')
@@ -0,0 +1,42 @@
+"""Store sanitized HTML beside markdown assignment text and pooled study guides
+
+Existing rows keep NULL and are rendered on read.
+
+Revision ID: b7d2e4f61a93
+Revises: 8e3a6b9d4f21
+Create Date: 2026-10-19 23:02:11.604318
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7d2e4f61a93'
+down_revision = '8e3a6b9d4f21'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('assignment', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('description_html', sa.Text(), nullable=True))
+
+    with op.batch_alter_table('assignment_submission', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('content_html', sa.Text(), nullable=True))
+        batch_op.add_column(sa.Column('feedback_html', sa.Text(), nullable=True))
+
+    with op.batch_alter_table('generated_content', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('html', sa.Text(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('generated_content', schema=None) as batch_op:
+        batch_op.drop_column('html')
+
+    with op.batch_alter_table('assignment_submission', schema=None) as batch_op:
+        batch_op.drop_column('feedback_html')
+        batch_op.drop_column('content_html')
+
+    with op.batch_alter_table('assignment', schema=None) as batch_op:
+        batch_op.drop_column('description_html')
@@ -0,0 +1,33 @@
+"""Add ingestion status fields to Material
+
+Revision ID: c41f8e2a9b13
+Revises: b2d03246b7b6
+Create Date: 2026-10-19 09:12:44.318205
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c41f8e2a9b13'
+down_revision = 'b2d03246b7b6'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Existing materials were ingested synchronously, so they are already ready
+    with op.batch_alter_table('material', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('status', sa.String(length=20), nullable=False, server_default='notified'))
+        batch_op.add_column(sa.Column('failed_stage', sa.String(length=20), nullable=True))
+        batch_op.add_column(sa.Column('status_message', sa.String(length=255), nullable=True))
+        batch_op.add_column(sa.Column('chunks_json', sa.Text(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('material', schema=None) as batch_op:
+        batch_op.drop_column('chunks_json')
+        batch_op.drop_column('status_message')
+        batch_op.drop_column('failed_stage')
+        batch_op.drop_column('status')
@@ -0,0 +1,116 @@
+"""Add question_set table and move teacher quiz attempt questions into it
+
+Revision ID: c5e19a4b7d02
+Revises: a83f5d1c7e26
+Create Date: 2026-10-19 19:02:41.318254
+
+"""
+import hashlib
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c5e19a4b7d02'
+down_revision = 'a83f5d1c7e26'
+branch_labels = None
+depends_on = None
+
+# Attempts rewritten per round trip
+BATCH_SIZE = 500
+
+question_set = sa.table(
+    'question_set',
+    sa.column('digest', sa.String),
+    sa.column('questions_json', sa.Text),
+    sa.column('created_at', sa.DateTime),
+)
+self_evaluation = sa.table(
+    'self_evaluation',
+    sa.column('id', sa.Integer),
+    sa.column('quiz_id', sa.Integer),
+    sa.column('question_set_digest', sa.String),
+    sa.column('questions_json', sa.Text),
+)
+
+
+def upgrade():
+    op.create_table('question_set',
+    sa.Column('digest', sa.String(length=64), nullable=False),
+    sa.Column('questions_json', sa.Text(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('digest')
+    )
+    with op.batch_alter_table('self_evaluation', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('question_set_digest', sa.String(length=64), nullable=True))
+        batch_op.alter_column('questions_json', existing_type=sa.Text(), nullable=True)
+        batch_op.create_index(batch_op.f('ix_self_evaluation_question_set_digest'), ['question_set_digest'], unique=False)
+        batch_op.create_foreign_key('fk_self_evaluation_question_set_digest', 'question_set', ['question_set_digest'], ['digest'])
+
+    with op.batch_alter_table('quiz_regrade_entry', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('old_question_set_digest', sa.String(length=64), nullable=True))
+
+    # Teacher quiz attempts point at one shared copy; AI quiz questions stay inline
+    bind = op.get_bind()
+    known = set(bind.execute(sa.select(question_set.c.digest)).scalars())
+    last_id = 0
+    while True:
+        rows = bind.execute(
+            sa.select(self_evaluation.c.id, self_evaluation.c.questions_json)
+            .where(
+                self_evaluation.c.quiz_id.isnot(None),
+                self_evaluation.c.questions_json.isnot(None),
+                self_evaluation.c.id > last_id,
+            )
+            .order_by(self_evaluation.c.id)
+            .limit(BATCH_SIZE)
+        ).all()
+        if not rows:
+            break
+        new_sets = {}
+        updates = []
+        for row in rows:
+            digest = hashlib.sha256(row.questions_json.encode('utf-8')).hexdigest()
+            if digest not in known:
+                new_sets[digest] = row.questions_json
+            updates.append({'eval_id': row.id, 'digest': digest})
+        if new_sets:
+            now = datetime.utcnow()
+            bind.execute(question_set.insert(), [
+                {'digest': digest, 'questions_json': questions_json, 'created_at': now}
+                for digest, questions_json in new_sets.items()
+            ])
+            known.update(new_sets)
+        bind.execute(
+            self_evaluation.update()
+            .where(self_evaluation.c.id == sa.bindparam('eval_id'))
+            .values(question_set_digest=sa.bindparam('digest'), questions_json=None),
+            updates,
+        )
+        last_id = rows[-1].id
+
+
+def downgrade():
+    bind = op.get_bind()
+    bind.execute(
+        self_evaluation.update()
+        .where(self_evaluation.c.question_set_digest.isnot(None))
+        .values(questions_json=(
+            sa.select(question_set.c.questions_json)
+            .where(question_set.c.digest == self_evaluation.c.question_set_digest)
+            .scalar_subquery()
+        ))
+    )
+
+    with op.batch_alter_table('quiz_regrade_entry', schema=None) as batch_op:
+        batch_op.drop_column('old_question_set_digest')
+
+    with op.batch_alter_table('self_evaluation', schema=None) as batch_op:
+        batch_op.drop_constraint('fk_self_evaluation_question_set_digest', type_='foreignkey')
+        batch_op.drop_index(batch_op.f('ix_self_evaluation_question_set_digest'))
+        batch_op.alter_column('questions_json', existing_type=sa.Text(), nullable=False)
+        batch_op.drop_column('question_set_digest')
+
+    op.drop_table('question_set')
@@ -0,0 +1,26 @@
+"""Add self_evaluation.generating_since to claim streamed quiz generation
+
+Revision ID: e2a7c91d4f38
+Revises: b6d03e7f5a92
+Create Date: 2026-10-19 17:05:22.318604
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e2a7c91d4f38'
+down_revision = 'b6d03e7f5a92'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('self_evaluation', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('generating_since', sa.DateTime(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('self_evaluation', schema=None) as batch_op:
+        batch_op.drop_column('generating_since')
@@ -0,0 +1,159 @@
+"""Store objective attempt results as a correctness bitmap and trim essay feedback
+
+Revision ID: f4b7e2c90a16
+Revises: c5e19a4b7d02
+Create Date: 2026-10-19 19:48:05.207613
+
+"""
+import json
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f4b7e2c90a16'
+down_revision = 'c5e19a4b7d02'
+branch_labels = None
+depends_on = None
+
+# Attempts rewritten per round trip
+BATCH_SIZE = 500
+OBJECTIVE_TYPES = ('mcq', 'true_false')
+
+question_set = sa.table(
+    'question_set',
+    sa.column('digest', sa.String),
+    sa.column('questions_json', sa.Text),
+)
+self_evaluation = sa.table(
+    'self_evaluation',
+    sa.column('id', sa.Integer),
+    sa.column('quiz_type', sa.String),
+    sa.column('question_set_digest', sa.String),
+    sa.column('questions_json', sa.Text),
+    sa.column('answers_json', sa.Text),
+    sa.column('correct_bitmap', sa.LargeBinary),
+    sa.column('feedback_json', sa.Text),
+)
+
+
+def _pack(bits):
+    packed = bytearray((len(bits) + 7) // 8)
+    for i, bit in enumerate(bits):
+        if bit:
+            packed[i // 8] |= 0x80 >> (i % 8)
+    return bytes(packed)
+
+
+def _unpack(packed, count):
+    return [bool(packed[i // 8] & (0x80 >> (i % 8))) for i in range(count)]
+
+
+def _questions(bind, row, cache):
+    if row.question_set_digest is None:
+        return json.loads(row.questions_json or '[]')
+    if row.question_set_digest not in cache:
+        cache[row.question_set_digest] = json.loads(bind.execute(
+            sa.select(question_set.c.questions_json).where(question_set.c.digest == row.question_set_digest)
+        ).scalar_one())
+    return cache[row.question_set_digest]
+
+
+def _batches(bind, condition):
+    last_id = 0
+    while True:
+        rows = bind.execute(
+            sa.select(
+                self_evaluation.c.id,
+                self_evaluation.c.quiz_type,
+                self_evaluation.c.question_set_digest,
+                self_evaluation.c.questions_json,
+                self_evaluation.c.answers_json,
+                self_evaluation.c.correct_bitmap,
+                self_evaluation.c.feedback_json,
+            )
+            .where(condition, self_evaluation.c.id > last_id)
+            .order_by(self_evaluation.c.id)
+            .limit(BATCH_SIZE)
+        ).all()
+        if not rows:
+            return
+        yield rows
+        last_id = rows[-1].id
+
+
+def _write(bind, updates):
+    if updates:
+        bind.execute(
+            self_evaluation.update()
+            .where(self_evaluation.c.id == sa.bindparam('eval_id'))
+            .values(correct_bitmap=sa.bindparam('bitmap'), feedback_json=sa.bindparam('feedback')),
+            updates,
+        )
+
+
+def upgrade():
+    with op.batch_alter_table('self_evaluation', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('correct_bitmap', sa.LargeBinary(), nullable=True))
+
+    with op.batch_alter_table('quiz_regrade_entry', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('old_correct_bitmap', sa.LargeBinary(), nullable=True))
+
+    bind = op.get_bind()
+    cache = {}
+    for rows in _batches(bind, self_evaluation.c.feedback_json.isnot(None)):
+        updates = []
+        for row in rows:
+            feedback = json.loads(row.feedback_json)
+            if row.quiz_type in OBJECTIVE_TYPES:
+                questions = _questions(bind, row, cache)
+                # Only compact feedback the question set reproduces exactly
+                if len(feedback) != len(questions) or any(
+                    item.get('correct_answer') != q.get('correct_answer')
+                    or item.get('explanation') != q.get('explanation', '')
+                    for item, q in zip(feedback, questions)
+                ):
+                    continue
+                bitmap = _pack([item.get('is_correct') for item in feedback])
+                updates.append({'eval_id': row.id, 'bitmap': bitmap, 'feedback': None})
+            else:
+                compact = [{'score': item.get('score', 0), 'feedback': item.get('feedback', '')} for item in feedback]
+                updates.append({'eval_id': row.id, 'bitmap': None, 'feedback': json.dumps(compact)})
+        _write(bind, updates)
+
+
+def downgrade():
+    bind = op.get_bind()
+    cache = {}
+    condition = sa.or_(self_evaluation.c.correct_bitmap.isnot(None), self_evaluation.c.feedback_json.isnot(None))
+    for rows in _batches(bind, condition):
+        updates = []
+        for row in rows:
+            answers = json.loads(row.answers_json or '[]')
+            if row.correct_bitmap is not None:
+                questions = _questions(bind, row, cache)
+                feedback = [
+                    {
+                        'question_index': i,
+                        'is_correct': is_correct,
+                        'correct_answer': q.get('correct_answer'),
+                        'explanation': q.get('explanation', ''),
+                        'user_answer': answer,
+                    }
+                    for i, (q, answer, is_correct) in enumerate(
+                        zip(questions, answers, _unpack(row.correct_bitmap, len(questions))))
+                ]
+            else:
+                feedback = [
+                    {'question_index': i, 'user_answer': answers[i] if i < len(answers) else None, **item}
+                    for i, item in enumerate(json.loads(row.feedback_json))
+                ]
+            updates.append({'eval_id': row.id, 'bitmap': None, 'feedback': json.dumps(feedback)})
+        _write(bind, updates)
+
+    with op.batch_alter_table('quiz_regrade_entry', schema=None) as batch_op:
+        batch_op.drop_column('old_correct_bitmap')
+
+    with op.batch_alter_table('self_evaluation', schema=None) as batch_op:
+        batch_op.drop_column('correct_bitmap')
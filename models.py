@@ -75,25 +75,97 @@ class CPMK(db.Model):
     code = db.Column(db.String(50), nullable=False)
     description = db.Column(db.Text, nullable=False)
 
+# Material ingestion stages, in pipeline order (see ingestion.py)
+MATERIAL_STAGES = ('stored', 'extracted', 'chunked', 'indexed', 'notified')
+MATERIAL_READY = 'notified'
+MATERIAL_SEARCHABLE = ('indexed', 'notified')
+
 material_cpmk = db.Table(
     'material_cpmk',
     db.Column('material_id', db.Integer, db.ForeignKey('material.id'), primary_key=True),
     db.Column('cpmk_id', db.Integer, db.ForeignKey('cpmk.id'), primary_key=True)
 )
 
+class StoredFile(db.Model):
+    """An uploaded file stored once on disk under its SHA-256 digest"""
+    id = db.Column(db.Integer, primary_key=True)
+    digest = db.Column(db.String(64), unique=True, nullable=False)
+    file_path = db.Column(db.String(500), nullable=False)
+    size = db.Column(db.Integer)
+    ref_count = db.Column(db.Integer, nullable=False, default=0)
+    # Extraction results cached per digest so identical files are processed once
+    content = db.Column(db.Text)
+    chunks_json = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    materials = db.relationship('Material', backref='stored_file', lazy=True)
+
 class Material(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     classroom_id = db.Column(db.Integer, db.ForeignKey('classroom.id'), nullable=False)
     title = db.Column(db.String(200), nullable=False)
-    content = db.Column(db.Text)
-    file_path = db.Column(db.String(500))
+    # Extracted text and chunks are deferred so material lists only load metadata;
+    # undefer them where the text is used
+    content = db.deferred(db.Column(db.Text))
+    file_path = db.Column(db.String(500), index=True)
     file_type = db.Column(db.String(50))
+    # Name the file was uploaded under; stored files are named by digest
+    original_filename = db.Column(db.String(255))
+    stored_file_id = db.Column(db.Integer, db.ForeignKey('stored_file.id'), nullable=True)
     uploaded_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # Ingestion pipeline state: last completed stage, or 'failed'
+    status = db.Column(db.String(20), nullable=False, default='stored')
+    failed_stage = db.Column(db.String(20))
+    status_message = db.Column(db.String(255))
+    # When ``status`` last changed; a pending material that stops advancing has lost its worker
+    status_updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+    chunks_json = db.deferred(db.Column(db.Text))  # JSON list of retrieval chunks
     
     # Relationships
     self_evaluations = db.relationship('SelfEvaluation', backref='material', lazy=True)
     cpmks = db.relationship('CPMK', secondary=material_cpmk, backref=db.backref('materials', lazy=True))
 
+    @property
+    def is_ready(self):
+        """Check if the material has finished ingestion"""
+        return self.status == MATERIAL_READY
+
+class UploadSession(db.Model):
+    """A chunked material upload in progress; parts live on disk until completion"""
+    id = db.Column(db.String(32), primary_key=True)
+    classroom_id = db.Column(db.Integer, db.ForeignKey('classroom.id'), nullable=False)
+    teacher_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    filename = db.Column(db.String(255), nullable=False)
+    title = db.Column(db.String(200), nullable=False)
+    cpmk_ids = db.Column(db.Text)  # JSON list of CPMK ids
+    total_size = db.Column(db.BigInteger, nullable=False)
+    part_size = db.Column(db.Integer, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    @property
+    def part_count(self):
+        return -(-self.total_size // self.part_size)
+
+    def expected_part_size(self, part_number):
+        """Return the byte size of a part; only the last may be short"""
+        if part_number < self.part_count:
+            return self.part_size
+        return self.total_size - self.part_size * (self.part_count - 1)
+
+class GeneratedContent(db.Model):
+    """A pre-generated quiz question set or study guide, keyed by source content hash"""
+    __tablename__ = 'generated_content'
+    __table_args__ = (db.Index('ix_generated_content_hash_kind', 'content_hash', 'kind'),)
+
+    id = db.Column(db.Integer, primary_key=True)
+    content_hash = db.Column(db.String(64), nullable=False)
+    # A quiz type ('mcq', 'true_false', 'essay') or 'study_guide'
+    kind = db.Column(db.String(20), nullable=False)
+    payload = db.Column(db.Text, nullable=False)
+    # Sanitized study guide HTML, stored when the guide is generated
+    html = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
 quiz_cpmk = db.Table(
     'quiz_cpmk',
     db.Column('quiz_id', db.Integer, db.ForeignKey('quiz.id'), primary_key=True),
@@ -138,6 +210,14 @@ class Quiz(db.Model):
         now = datetime.utcnow()
         return self.published and self.available_until and now > self.available_until
 
+class QuestionSet(db.Model):
+    """An immutable question list stored once under the SHA-256 of its JSON"""
+    __tablename__ = 'question_set'
+
+    digest = db.Column(db.String(64), primary_key=True)
+    questions_json = db.Column(db.Text, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
 class SelfEvaluation(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     student_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
@@ -145,16 +225,30 @@ class SelfEvaluation(db.Model):
     material_id = db.Column(db.Integer, db.ForeignKey('material.id'), nullable=True)
     quiz_id = db.Column(db.Integer, db.ForeignKey('quiz.id'), nullable=True)
     quiz_type = db.Column(db.String(20), nullable=False)  # 'mcq', 'true_false', 'essay'
-    questions_json = db.Column(db.Text, nullable=False)
-    answers_json = db.Column(db.Text, nullable=False)
+    # Teacher quiz attempts share a QuestionSet; AI quizzes are unique and keep their questions inline.
+    # The JSON columns are deferred so attempt lists never load them.
+    question_set_digest = db.Column(db.String(64), db.ForeignKey('question_set.digest'), index=True)
+    questions_json = db.deferred(db.Column(db.Text), group='attempt_body')
+    answers_json = db.deferred(db.Column(db.Text, nullable=False), group='attempt_body')
     score = db.Column(db.Float)
-    feedback_json = db.Column(db.Text)
+    # Objective attempts keep one bit per question and rebuild their feedback from the question set;
+    # feedback_json only holds AI essay feedback (and attempts stored before the compact format)
+    correct_bitmap = db.Column(db.LargeBinary)
+    feedback_json = db.deferred(db.Column(db.Text), group='attempt_body')
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     completed_at = db.Column(db.DateTime)
     # Flag to distinguish between AI-generated and teacher-created quizzes
     is_ai_generated = db.Column(db.Boolean, default=True)
     # For timed quizzes, track when the student started
     started_at = db.Column(db.DateTime)
+    # Set while a stream is generating the questions, refreshed as each one is saved
+    generating_since = db.Column(db.DateTime)
+
+    # Serve the per-student latest-attempt ranking of a quiz's results and the classroom attempts table
+    __table_args__ = (
+        db.Index('ix_self_evaluation_quiz_student', 'quiz_id', 'student_id'),
+        db.Index('ix_self_evaluation_classroom_created', 'classroom_id', 'created_at'),
+    )
     
     def get_status(self):
         """Return the status of this evaluation"""
@@ -180,6 +274,34 @@ class SelfEvaluation(db.Model):
         return self.score >= passing_score
 
 
+class QuizRegrade(db.Model):
+    """A bulk rescoring of a quiz's attempts against its current answer key"""
+    __tablename__ = 'quiz_regrade'
+
+    id = db.Column(db.Integer, primary_key=True)
+    quiz_id = db.Column(db.Integer, db.ForeignKey('quiz.id'), nullable=False, index=True)
+    teacher_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    changed_count = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    reverted_at = db.Column(db.DateTime)
+
+    quiz = db.relationship('Quiz', backref=db.backref('regrades', lazy=True))
+
+class QuizRegradeEntry(db.Model):
+    """The values an attempt had before a regrade changed it, kept so the regrade can be reverted"""
+    __tablename__ = 'quiz_regrade_entry'
+
+    id = db.Column(db.Integer, primary_key=True)
+    regrade_id = db.Column(db.Integer, db.ForeignKey('quiz_regrade.id'), nullable=False, index=True)
+    evaluation_id = db.Column(db.Integer, db.ForeignKey('self_evaluation.id'), nullable=False)
+    old_score = db.Column(db.Float)
+    new_score = db.Column(db.Float)
+    old_question_set_digest = db.Column(db.String(64))
+    old_questions_json = db.Column(db.Text)
+    old_correct_bitmap = db.Column(db.LargeBinary)
+    old_feedback_json = db.Column(db.Text)
+
+
 class Notification(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
@@ -204,6 +326,8 @@ class Assignment(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(200), nullable=False)
     description = db.Column(db.Text)
+    # Sanitized HTML rendered from the markdown description when it is set
+    description_html = db.Column(db.Text)
     classroom_id = db.Column(db.Integer, db.ForeignKey('classroom.id'), nullable=False)
     teacher_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     teacher = db.relationship('User', backref='created_assignments', lazy=True)
@@ -241,6 +365,9 @@ class AssignmentSubmission(db.Model):
     student_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     student = db.relationship('User', backref='assignment_submissions', lazy=True)
     content = db.Column(db.Text, nullable=False)
+    # Sanitized HTML rendered from the markdown content and feedback when they are set
+    content_html = db.Column(db.Text)
+    feedback_html = db.Column(db.Text)
     group_member_ids = db.Column(db.Text)  # JSON list of all participating student IDs
     submitted_at = db.Column(db.DateTime, default=datetime.utcnow)
     status = db.Column(db.String(50), default='Submitted')  # e.g., 'Submitted', 'Graded', 'Resubmitted'
@@ -0,0 +1,58 @@
+import hashlib
+import json
+from functools import lru_cache
+
+from sqlalchemy.exc import IntegrityError
+
+from extensions import db
+from models import QuestionSet
+import scoring
+
+# Question set JSON kept per process; sets are immutable, so entries never go stale
+CACHE_SIZE = 256
+
+
+def content_hash(questions_json):
+    return hashlib.sha256(questions_json.encode('utf-8')).hexdigest()
+
+
+def get_or_create(questions_json):
+    """Return the digest of the stored set for ``questions_json``, inserting it if new.
+
+    If another request inserts the same set first, the primary key rejects
+    our row and the session is rolled back, so call this before adding
+    anything else to the session. The caller commits.
+    """
+    digest = content_hash(questions_json)
+    if db.session.query(QuestionSet.digest).filter_by(digest=digest).scalar():
+        return digest
+    db.session.add(QuestionSet(digest=digest, questions_json=questions_json))
+    try:
+        db.session.flush()
+    except IntegrityError:
+        db.session.rollback()
+    return digest
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def load_json(digest):
+    """Return the stored JSON for a question set, reading it once per process."""
+    questions_json = db.session.query(QuestionSet.questions_json).filter_by(digest=digest).scalar()
+    if questions_json is None:
+        raise LookupError(f"Unknown question set {digest}")
+    return questions_json
+
+
+def questions_json_for(evaluation):
+    if evaluation.question_set_digest:
+        return load_json(evaluation.question_set_digest)
+    return evaluation.questions_json or '[]'
+
+
+def questions_for(evaluation):
+    """Return a fresh list of the evaluation's questions that the caller may modify."""
+    return json.loads(questions_json_for(evaluation))
+
+
+def answer_key_for(evaluation):
+    return scoring.compile_key(questions_json_for(evaluation))
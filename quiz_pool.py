@@ -0,0 +1,152 @@
+import hashlib
+import json
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import current_app
+from sqlalchemy.orm import undefer
+
+from extensions import db
+from models import GeneratedContent, Material
+import ai_service
+import sanitize
+
+QUIZ_KINDS = ('mcq', 'true_false', 'essay')
+STUDY_GUIDE = 'study_guide'
+
+_executor = None
+_executor_lock = threading.Lock()
+# (content_hash, kind) pairs with a fill job queued or running in this process
+_in_flight = set()
+_in_flight_lock = threading.Lock()
+
+
+def _get_executor(app):
+    """Return the process-local warm-up pool, created on first use like the ingestion pool."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=app.config.get('QUIZ_POOL_WORKERS', 1),
+                thread_name_prefix='quiz-pool',
+            )
+    return _executor
+
+
+def content_hash(content):
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+
+def material_source(material):
+    """Return the ``(content, context)`` a single-material quiz is generated from."""
+    return material.content, f"Material: {material.title}"
+
+
+def available(digest, kind):
+    return GeneratedContent.query.filter_by(content_hash=digest, kind=kind).count()
+
+
+def take_quiz(digest, quiz_type):
+    """Remove and return one pooled question set, or None if the pool is empty.
+
+    Rows are claimed with a conditional DELETE so two students can never be
+    handed the same set, even from different workers.
+    """
+    while True:
+        entry = (
+            GeneratedContent.query
+            .filter_by(content_hash=digest, kind=quiz_type)
+            .order_by(GeneratedContent.id)
+            .first()
+        )
+        if entry is None:
+            return None
+        payload = entry.payload
+        claimed = GeneratedContent.query.filter_by(id=entry.id).delete(synchronize_session=False)
+        db.session.commit()
+        if claimed:
+            return json.loads(payload)
+
+
+def get_study_guide(digest):
+    """Return the pooled study guide for the content as sanitized HTML, if one was generated."""
+    entry = (
+        GeneratedContent.query
+        .filter_by(content_hash=digest, kind=STUDY_GUIDE)
+        .order_by(GeneratedContent.id.desc())
+        .first()
+    )
+    if entry is None:
+        return None
+    # Guides pooled before the sanitized copy was stored are cleaned on read
+    return entry.html or sanitize.clean_study_guide(entry.payload)
+
+
+def discard(digest):
+    """Drop everything pooled for the content."""
+    GeneratedContent.query.filter_by(content_hash=digest).delete(synchronize_session=False)
+
+
+def fill(app, digest, content, context, kinds):
+    """Generate content until each kind reaches its target size."""
+    with app.app_context():
+        target = app.config.get('QUIZ_POOL_SIZE', 2)
+        service = ai_service.get_service()
+        try:
+            for kind in kinds:
+                wanted = (1 if kind == STUDY_GUIDE else target) - available(digest, kind)
+                for _ in range(max(wanted, 0)):
+                    try:
+                        if kind == STUDY_GUIDE:
+                            payload = service.generate_study_guide(content, context)
+                        else:
+                            payload = json.dumps(service.generate_quiz(content, kind, context))
+                    except Exception as e:
+                        logging.error(f"Pre-generating {kind} for {digest[:12]} failed: {str(e)}")
+                        break
+                    html = sanitize.clean_study_guide(payload) if kind == STUDY_GUIDE else None
+                    db.session.add(GeneratedContent(content_hash=digest, kind=kind, payload=payload, html=html))
+                    db.session.commit()
+        finally:
+            with _in_flight_lock:
+                for kind in kinds:
+                    _in_flight.discard((digest, kind))
+
+
+def schedule_fill(digest, content, context, kinds):
+    """Queue a fill job for the kinds that are not already being filled.
+
+    With ``QUIZ_POOL_SYNC`` set the job runs inline. A ``QUIZ_POOL_SIZE`` of
+    zero disables pre-generation, and so does TESTING unless the job runs
+    inline, so tests never leave background AI calls behind.
+    """
+    app = current_app._get_current_object()
+    if app.config.get('QUIZ_POOL_SIZE', 2) <= 0 or not content:
+        return None
+    if app.testing and not app.config.get('QUIZ_POOL_SYNC'):
+        return None
+    with _in_flight_lock:
+        kinds = [kind for kind in kinds if (digest, kind) not in _in_flight]
+        _in_flight.update((digest, kind) for kind in kinds)
+    if not kinds:
+        return None
+    if app.config.get('QUIZ_POOL_SYNC'):
+        fill(app, digest, content, context, kinds)
+        return None
+    return _get_executor(app).submit(fill, app, digest, content, context, kinds)
+
+
+def refill_if_low(digest, content, context, quiz_type):
+    """Top the pool back up once it has dropped below the low-water mark."""
+    if available(digest, quiz_type) < current_app.config.get('QUIZ_POOL_LOW_WATER', 1):
+        schedule_fill(digest, content, context, [quiz_type])
+
+
+def warm_material(material_id):
+    """Pre-generate quiz sets and a study guide for a newly ingested material."""
+    material = db.session.get(Material, material_id, options=[undefer(Material.content)])
+    if material is None or not material.content:
+        return None
+    content, context = material_source(material)
+    return schedule_fill(content_hash(content), content, context, list(QUIZ_KINDS) + [STUDY_GUIDE])
@@ -0,0 +1,108 @@
+from sqlalchemy import and_, case, func, select
+
+from extensions import db
+from models import Enrollment, SelfEvaluation, User
+
+# Score histogram buckets: 0-9, 10-19, ... 90-100
+HISTOGRAM_BUCKETS = 10
+
+
+def latest_attempts(quiz_id):
+    """Subquery of each student's latest attempt at a quiz.
+
+    A completed attempt beats an unfinished one; among completed attempts
+    the most recently completed wins, otherwise the most recently created.
+    """
+    ranked = (
+        select(
+            SelfEvaluation.id,
+            SelfEvaluation.student_id,
+            SelfEvaluation.score,
+            SelfEvaluation.started_at,
+            SelfEvaluation.completed_at,
+            func.row_number().over(
+                partition_by=SelfEvaluation.student_id,
+                order_by=(
+                    SelfEvaluation.completed_at.is_(None),
+                    SelfEvaluation.completed_at.desc(),
+                    SelfEvaluation.id.desc(),
+                ),
+            ).label('rank'),
+        )
+        .where(SelfEvaluation.quiz_id == quiz_id)
+        .subquery()
+    )
+    return select(ranked).where(ranked.c.rank == 1).subquery('latest')
+
+
+def _select_enrolled(quiz, latest, *columns):
+    """Select ``columns`` over the classroom's enrolled students joined to their latest attempt."""
+    return (
+        select(*columns)
+        .select_from(Enrollment)
+        .outerjoin(latest, latest.c.student_id == Enrollment.student_id)
+        .where(Enrollment.classroom_id == quiz.classroom_id)
+    )
+
+
+def summary(quiz, latest=None):
+    """Counts, average score and pass rate over enrolled students' latest attempts."""
+    latest = latest if latest is not None else latest_attempts(quiz.id)
+    completed = latest.c.completed_at.isnot(None)
+    row = db.session.execute(
+        _select_enrolled(
+            quiz, latest,
+            func.count(Enrollment.id).label('students'),
+            func.count(case((completed, 1))).label('completed'),
+            func.count(case((and_(~completed, latest.c.started_at.isnot(None)), 1))).label('in_progress'),
+            func.avg(case((completed, func.coalesce(latest.c.score, 0.0)))).label('avg_score'),
+            func.count(case((and_(completed, latest.c.score >= quiz.passing_score), 1))).label('passed'),
+        )
+    ).one()
+    return {
+        'students': row.students,
+        'completed_count': row.completed,
+        'in_progress_count': row.in_progress,
+        'not_started_count': row.students - row.completed - row.in_progress,
+        'avg_score': row.avg_score if row.completed else None,
+        'pass_rate': row.passed / row.completed * 100 if row.completed else None,
+    }
+
+
+def histogram(quiz, latest=None):
+    """Return how many enrolled students' latest completed scores fall in each bucket."""
+    latest = latest if latest is not None else latest_attempts(quiz.id)
+    width = 100 // HISTOGRAM_BUCKETS
+    score = func.coalesce(latest.c.score, 0.0)
+    bucket = case(
+        *[(score >= b * width, b) for b in range(HISTOGRAM_BUCKETS - 1, 0, -1)],
+        else_=0,
+    ).label('bucket')
+    counts = [0] * HISTOGRAM_BUCKETS
+    for row in db.session.execute(
+        _select_enrolled(quiz, latest, bucket, func.count())
+        .where(latest.c.completed_at.isnot(None))
+        .group_by(bucket)
+    ):
+        counts[row[0]] = row[1]
+    return counts
+
+
+def student_page(quiz, page, per_page, latest=None):
+    """One page of enrolled students, by name, each with their latest attempt or None."""
+    latest = latest if latest is not None else latest_attempts(quiz.id)
+    return db.session.execute(
+        select(
+            User,
+            latest.c.id.label('evaluation_id'),
+            latest.c.score,
+            latest.c.started_at,
+            latest.c.completed_at,
+        )
+        .join(Enrollment, Enrollment.student_id == User.id)
+        .outerjoin(latest, latest.c.student_id == User.id)
+        .where(Enrollment.classroom_id == quiz.classroom_id)
+        .order_by(User.last_name, User.first_name, User.id)
+        .limit(per_page)
+        .offset((page - 1) * per_page)
+    ).all()
@@ -0,0 +1,292 @@
+import logging
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+
+from google.api_core import exceptions as google_exceptions
+
+# Lower numbers are served first when workers compete for tokens
+PRIORITIES = {
+    'score_essay': 0,
+    'generate_quiz': 1,
+    'generate_study_guide': 1,
+    'daily_quote': 2,
+}
+# Longest an operation waits for a token before giving up, in seconds.
+# The daily quote is fetched while rendering a page, so it gives up quickly.
+TIMEOUTS = {
+    'score_essay': 120,
+    'generate_quiz': 120,
+    'generate_study_guide': 120,
+    'daily_quote': 2,
+}
+DEFAULT_PRIORITY = 1
+DEFAULT_TIMEOUT = 60
+
+# Provider errors worth retrying; anything else is raised straight away
+RETRYABLE_ERRORS = (
+    google_exceptions.ResourceExhausted,
+    google_exceptions.TooManyRequests,
+    google_exceptions.ServiceUnavailable,
+    google_exceptions.DeadlineExceeded,
+)
+
+POLL_INTERVAL = 0.05
+# Waiters refresh their queue entry every poll; older entries belong to dead workers
+WAITER_STALE_AFTER = 5.0
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS bucket (
+    name TEXT PRIMARY KEY,
+    tokens REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    blocked_until REAL NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS waiter (
+    id TEXT PRIMARY KEY,
+    priority INTEGER NOT NULL,
+    enqueued_at REAL NOT NULL,
+    heartbeat_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS metric (
+    operation TEXT PRIMARY KEY,
+    calls INTEGER NOT NULL DEFAULT 0,
+    wait_total REAL NOT NULL DEFAULT 0,
+    wait_max REAL NOT NULL DEFAULT 0,
+    retries INTEGER NOT NULL DEFAULT 0,
+    throttled INTEGER NOT NULL DEFAULT 0,
+    timeouts INTEGER NOT NULL DEFAULT 0
+);
+"""
+
+
+class RateLimitTimeout(Exception):
+    """Raised when no token became available within the operation's timeout"""
+
+
+class RateLimiter:
+    """Token bucket shared by every worker process on the host.
+
+    State lives in a small SQLite database and every change happens inside
+    a ``BEGIN IMMEDIATE`` transaction, so gunicorn workers see one bucket.
+    Waiting callers register in a queue table; a token goes to the highest
+    priority, longest waiting caller.
+    """
+
+    def __init__(self, path, rate_per_minute=60, burst=10, name='gemini',
+                 clock=time.time, sleep=time.sleep):
+        self.path = path
+        self.rate = rate_per_minute / 60.0
+        self.burst = burst
+        self.name = name
+        self.clock = clock
+        self.sleep = sleep
+        with self._connect() as conn:
+            conn.executescript(_SCHEMA)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+        conn.execute('PRAGMA journal_mode=WAL')
+        return conn
+
+    def _refill(self, conn, now):
+        row = conn.execute(
+            'SELECT tokens, updated_at, blocked_until FROM bucket WHERE name = ?', (self.name,)
+        ).fetchone()
+        if row is None:
+            conn.execute(
+                'INSERT INTO bucket (name, tokens, updated_at) VALUES (?, ?, ?)',
+                (self.name, float(self.burst), now),
+            )
+            return float(self.burst), 0.0
+        tokens, updated_at, blocked_until = row
+        tokens = min(float(self.burst), tokens + max(now - updated_at, 0) * self.rate)
+        return tokens, blocked_until
+
+    def _try_acquire(self, conn, waiter_id, priority, now):
+        """Take a token for ``waiter_id`` if it is at the head of the queue."""
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.execute('DELETE FROM waiter WHERE heartbeat_at < ?', (now - WAITER_STALE_AFTER,))
+            conn.execute('UPDATE waiter SET heartbeat_at = ? WHERE id = ?', (now, waiter_id))
+            tokens, blocked_until = self._refill(conn, now)
+            ahead = conn.execute(
+                'SELECT 1 FROM waiter WHERE id != ? AND (priority < ? OR '
+                '(priority = ? AND enqueued_at < (SELECT enqueued_at FROM waiter WHERE id = ?))) LIMIT 1',
+                (waiter_id, priority, priority, waiter_id),
+            ).fetchone()
+            acquired = ahead is None and now >= blocked_until and tokens >= 1
+            if acquired:
+                tokens -= 1
+                conn.execute('DELETE FROM waiter WHERE id = ?', (waiter_id,))
+            conn.execute(
+                'UPDATE bucket SET tokens = ?, updated_at = ? WHERE name = ?',
+                (tokens, now, self.name),
+            )
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return acquired
+
+    def acquire(self, operation, timeout=None):
+        """Block until a token is available and return the seconds spent waiting."""
+        priority = PRIORITIES.get(operation, DEFAULT_PRIORITY)
+        timeout = TIMEOUTS.get(operation, DEFAULT_TIMEOUT) if timeout is None else timeout
+        waiter_id = uuid.uuid4().hex
+        start = self.clock()
+        conn = self._connect()
+        try:
+            conn.execute(
+                'INSERT INTO waiter (id, priority, enqueued_at, heartbeat_at) VALUES (?, ?, ?, ?)',
+                (waiter_id, priority, start, start),
+            )
+            while not self._try_acquire(conn, waiter_id, priority, self.clock()):
+                if self.clock() - start >= timeout:
+                    conn.execute('DELETE FROM waiter WHERE id = ?', (waiter_id,))
+                    self._record(conn, operation, timeouts=1)
+                    raise RateLimitTimeout(f"No AI capacity for '{operation}' within {timeout}s")
+                self.sleep(POLL_INTERVAL)
+            waited = self.clock() - start
+            self._record(conn, operation, calls=1, wait=waited)
+            return waited
+        finally:
+            conn.close()
+
+    def throttle(self, delay):
+        """Pause every worker for ``delay`` seconds after the provider pushes back."""
+        now = self.clock()
+        conn = self._connect()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            self._refill(conn, now)
+            conn.execute(
+                'UPDATE bucket SET tokens = 0, updated_at = ?, blocked_until = MAX(blocked_until, ?) '
+                'WHERE name = ?',
+                (now, now + delay, self.name),
+            )
+            conn.execute('COMMIT')
+        finally:
+            conn.close()
+
+    def _record(self, conn, operation, calls=0, wait=0.0, retries=0, throttled=0, timeouts=0):
+        conn.execute('INSERT OR IGNORE INTO metric (operation) VALUES (?)', (operation,))
+        conn.execute(
+            'UPDATE metric SET calls = calls + ?, wait_total = wait_total + ?, '
+            'wait_max = MAX(wait_max, ?), retries = retries + ?, throttled = throttled + ?, '
+            'timeouts = timeouts + ? WHERE operation = ?',
+            (calls, wait, wait, retries, throttled, timeouts, operation),
+        )
+
+    def record(self, operation, **counts):
+        conn = self._connect()
+        try:
+            self._record(conn, operation, **counts)
+        finally:
+            conn.close()
+
+    def metrics(self):
+        """Return queue wait and retry counters per operation, across all workers."""
+        conn = self._connect()
+        try:
+            rows = conn.execute(
+                'SELECT operation, calls, wait_total, wait_max, retries, throttled, timeouts FROM metric'
+            ).fetchall()
+        finally:
+            conn.close()
+        return {
+            operation: {
+                'calls': calls,
+                'wait_avg': wait_total / calls if calls else 0.0,
+                'wait_max': wait_max,
+                'retries': retries,
+                'throttled': throttled,
+                'timeouts': timeouts,
+            }
+            for operation, calls, wait_total, wait_max, retries, throttled, timeouts in rows
+        }
+
+
+def backoff_delay(attempt, base=1.0, cap=30.0):
+    """Full-jitter exponential backoff for the given retry attempt (0-based)."""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+def call(operation, fn, max_retries=None, limiter=None):
+    """Run ``fn`` under the shared rate limit, retrying provider throttling.
+
+    A retryable error pauses the whole bucket for the backoff delay, so other
+    workers back off too instead of retrying at the same moment.
+    """
+    limiter = limiter or get_limiter()
+    if max_retries is None:
+        max_retries = int(os.getenv('AI_MAX_RETRIES', '3'))
+    attempt = 0
+    while True:
+        waited = limiter.acquire(operation)
+        if waited > 1:
+            logging.info(f"AI call '{operation}' waited {waited:.2f}s for rate limit")
+        try:
+            return fn()
+        except RETRYABLE_ERRORS as e:
+            if attempt >= max_retries:
+                limiter.record(operation, throttled=1)
+                raise
+            delay = backoff_delay(attempt)
+            logging.warning(f"AI call '{operation}' throttled ({e}); retrying in {delay:.2f}s")
+            limiter.record(operation, retries=1, throttled=1)
+            limiter.throttle(delay)
+            attempt += 1
+
+
+def stream(operation, fn, max_retries=None, limiter=None):
+    """Iterate the generator returned by ``fn`` under the shared rate limit.
+
+    Throttling is retried like ``call`` until the first piece arrives; once
+    output has reached the caller a failure is raised instead of restarting.
+    """
+    limiter = limiter or get_limiter()
+    if max_retries is None:
+        max_retries = int(os.getenv('AI_MAX_RETRIES', '3'))
+    attempt = 0
+    while True:
+        limiter.acquire(operation)
+        started = False
+        try:
+            for piece in fn():
+                started = True
+                yield piece
+            return
+        except RETRYABLE_ERRORS as e:
+            if started or attempt >= max_retries:
+                limiter.record(operation, throttled=1)
+                raise
+            delay = backoff_delay(attempt)
+            logging.warning(f"AI stream '{operation}' throttled ({e}); retrying in {delay:.2f}s")
+            limiter.record(operation, retries=1, throttled=1)
+            limiter.throttle(delay)
+            attempt += 1
+
+
+_limiter = None
+_limiter_lock = threading.Lock()
+
+
+def get_limiter():
+    """Return the process-wide limiter configured from the environment."""
+    global _limiter
+    with _limiter_lock:
+        if _limiter is None:
+            path = os.getenv('AI_RATE_LIMIT_DB') or os.path.join(
+                tempfile.gettempdir(), 'atlverse-ai-rate-limit.sqlite3'
+            )
+            _limiter = RateLimiter(
+                path,
+                rate_per_minute=float(os.getenv('AI_RATE_LIMIT_PER_MINUTE', '60')),
+                burst=int(os.getenv('AI_RATE_LIMIT_BURST', '10')),
+            )
+    return _limiter
@@ -0,0 +1,206 @@
+import json
+from datetime import datetime
+
+import numpy as np
+from sqlalchemy import insert, update
+
+from extensions import db
+from models import QuizRegrade, QuizRegradeEntry, SelfEvaluation
+import attempts
+import cache
+import question_sets
+import scoring
+from scoring import OBJECTIVE_TYPES
+
+# Attempts loaded, rescored and written back per round trip
+BATCH_SIZE = 500
+
+
+class RegradeError(Exception):
+    """Raised when a quiz cannot be regraded or a regrade cannot be reverted"""
+
+
+def _attempt_batches(quiz_id, batch_size):
+    """Yield completed attempts in id order, one keyset page at a time."""
+    last_id = 0
+    while True:
+        rows = (
+            db.session.query(
+                SelfEvaluation.id,
+                SelfEvaluation.student_id,
+                SelfEvaluation.score,
+                SelfEvaluation.answers_json,
+                SelfEvaluation.question_set_digest,
+                SelfEvaluation.questions_json,
+                SelfEvaluation.correct_bitmap,
+                SelfEvaluation.feedback_json,
+            )
+            .filter(
+                SelfEvaluation.quiz_id == quiz_id,
+                SelfEvaluation.completed_at.isnot(None),
+                SelfEvaluation.id > last_id,
+            )
+            .order_by(SelfEvaluation.id)
+            .limit(batch_size)
+            .all()
+        )
+        if not rows:
+            return
+        yield rows
+        last_id = rows[-1].id
+
+
+def _rescore(key, rows):
+    """Rescore a batch against ``key`` in one vectorized comparison.
+
+    Attempts whose answer count no longer matches the quiz are left out.
+    Returns ``(attempts, correct, scores)`` where ``attempts`` pairs each
+    row with its decoded answers.
+    """
+    usable = []
+    for row in rows:
+        answers = json.loads(row.answers_json or '[]')
+        if len(answers) == len(key):
+            usable.append((row, answers))
+    if not usable or not len(key):
+        return [], np.zeros((0, len(key)), dtype=bool), np.zeros(0)
+
+    correct = key.encode_many([answers for _, answers in usable]) == key.codes
+    scores = correct.sum(axis=1) / len(key) * 100
+    return usable, correct, scores
+
+
+def _changes(quiz, batch_size):
+    """Yield, per batch, the attempts whose score or key changed under the quiz's current key."""
+    if quiz.quiz_type not in OBJECTIVE_TYPES:
+        raise RegradeError('Only multiple choice and true/false quizzes can be regraded.')
+    digest = question_sets.content_hash(quiz.questions_json)
+    key = scoring.compile_key(quiz.questions_json)
+    for rows in _attempt_batches(quiz.id, batch_size):
+        usable, correct, scores = _rescore(key, rows)
+        changes = []
+        for (row, answers), correct_row, new_score in zip(usable, correct, scores.tolist()):
+            if row.question_set_digest == digest and row.score is not None and abs(row.score - new_score) < 1e-9:
+                continue
+            changes.append((row, answers, correct_row, new_score))
+        yield key, changes
+
+
+def preview(quiz, batch_size=BATCH_SIZE):
+    """Return the score changes a regrade would make, without writing anything.
+
+    Each delta is a dict with the evaluation and student ids, the old and new
+    scores and whether the attempt crosses the passing score.
+    """
+    deltas = []
+    for _, changes in _changes(quiz, batch_size):
+        for row, _, _, new_score in changes:
+            old_score = row.score
+            deltas.append({
+                'evaluation_id': row.id,
+                'student_id': row.student_id,
+                'old_score': old_score,
+                'new_score': new_score,
+                'delta': new_score - (old_score or 0.0),
+                'pass_changed': (old_score is not None and old_score >= quiz.passing_score) != (new_score >= quiz.passing_score),
+            })
+    return deltas
+
+
+def apply(quiz, teacher_id, batch_size=BATCH_SIZE):
+    """Rescore every completed attempt against the quiz's current answer key.
+
+    Previous values are saved in QuizRegradeEntry rows so the run can be
+    reverted. Attempts are written back with bulk UPDATEs, one per batch,
+    and the whole run is committed at once.
+    """
+    digest = question_sets.get_or_create(quiz.questions_json)
+    run = QuizRegrade(quiz_id=quiz.id, teacher_id=teacher_id, changed_count=0)
+    db.session.add(run)
+    db.session.flush()
+    for key, changes in _changes(quiz, batch_size):
+        if not changes:
+            continue
+        db.session.execute(insert(QuizRegradeEntry), [
+            {
+                'regrade_id': run.id,
+                'evaluation_id': row.id,
+                'old_score': row.score,
+                'new_score': new_score,
+                'old_question_set_digest': row.question_set_digest,
+                'old_questions_json': row.questions_json,
+                'old_correct_bitmap': row.correct_bitmap,
+                'old_feedback_json': row.feedback_json,
+            }
+            for row, _, _, new_score in changes
+        ])
+        db.session.execute(update(SelfEvaluation), [
+            {
+                'id': row.id,
+                'score': new_score,
+                'question_set_digest': digest,
+                'questions_json': None,
+                'correct_bitmap': attempts.pack_bits(correct_row),
+                'feedback_json': None,
+            }
+            for row, _, correct_row, new_score in changes
+        ])
+        run.changed_count += len(changes)
+    # The bulk UPDATEs bypass the model listeners
+    cache.invalidate_classroom(quiz.classroom_id, db.session, 'SelfEvaluation')
+    db.session.commit()
+    return run
+
+
+def revert(run, batch_size=BATCH_SIZE):
+    """Restore the scores, questions and feedback a regrade replaced.
+
+    Only the latest active regrade of a quiz can be reverted, since a later
+    one saved the values this one wrote.
+    """
+    if run.reverted_at is not None:
+        raise RegradeError('This regrade has already been reverted.')
+    latest = (
+        QuizRegrade.query
+        .filter_by(quiz_id=run.quiz_id, reverted_at=None)
+        .order_by(QuizRegrade.id.desc())
+        .first()
+    )
+    if latest.id != run.id:
+        raise RegradeError('Revert the newer regrades of this quiz first.')
+
+    last_id = 0
+    while True:
+        entries = (
+            db.session.query(
+                QuizRegradeEntry.id,
+                QuizRegradeEntry.evaluation_id,
+                QuizRegradeEntry.old_score,
+                QuizRegradeEntry.old_question_set_digest,
+                QuizRegradeEntry.old_questions_json,
+                QuizRegradeEntry.old_correct_bitmap,
+                QuizRegradeEntry.old_feedback_json,
+            )
+            .filter(QuizRegradeEntry.regrade_id == run.id, QuizRegradeEntry.id > last_id)
+            .order_by(QuizRegradeEntry.id)
+            .limit(batch_size)
+            .all()
+        )
+        if not entries:
+            break
+        db.session.execute(update(SelfEvaluation), [
+            {
+                'id': entry.evaluation_id,
+                'score': entry.old_score,
+                'question_set_digest': entry.old_question_set_digest,
+                'questions_json': entry.old_questions_json,
+                'correct_bitmap': entry.old_correct_bitmap,
+                'feedback_json': entry.old_feedback_json,
+            }
+            for entry in entries
+        ])
+        last_id = entries[-1].id
+    run.reverted_at = datetime.utcnow()
+    cache.invalidate_classroom(run.quiz.classroom_id, db.session, 'SelfEvaluation')
+    db.session.commit()
+    return run
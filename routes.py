@@ -1,51 +1,86 @@
 import os
 import json
+import time
 import defusedcsv as csv
 import io
 from datetime import datetime, timedelta
 from urllib.parse import urlparse, urljoin
-from flask import render_template, request, redirect, url_for, flash, session, jsonify, send_file, make_response, send_from_directory
+from flask import abort, current_app, render_template, request, redirect, url_for, flash, session, jsonify, send_file, make_response, send_from_directory, Response, stream_with_context
 from markupsafe import Markup
-import bleach
-import re
 from flask_login import login_user, logout_user, login_required, current_user
 from werkzeug.utils import secure_filename
 from werkzeug.exceptions import RequestEntityTooLarge
-from app import app, db
+from extensions import db
 import logging
 from models import (
     User, Classroom, Enrollment, Material, SelfEvaluation, Quiz,
     Notification, Assignment, AssignmentSubmission, CPMK,
-    quiz_cpmk, assignment_cpmk,
+    quiz_cpmk, assignment_cpmk, MATERIAL_READY, UploadSession, QuizRegrade,
 )
-from awards_utils import calculate_awards_for_student, calculate_star_total, get_classroom_star_rankings
-from ai_service import AIService
-from utils import allowed_file, extract_text_from_file
-from sqlalchemy.orm import joinedload
+from awards_utils import calculate_awards_for_student, calculate_star_total, count_gold_awards, get_classroom_star_rankings
+import ai_service
+from utils import allowed_file
+import identity
+import ingestion
+import storage
+import file_serving
+import chunked_upload
+import quiz_pool
+import regrade
+import scoring
+import question_sets
+import attempts
+import quiz_results
+import item_analysis
+import classroom_results
+import sanitize
+from html_stream import IncrementalSanitizer
+from sanitize import ALLOWED_TAGS, ALLOWED_ATTRS
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import joinedload, undefer, undefer_group
 import base64
-import matplotlib
-matplotlib.use('Agg') # Use the Agg backend for non-interactive plotting
-import matplotlib.pyplot as plt
 from math import pi
 
-ai_service = AIService()
-
-# HTML sanitization settings for AI-generated content
-ALLOWED_TAGS = [
-    'p', 'br', 'div', 'span', 'a', 'ul', 'ol', 'li',
-    'strong', 'em', 'b', 'i', 'u', 'blockquote', 'code', 'pre',
-    'h1', 'h2', 'h3', 'h4', 'h5', 'h6',
-    'table', 'thead', 'tbody', 'tr', 'th', 'td',
-    'img', 'hr'
-]
-ALLOWED_ATTRS = {
-    '*': ['class', 'id', 'style', re.compile(r'^data-.*$')],
-    'a': ['href', 'title'],
-    'img': ['src', 'alt', 'title'],
-    'th': ['colspan', 'rowspan', 'style'],
-    'td': ['colspan', 'rowspan', 'style'],
-    'table': ['style', 'border', 'cellpadding', 'cellspacing']
-}
+
+def _pyplot():
+    """Import pyplot on first use; matplotlib is only needed for the progress charts."""
+    import matplotlib
+    matplotlib.use('Agg') # Use the Agg backend for non-interactive plotting
+    import matplotlib.pyplot as plt
+    return plt
+
+
+class _Views:
+    """Records the views below so create_app can register them on each app it builds."""
+
+    def __init__(self):
+        self._routes = []
+        self._error_handlers = []
+
+    def route(self, rule, **options):
+        def decorator(view):
+            self._routes.append((rule, options, view))
+            return view
+        return decorator
+
+    def errorhandler(self, code):
+        def decorator(handler):
+            self._error_handlers.append((code, handler))
+            return handler
+        return decorator
+
+    def register(self, app):
+        for rule, options, view in self._routes:
+            app.route(rule, **options)(view)
+        for code, handler in self._error_handlers:
+            app.register_error_handler(code, handler)
+
+
+views = _Views()
+
+
+def init_app(app):
+    views.register(app)
 
 def is_safe_url(target):
     """Check if a URL is safe for redirect (same domain only)"""
@@ -53,7 +88,7 @@ def is_safe_url(target):
     test_url = urlparse(urljoin(request.host_url, target))
     return test_url.scheme in ('http', 'https') and ref_url.netloc == test_url.netloc
 
-@app.route('/')
+@views.route('/')
 def index():
     if current_user.is_authenticated:
         if current_user.role == 'teacher':
@@ -63,7 +98,7 @@ def index():
     return render_template('index.html')
 
 # Authentication routes
-@app.route('/login', methods=['GET', 'POST'])
+@views.route('/login', methods=['GET', 'POST'])
 def auth_login():
     if current_user.is_authenticated:
         return redirect(url_for('index'))
@@ -86,7 +121,7 @@ def auth_login():
     
     return render_template('auth/login.html')
 
-@app.route('/register', methods=['GET', 'POST'])
+@views.route('/register', methods=['GET', 'POST'])
 def auth_register():
     if current_user.is_authenticated:
         return redirect(url_for('index'))
@@ -130,48 +165,69 @@ def auth_register():
     
     return render_template('auth/register.html')
 
-@app.route('/logout')
+@views.route('/logout')
 @login_required
 def auth_logout():
     logout_user()
     flash('You have been logged out', 'info')
     return redirect(url_for('index'))
 
+def _classroom_stats(model, active):
+    """Count a model's total, published and currently active rows in each of the teacher's classrooms."""
+    rows = (
+        db.session.query(
+            model.classroom_id,
+            db.func.count(model.id),
+            db.func.count(db.case((model.published.is_(True), 1))),
+            db.func.count(db.case((active, 1))),
+        )
+        .join(Classroom, Classroom.id == model.classroom_id)
+        .filter(Classroom.teacher_id == current_user.id)
+        .group_by(model.classroom_id)
+    )
+    return {
+        classroom_id: {'total': total, 'published': published, 'active': active_count}
+        for classroom_id, total, published, active_count in rows
+    }
+
 # Teacher routes
-@app.route('/teacher/dashboard')
+@views.route('/teacher/dashboard')
 @login_required
 def teacher_dashboard():
     if current_user.role != 'teacher':
         flash('Access denied', 'error')
         return redirect(url_for('index'))
     
-    # Get classrooms with quiz information
-    classrooms = []
-    for classroom in Classroom.query.filter_by(teacher_id=current_user.id).all():
-        # Get quiz counts for this classroom
-        quizzes = Quiz.query.filter_by(classroom_id=classroom.id).all()
-        active_quizzes = [q for q in quizzes if q.published and q.is_available()]
-        
-        classroom.quiz_stats = {
-            'total': len(quizzes),
-            'published': len([q for q in quizzes if q.published]),
-            'active': len(active_quizzes)
-        }
-        
-        # Get assignment counts for this classroom
-        assignments = Assignment.query.filter_by(classroom_id=classroom.id).all()
-        active_assignments = [a for a in assignments if a.published and not a.is_past_deadline()]
-
-        classroom.assignment_stats = {
-            'total': len(assignments),
-            'published': len([a for a in assignments if a.published]),
-            'active': len(active_assignments)
-        }
-        classrooms.append(classroom)
+    now = datetime.utcnow()
+    quiz_active = db.and_(
+        Quiz.published.is_(True),
+        db.or_(Quiz.available_from.is_(None), Quiz.available_from <= now),
+        db.or_(Quiz.available_until.is_(None), Quiz.available_until >= now),
+    )
+    assignment_active = db.and_(
+        Assignment.published.is_(True),
+        db.or_(Assignment.deadline.is_(None), Assignment.deadline >= now),
+    )
+    # One grouped query per entity covers all of the teacher's classrooms
+    quiz_stats = _classroom_stats(Quiz, quiz_active)
+    assignment_stats = _classroom_stats(Assignment, assignment_active)
+    student_counts = dict(
+        db.session.query(Enrollment.classroom_id, db.func.count(Enrollment.id))
+        .join(Classroom, Classroom.id == Enrollment.classroom_id)
+        .filter(Classroom.teacher_id == current_user.id)
+        .group_by(Enrollment.classroom_id)
+    )
+
+    classrooms = Classroom.query.filter_by(teacher_id=current_user.id).all()
+    empty = {'total': 0, 'published': 0, 'active': 0}
+    for classroom in classrooms:
+        classroom.quiz_stats = quiz_stats.get(classroom.id, empty)
+        classroom.assignment_stats = assignment_stats.get(classroom.id, empty)
+        classroom.student_count = student_counts.get(classroom.id, 0)
     
     return render_template('teacher/dashboard.html', classrooms=classrooms)
 
-@app.route('/teacher/classroom/create', methods=['POST'])
+@views.route('/teacher/classroom/create', methods=['POST'])
 @login_required
 def teacher_create_classroom():
     if current_user.role != 'teacher':
@@ -197,14 +253,14 @@ def teacher_create_classroom():
     flash(f'Classroom "{name}" created successfully!', 'success')
     return redirect(url_for('teacher_classroom', classroom_id=classroom.id))
 
-@app.route('/teacher/classroom/<int:classroom_id>')
+@views.route('/teacher/classroom/<int:classroom_id>')
 @login_required
 def teacher_classroom(classroom_id):
     if current_user.role != 'teacher':
         flash('Access denied', 'error')
         return redirect(url_for('index'))
     
-    classroom = Classroom.query.filter_by(id=classroom_id, teacher_id=current_user.id).first_or_404()
+    classroom = identity.owned_classroom_or_404(classroom_id)
     materials = Material.query.filter_by(classroom_id=classroom_id).all()
     enrollments = Enrollment.query.filter_by(classroom_id=classroom_id).all()
     students = [enrollment.student for enrollment in enrollments]
@@ -215,12 +271,13 @@ def teacher_classroom(classroom_id):
     return render_template('teacher/classroom.html', 
                          classroom=classroom, 
                          materials=materials,
+                         stale_material_ids={m.id for m in materials if ingestion.is_stale(m)},
                          students=students,
                          quizzes=quizzes,
                          assignments=assignments,
                          cpmks=cpmks) # Pass assignments to template
 
-@app.route('/teacher/classroom/<int:classroom_id>/quizzes_tab')
+@views.route('/teacher/classroom/<int:classroom_id>/quizzes_tab')
 @login_required
 def teacher_quizzes_tab(classroom_id):
     """Helper route to show quizzes tab in classroom view"""
@@ -228,21 +285,42 @@ def teacher_quizzes_tab(classroom_id):
         flash('Access denied', 'error')
         return redirect(url_for('index'))
     
-    classroom = Classroom.query.filter_by(id=classroom_id, teacher_id=current_user.id).first_or_404()
+    classroom = identity.owned_classroom_or_404(classroom_id)
     quizzes = Quiz.query.filter_by(classroom_id=classroom_id).order_by(Quiz.created_at.desc()).all()
     
     return render_template('teacher/classroom_quizzes_tab.html', 
                          classroom=classroom, 
                          quizzes=quizzes)
 
-@app.route('/teacher/classroom/<int:classroom_id>/upload', methods=['POST'])
+def create_material_from_stored_file(classroom_id, title, original_filename, stored_file, cpmk_ids):
+    """Create a Material for a stored upload and queue it for ingestion."""
+    material = Material(
+        classroom_id=classroom_id,
+        title=title,
+        file_path=stored_file.file_path,
+        file_type=original_filename.split('.')[-1].lower(),
+        original_filename=original_filename,
+        stored_file=stored_file,
+        status='stored'
+    )
+    if cpmk_ids:
+        material.cpmks = CPMK.query.filter(CPMK.id.in_(cpmk_ids)).all()
+
+    db.session.add(material)
+    db.session.commit()
+
+    # Extraction and notification run in the background
+    ingestion.submit(material.id, url_for('student_classroom', classroom_id=classroom_id))
+    return material
+
+@views.route('/teacher/classroom/<int:classroom_id>/upload', methods=['POST'])
 @login_required
 def teacher_upload_material(classroom_id):
     if current_user.role != 'teacher':
         flash('Access denied', 'error')
         return redirect(url_for('index'))
     
-    classroom = Classroom.query.filter_by(id=classroom_id, teacher_id=current_user.id).first_or_404()
+    classroom = identity.owned_classroom_or_404(classroom_id)
     
     if 'file' not in request.files:
         flash('No file selected', 'error')
@@ -261,41 +339,11 @@ def teacher_upload_material(classroom_id):
     
     try:
         if file and allowed_file(file.filename):
-            filename = secure_filename(file.filename)
-            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S_')
-            filename = timestamp + filename
-            
-            file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-            file.save(file_path)
-            
-            # Extract text content
-            content = extract_text_from_file(file_path, file.filename)
-            
-            material = Material(
-                classroom_id=classroom_id,
-                title=title,
-                content=content,
-                file_path=filename,
-                file_type=file.filename.split('.')[-1].lower()
-            )
-            if cpmk_ids:
-                material.cpmks = CPMK.query.filter(CPMK.id.in_(cpmk_ids)).all()
-
-            db.session.add(material)
-            db.session.commit()
+            # Identical files share one content-addressed copy on disk
+            stored_file = storage.store_upload(file, file.filename)
+            create_material_from_stored_file(classroom_id, title, file.filename, stored_file, cpmk_ids)
 
-            # Notify enrolled students of new material
-            enrollments = Enrollment.query.filter_by(classroom_id=classroom_id).all()
-            for enrollment in enrollments:
-                notification = Notification(
-                    user_id=enrollment.student_id,
-                    message=f'New material available: {material.title}',
-                    link=url_for('student_classroom', classroom_id=classroom_id)
-                )
-                db.session.add(notification)
-            db.session.commit()
-
-            flash('Material uploaded successfully!', 'success')
+            flash('Material uploaded! It will be available to students once processing finishes.', 'success')
         else:
             flash('Invalid file type. Please upload PDF or text files.', 'error')
     
@@ -306,26 +354,196 @@ def teacher_upload_material(classroom_id):
     
     return redirect(url_for('teacher_classroom', classroom_id=classroom_id))
 
-@app.route('/teacher/classroom/<int:classroom_id>/material/<int:material_id>/delete', methods=['POST'])
+# Chunked, resumable uploads: init, PUT numbered parts, then complete
+def _get_upload_session(classroom_id, upload_id):
+    return UploadSession.query.filter_by(
+        id=upload_id,
+        classroom_id=classroom_id,
+        teacher_id=current_user.id
+    ).first_or_404()
+
+@views.route('/teacher/classroom/<int:classroom_id>/uploads', methods=['POST'])
 @login_required
-def teacher_delete_material(classroom_id, material_id):
+def teacher_init_chunked_upload(classroom_id):
+    if current_user.role != 'teacher':
+        return jsonify({'error': 'Access denied'}), 403
+
+    classroom = identity.owned_classroom_or_404(classroom_id)
+    data = request.get_json(silent=True) or {}
+    filename = data.get('filename') or ''
+    if not allowed_file(filename):
+        return jsonify({'error': 'Invalid file type. Please upload PDF or text files.'}), 400
+
+    chunked_upload.purge_stale_sessions()
+    try:
+        session_record = chunked_upload.create_session(
+            classroom.id, current_user.id, filename,
+            int(data.get('size') or 0),
+            title=data.get('title'),
+            cpmk_ids=data.get('cpmk_ids'),
+        )
+    except (chunked_upload.UploadError, ValueError) as e:
+        return jsonify({'error': str(e)}), 400
+    db.session.commit()
+
+    return jsonify({
+        'upload_id': session_record.id,
+        'part_size': session_record.part_size,
+        'part_count': session_record.part_count,
+        'received_parts': [],
+    }), 201
+
+@views.route('/teacher/classroom/<int:classroom_id>/uploads/<upload_id>', methods=['GET'])
+@login_required
+def teacher_chunked_upload_status(classroom_id, upload_id):
+    """Report which parts have arrived so an interrupted upload can resume."""
+    if current_user.role != 'teacher':
+        return jsonify({'error': 'Access denied'}), 403
+
+    session_record = _get_upload_session(classroom_id, upload_id)
+    return jsonify({
+        'upload_id': session_record.id,
+        'part_size': session_record.part_size,
+        'part_count': session_record.part_count,
+        'received_parts': chunked_upload.received_parts(session_record),
+    })
+
+@views.route('/teacher/classroom/<int:classroom_id>/uploads/<upload_id>/parts/<int:part_number>', methods=['PUT'])
+@login_required
+def teacher_upload_part(classroom_id, upload_id, part_number):
+    if current_user.role != 'teacher':
+        return jsonify({'error': 'Access denied'}), 403
+
+    session_record = _get_upload_session(classroom_id, upload_id)
+    try:
+        # Read the raw body stream so werkzeug never buffers the part in memory
+        size, digest = chunked_upload.write_part(session_record, part_number, request.stream)
+    except chunked_upload.UploadError as e:
+        return jsonify({'error': str(e)}), 400
+    except RequestEntityTooLarge:
+        return jsonify({'error': 'Part too large.'}), 413
+
+    return jsonify({'part_number': part_number, 'size': size, 'sha256': digest})
+
+@views.route('/teacher/classroom/<int:classroom_id>/uploads/<upload_id>/complete', methods=['POST'])
+@login_required
+def teacher_complete_chunked_upload(classroom_id, upload_id):
+    if current_user.role != 'teacher':
+        return jsonify({'error': 'Access denied'}), 403
+
+    session_record = _get_upload_session(classroom_id, upload_id)
+    try:
+        stored_file = chunked_upload.assemble(session_record)
+    except chunked_upload.UploadError as e:
+        return jsonify({'error': str(e)}), 400
+
+    filename = session_record.filename
+    title = session_record.title
+    cpmk_ids = json.loads(session_record.cpmk_ids or '[]')
+    digest, stored_path = stored_file.digest, stored_file.file_path
+    try:
+        material = create_material_from_stored_file(classroom_id, title, filename, stored_file, cpmk_ids)
+    except SQLAlchemyError as e:
+        db.session.rollback()
+        # The parts are kept, so the client can call complete again
+        storage.unlink_if_unreferenced(os.path.join(current_app.config['UPLOAD_FOLDER'], stored_path), digest)
+        logging.error(f"Completing upload {upload_id} failed: {str(e)}")
+        return jsonify({'error': 'Could not save the material. Please try completing the upload again.'}), 500
+
+    # Only drop the parts once the material is committed
+    chunked_upload.discard(session_record)
+    db.session.commit()
+
+    return jsonify({
+        'material_id': material.id,
+        'status': material.status,
+        'sha256': stored_file.digest,
+    })
+
+@views.route('/teacher/classroom/<int:classroom_id>/uploads/<upload_id>', methods=['DELETE'])
+@login_required
+def teacher_abort_chunked_upload(classroom_id, upload_id):
+    if current_user.role != 'teacher':
+        return jsonify({'error': 'Access denied'}), 403
+
+    session_record = _get_upload_session(classroom_id, upload_id)
+    chunked_upload.discard(session_record)
+    db.session.commit()
+    return jsonify({'aborted': upload_id})
+
+@views.route('/teacher/classroom/<int:classroom_id>/materials/status')
+@login_required
+def teacher_material_status(classroom_id):
+    """Report ingestion progress for the classroom's materials as JSON."""
+    if current_user.role != 'teacher':
+        return jsonify({'error': 'Access denied'}), 403
+
+    classroom = identity.owned_classroom_or_404(classroom_id)
+    materials = Material.query.filter_by(classroom_id=classroom.id).all()
+
+    return jsonify([{
+        'id': material.id,
+        'status': material.status,
+        'failed_stage': material.failed_stage,
+        'message': material.status_message,
+        'progress': ingestion.progress_percent(material),
+        'stale': ingestion.is_stale(material),
+    } for material in materials])
+
+@views.route('/teacher/classroom/<int:classroom_id>/material/<int:material_id>/retry', methods=['POST'])
+@login_required
+def teacher_retry_material(classroom_id, material_id):
     if current_user.role != 'teacher':
         flash('Access denied', 'error')
         return redirect(url_for('index'))
 
-    classroom = Classroom.query.filter_by(id=classroom_id, teacher_id=current_user.id).first_or_404()
+    classroom = identity.owned_classroom_or_404(classroom_id)
     material = Material.query.filter_by(id=material_id, classroom_id=classroom.id).first_or_404()
 
+    if not ingestion.can_retry(material):
+        flash('Only failed or stalled materials can be retried.', 'warning')
+        return redirect(url_for('teacher_classroom', classroom_id=classroom_id))
+
+    ingestion.prepare_retry(material)
+    db.session.commit()
+    resume_stage = ingestion.pending_stages(material)[0]
+    ingestion.submit(material.id, url_for('student_classroom', classroom_id=classroom_id))
+    flash(f'Retrying processing of "{material.title}" from the {resume_stage} stage.', 'info')
+    return redirect(url_for('teacher_classroom', classroom_id=classroom_id))
+
+@views.route('/teacher/classroom/<int:classroom_id>/material/<int:material_id>/delete', methods=['POST'])
+@login_required
+def teacher_delete_material(classroom_id, material_id):
+    if current_user.role != 'teacher':
+        flash('Access denied', 'error')
+        return redirect(url_for('index'))
+
+    classroom = identity.owned_classroom_or_404(classroom_id)
+    # The content is hashed after the row is deleted, so load it up front
+    material = (
+        Material.query.options(undefer(Material.content))
+        .filter_by(id=material_id, classroom_id=classroom.id).first_or_404()
+    )
+
     try:
-        # Delete the file from the server
-        if material.file_path:
-            file_path = os.path.join(app.config['UPLOAD_FOLDER'], material.file_path)
-            if os.path.exists(file_path):
-                os.remove(file_path)
+        stored_file = material.stored_file
+        digest = stored_file.digest if stored_file else None
 
-        # Delete the material from the database
+        # Delete the material from the database, releasing its file reference
         db.session.delete(material)
+        release_path = storage.release(stored_file) if stored_file else None
+        # Pooled quizzes and guides go with the last material sharing the stored file
+        if (release_path or not stored_file) and material.content:
+            quiz_pool.discard(quiz_pool.content_hash(material.content))
         db.session.commit()
+
+        # Only unlink the file once no material references it
+        if release_path:
+            storage.unlink_if_unreferenced(release_path, digest)
+        elif not stored_file and material.file_path:
+            file_path = os.path.join(current_app.config['UPLOAD_FOLDER'], material.file_path)
+            if os.path.exists(file_path):
+                os.remove(file_path)
         flash(f'Material "{material.title}" deleted successfully.', 'success')
     except Exception as e:
         db.session.rollback()
@@ -333,14 +551,14 @@ def teacher_delete_material(classroom_id, material_id):
 
     return redirect(url_for('teacher_classroom', classroom_id=classroom_id))
 
-@app.route('/teacher/classroom/<int:classroom_id>/student/<int:student_id>/remove', methods=['POST'])
+@views.route('/teacher/classroom/<int:classroom_id>/student/<int:student_id>/remove', methods=['POST'])
 @login_required
 def teacher_remove_student(classroom_id, student_id):
     if current_user.role != 'teacher':
         flash('Access denied', 'error')
         return redirect(url_for('index'))
 
-    classroom = Classroom.query.filter_by(id=classroom_id, teacher_id=current_user.id).first_or_404()
+    classroom = identity.owned_classroom_or_404(classroom_id)
     # Find the enrollment record for this student in this classroom
     enrollment = Enrollment.query.filter_by(classroom_id=classroom.id, student_id=student_id).first_or_404()
     student_user = User.query.get(student_id) # Get student user details for flash message
@@ -355,14 +573,14 @@ def teacher_remove_student(classroom_id, student_id):
 
     return redirect(url_for('teacher_classroom', classroom_id=classroom_id))
 
-@app.route('/teacher/classroom/<int:classroom_id>/add_student', methods=['POST'])
+@views.route('/teacher/classroom/<int:classroom_id>/add_student', methods=['POST'])
 @login_required
 def teacher_add_student(classroom_id):
     if current_user.role != 'teacher':
         flash('Access denied', 'error')
         return redirect(url_for('index'))
     
-    classroom = Classroom.query.filter_by(id=classroom_id, teacher_id=current_user.id).first_or_404()
+    classroom = identity.owned_classroom_or_404(classroom_id)
     student_email = request.form.get('student_email')
     
     student = User.query.filter_by(email=student_email, role='student').first()
@@ -387,94 +605,95 @@ def teacher_add_student(classroom_id):
     flash(f'Student {student.full_name} added successfully!', 'success')
     return redirect(url_for('teacher_classroom', classroom_id=classroom_id))
 
-@app.route('/teacher/classroom/<int:classroom_id>/results')
+@views.route('/teacher/classroom/<int:classroom_id>/results')
 @login_required
 def teacher_results(classroom_id):
     if current_user.role != 'teacher':
         flash('Access denied', 'error')
         return redirect(url_for('index'))
     
-    classroom = Classroom.query.filter_by(id=classroom_id, teacher_id=current_user.id).first_or_404()
-    evaluations = SelfEvaluation.query.filter_by(classroom_id=classroom_id).order_by(SelfEvaluation.created_at.desc()).all()
-    
-    # Create student summaries
-    student_summaries = []
-    students_data = {}
-    
-    # Group evaluations by student
-    for evaluation in evaluations:
-        student_id = evaluation.student_id
-        if student_id not in students_data:
-            students_data[student_id] = {
-                'student': evaluation.student,
-                'evaluations': [],
-                'materials': set()
-            }
-        students_data[student_id]['evaluations'].append(evaluation)
-        if evaluation.material_id:
-            students_data[student_id]['materials'].add(evaluation.material_id)
-    
-    # Precalculate rankings for star totals
-    # rankings, student_count = get_classroom_star_rankings(classroom_id)
-
-    # Create summaries
-    # Calculate gold medal count and rank for all students in this classroom
-    classroom_enrollments = Enrollment.query.filter_by(classroom_id=classroom_id).all()
-    student_gold_counts = []
-    for class_enrollment in classroom_enrollments:
-        student_awards = calculate_awards_for_student(classroom_id, class_enrollment.student_id) # AI Awards for this student in this classroom
-        student_gold_count = sum(1 for award_info in student_awards.values() if award_info.get('award') == 'gold') if student_awards else 0
-        student_gold_counts.append((class_enrollment.student_id, student_gold_count))
-
-    # Sort by gold count descending
-    student_gold_counts.sort(key=lambda x: x[1], reverse=True)
-
-    # Determine ranks
-    gold_rankings = {}
+    classroom = identity.owned_classroom_or_404(classroom_id)
+
+    # Rank every enrolled student by gold awards, counted for the whole classroom in one query
+    gold_counts = count_gold_awards(classroom_id)
+    enrolled_ids = [student_id for (student_id,) in db.session.query(Enrollment.student_id).filter_by(classroom_id=classroom_id)]
+    enrolled_ids.sort(key=lambda student_id: gold_counts.get(student_id, 0), reverse=True)
+    gold_ranks = {}
     last_gold_count = -1
     rank_counter = 0
-    # Handle empty student_gold_counts list case
-    if student_gold_counts:
-        for rank_idx, (student_id, gold_count) in enumerate(student_gold_counts, start=1):
-            if gold_count != last_gold_count:
-                rank_counter = rank_idx
-                last_gold_count = gold_count
-            gold_rankings[student_id] = {'rank': rank_counter, 'gold_count': gold_count}
-
-    # Create summaries
-    for student_id, data in students_data.items():
-        evaluations_list = data['evaluations']
-        completed_evals = [e for e in evaluations_list if e.completed_at and e.score is not None]
-
-        # Get gold medal count and rank for this student
-        gold_info = gold_rankings.get(student_id, {'rank': len(student_gold_counts), 'gold_count': 0})
-
-        summary = type('obj', (object,), {
-            'student': data['student'],
-            'total_evaluations': len(evaluations_list),
-            'completed_count': len(completed_evals),
-            'in_progress_count': len(evaluations_list) - len(completed_evals),
-            'materials_attempted': len(data['materials']),
-            'avg_score': sum(e.score for e in completed_evals) / len(completed_evals) if completed_evals else None,
-            'gold_medal_count': gold_info['gold_count'], # Add gold count
-            'gold_rank': gold_info['rank'], # Add gold rank
-            'rank_out_of': len(student_gold_counts) # Total students in ranking
-        })()
-        student_summaries.append(summary)
-
-    # Sort by student name (already done, keeping sort at the end)
-    # student_summaries.sort(key=lambda x: x.student.full_name)
-
-    return render_template('teacher/results.html', classroom=classroom, student_summaries=student_summaries, evaluations=evaluations)
-
-@app.route('/teacher/classroom/<int:classroom_id>/student/<int:student_id>')
+    for rank_idx, student_id in enumerate(enrolled_ids, start=1):
+        gold_count = gold_counts.get(student_id, 0)
+        if gold_count != last_gold_count:
+            rank_counter = rank_idx
+            last_gold_count = gold_count
+        gold_ranks[student_id] = rank_counter
+
+    student_summaries = [
+        {
+            'student': row.User,
+            'total_evaluations': row.total_evaluations,
+            'completed_count': row.completed_count,
+            'in_progress_count': row.in_progress_count,
+            'materials_attempted': row.materials_attempted,
+            'avg_score': row.avg_score,
+            'gold_medal_count': gold_counts.get(row.User.id, 0),
+            'gold_rank': gold_ranks.get(row.User.id, len(enrolled_ids)),
+            'rank_out_of': len(enrolled_ids),
+        }
+        for row in classroom_results.student_summaries(classroom_id)
+    ]
+
+    return render_template('teacher/results.html',
+                         classroom=classroom,
+                         student_summaries=student_summaries,
+                         totals=classroom_results.totals(classroom_id),
+                         materials=Material.query.filter_by(classroom_id=classroom_id).order_by(Material.title).all(),
+                         quiz_types=classroom_results.QUIZ_TYPES,
+                         sorts=classroom_results.SORTS)
+
+@views.route('/teacher/classroom/<int:classroom_id>/results/attempts')
+@login_required
+def teacher_results_attempts(classroom_id):
+    """One page of the classroom's attempts table, filtered and sorted, as an HTML fragment."""
+    if current_user.role != 'teacher':
+        return jsonify({'error': 'Access denied'}), 403
+
+    classroom = identity.owned_classroom_or_404(classroom_id)
+    filters = {
+        'sort': request.args.get('sort', 'newest'),
+        'material_id': request.args.get('material_id', type=int),
+        'quiz_type': request.args.get('quiz_type') or None,
+        'date_from': request.args.get('date_from') or None,
+        'date_to': request.args.get('date_to') or None,
+    }
+    try:
+        rows, next_cursor = classroom_results.attempts_page(
+            classroom.id,
+            current_app.config['RESULTS_ATTEMPTS_PER_PAGE'],
+            cursor=request.args.get('cursor'),
+            **{
+                **filters,
+                'date_from': datetime.strptime(filters['date_from'], '%Y-%m-%d').date() if filters['date_from'] else None,
+                'date_to': datetime.strptime(filters['date_to'], '%Y-%m-%d').date() if filters['date_to'] else None,
+            },
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    next_url = None
+    if next_cursor:
+        next_url = url_for('teacher_results_attempts', classroom_id=classroom.id, cursor=next_cursor,
+                           **{key: value for key, value in filters.items() if value})
+    return render_template('teacher/results_attempts.html', classroom=classroom, rows=rows, next_url=next_url)
+
+@views.route('/teacher/classroom/<int:classroom_id>/student/<int:student_id>')
 @login_required
 def teacher_student_details(classroom_id, student_id):
     if current_user.role != 'teacher':
         flash('Access denied', 'error')
         return redirect(url_for('index'))
     
-    classroom = Classroom.query.filter_by(id=classroom_id, teacher_id=current_user.id).first_or_404()
+    classroom = identity.owned_classroom_or_404(classroom_id)
     student = User.query.filter_by(id=student_id, role='student').first_or_404()
     
     # Get materials for this classroom (for filter dropdown)
@@ -517,14 +736,14 @@ def teacher_student_details(classroom_id, student_id):
                          filter_material_id=filter_material_id # Pass selected filter to template
                         )
 
-@app.route('/teacher/classroom/<int:classroom_id>/export_results')
+@views.route('/teacher/classroom/<int:classroom_id>/export_results')
 @login_required
 def teacher_export_results(classroom_id):
     if current_user.role != 'teacher':
         flash('Access denied', 'error')
         return redirect(url_for('index'))
     
-    classroom = Classroom.query.filter_by(id=classroom_id, teacher_id=current_user.id).first_or_404()
+    classroom = identity.owned_classroom_or_404(classroom_id)
     evaluations = SelfEvaluation.query.filter_by(classroom_id=classroom_id).all()
     
     output = io.StringIO()
@@ -557,28 +776,28 @@ def teacher_export_results(classroom_id):
     return response
 
 # Teacher Quiz Management routes
-@app.route('/teacher/classroom/<int:classroom_id>/quizzes')
+@views.route('/teacher/classroom/<int:classroom_id>/quizzes')
 @login_required
 def teacher_quizzes(classroom_id):
     if current_user.role != 'teacher':
         flash('Access denied', 'error')
         return redirect(url_for('index'))
     
-    classroom = Classroom.query.filter_by(id=classroom_id, teacher_id=current_user.id).first_or_404()
+    classroom = identity.owned_classroom_or_404(classroom_id)
     quizzes = Quiz.query.filter_by(classroom_id=classroom_id).order_by(Quiz.created_at.desc()).all()
     
     return render_template('teacher/quizzes.html', 
                          classroom=classroom, 
                          quizzes=quizzes)
 
-@app.route('/teacher/classroom/<int:classroom_id>/quiz/create', methods=['GET', 'POST'])
+@views.route('/teacher/classroom/<int:classroom_id>/quiz/create', methods=['GET', 'POST'])
 @login_required
 def teacher_create_quiz(classroom_id):
     if current_user.role != 'teacher':
         flash('Access denied', 'error')
         return redirect(url_for('index'))
     
-    classroom = Classroom.query.filter_by(id=classroom_id, teacher_id=current_user.id).first_or_404()
+    classroom = identity.owned_classroom_or_404(classroom_id)
     
     if request.method == 'POST':
         title = request.form.get('title')
@@ -695,7 +914,7 @@ def teacher_create_quiz(classroom_id):
     cpmks = CPMK.query.filter_by(classroom_id=classroom.id).all()
     return render_template('teacher/create_quiz.html', classroom=classroom, cpmks=cpmks)
 
-@app.route('/teacher/quiz/<int:quiz_id>/edit', methods=['GET', 'POST'])
+@views.route('/teacher/quiz/<int:quiz_id>/edit', methods=['GET', 'POST'])
 @login_required
 def teacher_edit_quiz(quiz_id):
     if current_user.role != 'teacher':
@@ -795,10 +1014,17 @@ def teacher_edit_quiz(quiz_id):
                     'suggested_length': suggested_length
                 })
         
+        old_key = [q.get('correct_answer') for q in json.loads(quiz.questions_json)]
         quiz.questions_json = json.dumps(questions)
         db.session.commit()
         
         flash('Quiz updated successfully!', 'success')
+        key_changed = old_key != [q.get('correct_answer') for q in questions]
+        if key_changed and quiz.quiz_type in regrade.OBJECTIVE_TYPES and SelfEvaluation.query.filter(
+                SelfEvaluation.quiz_id == quiz.id, SelfEvaluation.completed_at.isnot(None)).first():
+            # Existing attempts were scored against the old key
+            flash('The answer key changed. Review how existing attempts would be regraded.', 'info')
+            return redirect(url_for('teacher_regrade_quiz', quiz_id=quiz.id))
         return redirect(url_for('teacher_quizzes', classroom_id=classroom.id))
     
     cpmks = CPMK.query.filter_by(classroom_id=classroom.id).all()
@@ -808,7 +1034,7 @@ def teacher_edit_quiz(quiz_id):
                          questions=questions_with_index,
                          cpmks=cpmks)
 
-@app.route('/teacher/quiz/<int:quiz_id>/duplicate', methods=['POST'])
+@views.route('/teacher/quiz/<int:quiz_id>/duplicate', methods=['POST'])
 @login_required
 def teacher_duplicate_quiz(quiz_id):
     if current_user.role != 'teacher':
@@ -843,7 +1069,7 @@ def teacher_duplicate_quiz(quiz_id):
     flash('Quiz duplicated successfully! You can now edit the copy.', 'success')
     return redirect(url_for('teacher_edit_quiz', quiz_id=new_quiz.id))
 
-@app.route('/teacher/quiz/<int:quiz_id>/preview')
+@views.route('/teacher/quiz/<int:quiz_id>/preview')
 @login_required
 def teacher_preview_quiz(quiz_id):
     if current_user.role != 'teacher':
@@ -870,7 +1096,7 @@ def teacher_preview_quiz(quiz_id):
                          quiz=quiz,
                          questions=questions_with_index)
 
-@app.route('/teacher/quiz/<int:quiz_id>/publish', methods=['POST'])
+@views.route('/teacher/quiz/<int:quiz_id>/publish', methods=['POST'])
 @login_required
 def teacher_publish_quiz(quiz_id):
     if current_user.role != 'teacher':
@@ -908,7 +1134,7 @@ def teacher_publish_quiz(quiz_id):
     
     return redirect(url_for('teacher_quizzes', classroom_id=quiz.classroom_id))
 
-@app.route('/teacher/quiz/<int:quiz_id>/results')
+@views.route('/teacher/quiz/<int:quiz_id>/results')
 @login_required
 def teacher_quiz_results(quiz_id):
     if current_user.role != 'teacher':
@@ -922,61 +1148,93 @@ def teacher_quiz_results(quiz_id):
         flash('Access denied: you can only view results for your own quizzes', 'error')
         return redirect(url_for('teacher_dashboard'))
     
-    # Get all evaluations for this quiz
-    evaluations = SelfEvaluation.query.filter_by(quiz_id=quiz_id).all()
-    
-    # Get enrollment data to show students who haven't taken the quiz
-    enrollments = Enrollment.query.filter_by(classroom_id=quiz.classroom_id).all()
-    students = [enrollment.student for enrollment in enrollments]
-    
-    # Calculate statistics based on the latest evaluation for each student
-    completed_students = set()
-    in_progress_students = set()
-    latest_completed_evaluations = {}
-    
-    for evaluation in evaluations:
-        if evaluation.student_id not in completed_students and evaluation.student_id not in in_progress_students:
-            if evaluation.completed_at is not None:
-                completed_students.add(evaluation.student_id)
-            elif evaluation.started_at is not None:
-                in_progress_students.add(evaluation.student_id)
-
-        # Keep track of the latest completed evaluation for each student
-        if evaluation.completed_at is not None:
-            student_id = evaluation.student_id
-            if student_id not in latest_completed_evaluations or evaluation.completed_at > latest_completed_evaluations[student_id].completed_at:
-                latest_completed_evaluations[student_id] = evaluation
-
-    completed_count = len(completed_students)
-    in_progress_count = len(in_progress_students)
-    not_started_count = len(students) - (completed_count + in_progress_count)
-    
-    if completed_count > 0:
-        # Calculate average score based on the latest completed evaluation for each student
-        # Ensure 0 scores are included
-        completed_scores = [e.score for e in latest_completed_evaluations.values() if e.score is not None]
-        if completed_scores:
-            avg_score = sum(completed_scores) / completed_count
-        else:
-            avg_score = 0.0 # Handle case where all completed scores are None (shouldn't happen if 0% is 0.0)
-        pass_count = sum(1 for e in evaluations if e.completed_at is not None and e.score is not None and e.score >= quiz.passing_score)
-        pass_rate = (pass_count / completed_count) * 100 if completed_count > 0 else 0
-    else:
-        avg_score = None
-        pass_rate = None
+    # Statistics and the student table all use each student's latest attempt, ranked in SQL
+    per_page = current_app.config['QUIZ_RESULTS_PER_PAGE']
+    latest = quiz_results.latest_attempts(quiz.id)
+    stats = quiz_results.summary(quiz, latest)
+    page_count = max(1, -(-stats['students'] // per_page))
+    page = min(max(request.args.get('page', 1, type=int), 1), page_count)
     
     return render_template('teacher/quiz_results.html',
                          classroom=quiz.classroom,
                          quiz=quiz,
-                         evaluations=evaluations,
+                         rows=quiz_results.student_page(quiz, page, per_page, latest),
+                         histogram=quiz_results.histogram(quiz, latest),
+                         page=page,
+                         page_count=page_count,
+                         **stats)
+
+@views.route('/teacher/quiz/<int:quiz_id>/items')
+@login_required
+def teacher_quiz_item_analysis(quiz_id):
+    """Per-question difficulty, discrimination and distractor statistics of an objective quiz."""
+    if current_user.role != 'teacher':
+        flash('Access denied', 'error')
+        return redirect(url_for('index'))
+
+    quiz = Quiz.query.filter_by(id=quiz_id, teacher_id=current_user.id).first_or_404()
+    try:
+        report = item_analysis.analyze(quiz)
+    except ValueError as e:
+        flash(str(e), 'warning')
+        return redirect(url_for('teacher_quiz_results', quiz_id=quiz.id))
+
+    return render_template('teacher/quiz_items.html',
+                         classroom=quiz.classroom,
+                         quiz=quiz,
+                         questions=json.loads(quiz.questions_json),
+                         report=report)
+
+@views.route('/teacher/quiz/<int:quiz_id>/regrade', methods=['GET', 'POST'])
+@login_required
+def teacher_regrade_quiz(quiz_id):
+    """Preview and apply a rescoring of every attempt against the quiz's current key."""
+    if current_user.role != 'teacher':
+        flash('Access denied', 'error')
+        return redirect(url_for('index'))
+
+    quiz = Quiz.query.filter_by(id=quiz_id, teacher_id=current_user.id).first_or_404()
+    try:
+        if request.method == 'POST':
+            run = regrade.apply(quiz, current_user.id)
+            flash(f'Regraded {run.changed_count} attempt(s).', 'success')
+            return redirect(url_for('teacher_quiz_results', quiz_id=quiz.id))
+        deltas = regrade.preview(quiz)
+    except regrade.RegradeError as e:
+        flash(str(e), 'warning')
+        return redirect(url_for('teacher_quiz_results', quiz_id=quiz.id))
+
+    students = {
+        user.id: user for user in
+        User.query.filter(User.id.in_({d['student_id'] for d in deltas})).all()
+    } if deltas else {}
+    regrades = QuizRegrade.query.filter_by(quiz_id=quiz.id).order_by(QuizRegrade.created_at.desc()).all()
+    return render_template('teacher/quiz_regrade.html',
+                         classroom=quiz.classroom,
+                         quiz=quiz,
+                         deltas=deltas,
                          students=students,
-                         completed_count=completed_count,
-                         in_progress_count=in_progress_count,
-                         not_started_count=not_started_count,
-                         avg_score=avg_score,
-                         pass_rate=pass_rate)
+                         regrades=regrades)
+
+@views.route('/teacher/quiz/regrade/<int:regrade_id>/revert', methods=['POST'])
+@login_required
+def teacher_revert_regrade(regrade_id):
+    if current_user.role != 'teacher':
+        flash('Access denied', 'error')
+        return redirect(url_for('index'))
 
-@app.route('/teacher/quiz/<int:quiz_id>/submission/<int:evaluation_id>')
+    run = QuizRegrade.query.get_or_404(regrade_id)
+    if run.quiz.teacher_id != current_user.id:
+        flash('Access denied', 'error')
+        return redirect(url_for('teacher_dashboard'))
+    try:
+        regrade.revert(run)
+        flash(f'Restored the previous scores of {run.changed_count} attempt(s).', 'success')
+    except regrade.RegradeError as e:
+        flash(str(e), 'warning')
+    return redirect(url_for('teacher_regrade_quiz', quiz_id=run.quiz_id))
+
+@views.route('/teacher/quiz/<int:quiz_id>/submission/<int:evaluation_id>')
 @login_required
 def teacher_view_submission(quiz_id, evaluation_id):
     if current_user.role != 'teacher':
@@ -990,11 +1248,14 @@ def teacher_view_submission(quiz_id, evaluation_id):
         flash('Access denied: you can only view submissions for your own quizzes', 'error')
         return redirect(url_for('teacher_dashboard'))
     
-    evaluation = SelfEvaluation.query.filter_by(id=evaluation_id, quiz_id=quiz_id).first_or_404()
+    evaluation = (
+        SelfEvaluation.query.options(undefer_group('attempt_body'))
+        .filter_by(id=evaluation_id, quiz_id=quiz_id).first_or_404()
+    )
     
-    questions = json.loads(evaluation.questions_json)
+    questions = question_sets.questions_for(evaluation)
     answers = json.loads(evaluation.answers_json)
-    feedback = json.loads(evaluation.feedback_json) if evaluation.feedback_json else []
+    feedback = attempts.feedback_for(evaluation, answers)
     
     return render_template('teacher/view_submission.html',
                          classroom=quiz.classroom,
@@ -1005,7 +1266,7 @@ def teacher_view_submission(quiz_id, evaluation_id):
                          answers=answers,
                          feedback=feedback)
 
-@app.route('/teacher/quiz/<int:quiz_id>/delete', methods=['POST'])
+@views.route('/teacher/quiz/<int:quiz_id>/delete', methods=['POST'])
 @login_required
 def teacher_delete_quiz(quiz_id):
     if current_user.role != 'teacher':
@@ -1036,7 +1297,7 @@ def teacher_delete_quiz(quiz_id):
     return redirect(url_for('teacher_quizzes', classroom_id=quiz.classroom_id))
 
 # Student routes
-@app.route('/student/dashboard')
+@views.route('/student/dashboard')
 @login_required
 def student_dashboard():
     if current_user.role != 'student':
@@ -1201,7 +1462,7 @@ def student_dashboard():
                            ai_quiz_awards=ai_quiz_awards_for_current_user,
                            classroom_names=classroom_names)
 
-@app.route('/student/join_classroom', methods=['POST'])
+@views.route('/student/join_classroom', methods=['POST'])
 @login_required
 def student_join_classroom():
     if current_user.role != 'student':
@@ -1232,7 +1493,7 @@ def student_join_classroom():
     flash(f'Successfully joined "{classroom.name}"!', 'success')
     return redirect(url_for('student_classroom', classroom_id=classroom.id))
 
-@app.route('/student/classroom/<int:classroom_id>')
+@views.route('/student/classroom/<int:classroom_id>')
 @login_required
 def student_classroom(classroom_id):
     if current_user.role != 'student':
@@ -1240,13 +1501,9 @@ def student_classroom(classroom_id):
         return redirect(url_for('index'))
     
     # Check enrollment
-    enrollment = Enrollment.query.filter_by(
-        classroom_id=classroom_id,
-        student_id=current_user.id
-    ).first_or_404()
+    classroom = identity.enrolled_classroom_or_404(classroom_id)
     
-    classroom = enrollment.classroom
-    materials = Material.query.filter_by(classroom_id=classroom_id).all()
+    materials = Material.query.filter_by(classroom_id=classroom_id, status=MATERIAL_READY).all()
     
     # Get any in-progress AI quiz for the current student in this classroom
     in_progress_ai_quiz = SelfEvaluation.query.filter_by(
@@ -1419,65 +1676,83 @@ def student_classroom(classroom_id):
                          material_titles=material_titles,
                          assignments_with_submission_status=assignments_with_submission_status)
 
-@app.route('/student/classroom/<int:classroom_id>/generate_study_guide')
-@login_required
-def student_generate_study_guide(classroom_id):
-    if current_user.role != 'student':
-        flash('Access denied', 'error')
-        return redirect(url_for('index'))
-    
-    # Check enrollment
-    enrollment = Enrollment.query.filter_by(
-        classroom_id=classroom_id,
-        student_id=current_user.id
-    ).first_or_404()
-    
-    classroom = enrollment.classroom
-    
-    # Get optional material_id from query parameters
-    material_id = request.args.get('material_id')
+def _study_guide_source(classroom, material_id):
+    """Collect the content for a study guide.
 
-    content = ""
+    Returns ``(content, context, title, error)`` where ``error`` is a
+    ``(message, category)`` pair when no guide can be generated.
+    """
     context = f"Classroom: {classroom.name}"
-    
     if material_id:
         # Generate study guide for a specific material
-        material = Material.query.filter_by(id=material_id, classroom_id=classroom.id).first()
+        material = (
+            Material.query.options(undefer(Material.content))
+            .filter_by(id=material_id, classroom_id=classroom.id, status=MATERIAL_READY).first()
+        )
         if not material or not material.content:
-            flash('Material not found or has no content.', 'error')
-            return redirect(url_for('student_classroom', classroom_id=classroom_id))
+            return None, None, None, ('Material not found or has no content.', 'error')
         content = material.content
         context = f"Material: {material.title} from Classroom: {classroom.name}"
-        study_guide_title = f"Study Guide for {material.title}"
-    else:\
+        title = f"Study Guide for {material.title}"
+    else:
         # Generate study guide for all materials
-        materials = Material.query.filter_by(classroom_id=classroom.id).all()
+        materials = (
+            Material.query.options(undefer(Material.content))
+            .filter_by(classroom_id=classroom.id, status=MATERIAL_READY).all()
+        )
         if not materials:
-            flash('No materials available for study guide generation', 'warning')
-            return redirect(url_for('student_classroom', classroom_id=classroom_id))
+            return None, None, None, ('No materials available for study guide generation', 'warning')
         content = "\n\n".join([f"**{material.title}**\n{material.content}" for material in materials if material.content])
-        study_guide_title = f"Study Guide for {classroom.name}"
+        title = f"Study Guide for {classroom.name}"
 
     if not content.strip():
-        flash('No content available from selected material(s) for study guide generation.', 'warning')
+        return None, None, None, ('No content available from selected material(s) for study guide generation.', 'warning')
+    return content, context, title, None
+
+@views.route('/student/classroom/<int:classroom_id>/generate_study_guide')
+@login_required
+def student_generate_study_guide(classroom_id):
+    if current_user.role != 'student':
+        flash('Access denied', 'error')
+        return redirect(url_for('index'))
+    
+    # Check enrollment
+    classroom = identity.enrolled_classroom_or_404(classroom_id)
+    
+    # Get optional material_id from query parameters
+    material_id = request.args.get('material_id')
+
+    content, context, study_guide_title, error = _study_guide_source(classroom, material_id)
+    if error:
+        flash(*error)
         return redirect(url_for('student_classroom', classroom_id=classroom_id))
+
+    # A guide pre-generated at upload time is served straight away unless a fresh one is asked for
+    pooled_guide = None if request.args.get('fresh') else quiz_pool.get_study_guide(quiz_pool.content_hash(content))
+    if pooled_guide:
+        return render_template(
+            'student/study_guide.html',
+            classroom=classroom,
+            study_guide=Markup(pooled_guide),
+            study_guide_title=study_guide_title,
+            material_id=material_id,
+        )
+
+    if current_app.config.get('STUDY_GUIDE_STREAMING') and request.args.get('stream') != '0':
+        # Render the page straight away; the guide arrives over the event stream
+        return render_template(
+            'student/study_guide.html',
+            classroom=classroom,
+            study_guide=None,
+            stream_url=url_for('student_stream_study_guide', classroom_id=classroom_id, material_id=material_id),
+            study_guide_title=study_guide_title,
+            material_id=material_id,
+        )
     
     try:
         # Assuming ai_service.generate_study_guide returns a string with the HTML content
-        study_guide_content = ai_service.generate_study_guide(content, context)
-
-        # Remove markdown code block fences if present
-        if study_guide_content.startswith('```html\n'):
-            study_guide_content = study_guide_content[len('```html\n'):]
-        if study_guide_content.endswith('```'):
-            study_guide_content = study_guide_content[:-len('```')]
-
-        # Sanitize the generated HTML so table classes/attributes remain intact
-        sanitized_content = bleach.clean(
-            study_guide_content,
-            tags=ALLOWED_TAGS,
-            attributes=ALLOWED_ATTRS,
-        )
+        study_guide_content = ai_service.get_service().generate_study_guide(content, context)
+        sanitized_content = sanitize.clean_study_guide(study_guide_content)
 
         # Pass the sanitized study guide to the template
         return render_template(
@@ -1495,7 +1770,48 @@ def student_generate_study_guide(classroom_id):
         flash(f'Error generating study guide: {str(e)}', 'error')
         return redirect(url_for('student_classroom', classroom_id=classroom_id))
 
-@app.route('/student/classroom/<int:classroom_id>/create_quiz')
+def _sse(data, event=None):
+    """Format one Server-Sent Event carrying a JSON payload."""
+    message = f"event: {event}\n" if event else ''
+    return message + f"data: {json.dumps(data)}\n\n"
+
+@views.route('/student/classroom/<int:classroom_id>/study_guide/stream')
+@login_required
+def student_stream_study_guide(classroom_id):
+    if current_user.role != 'student':
+        return jsonify({'error': 'Access denied'}), 403
+
+    classroom = identity.enrolled_classroom_or_404(classroom_id)
+
+    content, context, _, error = _study_guide_source(classroom, request.args.get('material_id'))
+    if error:
+        return jsonify({'error': error[0]}), 404
+
+    def generate():
+        sanitizer = IncrementalSanitizer(ALLOWED_TAGS, ALLOWED_ATTRS)
+        try:
+            for piece in ai_service.get_service().stream_study_guide(content, context):
+                fragment = sanitizer.feed(piece)
+                if fragment:
+                    yield _sse({'html': fragment})
+            fragment = sanitizer.close()
+            if fragment:
+                yield _sse({'html': fragment})
+            yield _sse({}, event='done')
+        except Exception as e:
+            logging.error(f"Study guide stream error: {str(e)}")
+            fragment = sanitizer.close()
+            if fragment:
+                yield _sse({'html': fragment})
+            yield _sse({'error': str(e)}, event='failed')
+
+    response = Response(stream_with_context(generate()), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    # Stop nginx from buffering the stream
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+@views.route('/student/classroom/<int:classroom_id>/create_quiz')
 @login_required
 def student_create_quiz(classroom_id):
     if current_user.role != 'student':
@@ -1503,10 +1819,7 @@ def student_create_quiz(classroom_id):
         return redirect(url_for('index'))
     
     # Check enrollment
-    enrollment = Enrollment.query.filter_by(
-        classroom_id=classroom_id,
-        student_id=current_user.id
-    ).first_or_404()
+    classroom = identity.enrolled_classroom_or_404(classroom_id)
     
     # Check for existing incomplete AI quiz for this student in this classroom
     existing_ai_evaluation = SelfEvaluation.query.filter_by(
@@ -1520,8 +1833,7 @@ def student_create_quiz(classroom_id):
         flash('You have an unfinished AI quiz. Please complete it first.', 'warning')
         return redirect(url_for('student_quiz_result', evaluation_id=existing_ai_evaluation.id))
 
-    classroom = enrollment.classroom
-    materials = Material.query.filter_by(classroom_id=classroom_id).all()
+    materials = Material.query.filter_by(classroom_id=classroom_id, status=MATERIAL_READY).all()
     quiz_type = request.args.get('type', 'mcq')
     material_id = request.args.get('material_id')
     
@@ -1531,21 +1843,55 @@ def student_create_quiz(classroom_id):
     
     try:
         # Get content for quiz generation
+        content, context = _quiz_source(classroom, material_id)
+        if content is None:
+            flash('Invalid material selected', 'error')
+            return redirect(url_for('student_classroom', classroom_id=classroom_id))
+        material_id = material_id or None
+
+        # Serve a pre-generated question set when one is pooled for this content
+        digest = quiz_pool.content_hash(content)
+        questions = quiz_pool.take_quiz(digest, quiz_type)
         if material_id:
-            material = Material.query.get(material_id)
-            if material and material.classroom_id == classroom_id:
-                content = material.content
-                context = f"Material: {material.title}"
-            else:
-                flash('Invalid material selected', 'error')
-                return redirect(url_for('student_classroom', classroom_id=classroom_id))
-        else:
-            # Use all materials
-            content = "\n\n".join([f"**{material.title}**\n{material.content}" for material in materials if material.content])
-            context = f"All materials from {classroom.name}"
-            material_id = None
+            # Only single-material pools are warmed at upload time, so only those are refilled
+            quiz_pool.refill_if_low(digest, content, context, quiz_type)
+        if questions:
+            evaluation = SelfEvaluation(
+                student_id=current_user.id,
+                classroom_id=classroom_id,
+                material_id=material_id,
+                quiz_type=quiz_type,
+                questions_json=json.dumps(questions),
+                answers_json=json.dumps([])
+            )
+            db.session.add(evaluation)
+            db.session.commit()
+            return render_template('student/quiz_new.html',
+                                 classroom=classroom,
+                                 evaluation=evaluation,
+                                 questions=questions,
+                                 quiz_type=quiz_type)
+
+        if current_app.config.get('QUIZ_STREAMING') and request.args.get('stream') != '0':
+            # Questions are generated over the event stream and saved as they arrive
+            evaluation = SelfEvaluation(
+                student_id=current_user.id,
+                classroom_id=classroom_id,
+                material_id=material_id,
+                quiz_type=quiz_type,
+                questions_json=json.dumps([]),
+                answers_json=json.dumps([])
+            )
+            db.session.add(evaluation)
+            db.session.commit()
+            return render_template('student/quiz_new.html',
+                                 classroom=classroom,
+                                 evaluation=evaluation,
+                                 questions=[],
+                                 quiz_type=quiz_type,
+                                 stream_url=url_for('student_stream_quiz', evaluation_id=evaluation.id))
         
-        questions = ai_service.generate_quiz(content, quiz_type, context)
+        questions = ai_service.get_service().generate_quiz(content, quiz_type, context)
         
         # Create self-evaluation record
         evaluation = SelfEvaluation(
@@ -1573,7 +1919,123 @@ def student_create_quiz(classroom_id):
         flash(f'Error generating quiz: {str(e)}', 'error')
         return redirect(url_for('student_classroom', classroom_id=classroom_id))
 
-@app.route('/student/submit_quiz/<int:evaluation_id>', methods=['POST'])
+def _quiz_source(classroom, material_id):
+    """Return ``(content, context)`` for quiz generation, or ``(None, None)`` for an invalid material."""
+    if material_id:
+        material = db.session.get(Material, material_id, options=[undefer(Material.content)])
+        if material and material.classroom_id == classroom.id and material.is_ready:
+            return material.content, f"Material: {material.title}"
+        return None, None
+    # Use all materials
+    materials = (
+        Material.query.options(undefer(Material.content))
+        .filter_by(classroom_id=classroom.id, status=MATERIAL_READY).all()
+    )
+    content = "\n\n".join([f"**{material.title}**\n{material.content}" for material in materials if material.content])
+    return content, f"All materials from {classroom.name}"
+
+# Question fields the quiz page displays; answers and explanations stay on the server
+QUESTION_DISPLAY_FIELDS = ('question', 'options', 'key_points', 'suggested_length')
+
+# Seconds between checks while another stream is generating the same quiz
+QUIZ_STREAM_POLL_INTERVAL = 0.5
+
+def _claim_quiz_generation(evaluation_id, stale_after):
+    """Atomically mark an evaluation as being generated by this stream.
+
+    The conditional UPDATE succeeds for exactly one caller: when nothing has
+    been generated yet, or when the previous generator has gone silent for
+    ``stale_after`` seconds.
+    """
+    now = datetime.utcnow()
+    claimed = SelfEvaluation.query.filter(
+        SelfEvaluation.id == evaluation_id,
+        db.or_(
+            db.and_(SelfEvaluation.generating_since.is_(None), SelfEvaluation.questions_json == '[]'),
+            SelfEvaluation.generating_since < now - timedelta(seconds=stale_after),
+        ),
+    ).update({SelfEvaluation.generating_since: now}, synchronize_session=False)
+    db.session.commit()
+    return claimed == 1
+
+@views.route('/student/quiz/<int:evaluation_id>/stream')
+@login_required
+def student_stream_quiz(evaluation_id):
+    if current_user.role != 'student':
+        return jsonify({'error': 'Access denied'}), 403
+
+    evaluation = SelfEvaluation.query.filter_by(
+        id=evaluation_id,
+        student_id=current_user.id,
+        is_ai_generated=True,
+    ).first_or_404()
+    if evaluation.completed_at:
+        return jsonify({'error': 'Quiz already submitted'}), 409
+
+    content, context = (None, None)
+    if not json.loads(evaluation.questions_json or '[]'):
+        content, context = _quiz_source(evaluation.classroom, evaluation.material_id)
+        if not content:
+            return jsonify({'error': 'No material content available for this quiz'}), 404
+    stale_after = current_app.config.get('QUIZ_GENERATION_STALE_AFTER', 120)
+
+    def question_event(index, question):
+        return _sse({'index': index, 'question': {k: question[k] for k in QUESTION_DISPLAY_FIELDS if k in question}})
+
+    def generate():
+        # The generator runs after the view returns, in a fresh session.
+        # Only one stream generates; others replay saved questions as they appear.
+        sent = 0
+        while True:
+            db.session.expire_all()
+            record = db.session.get(SelfEvaluation, evaluation_id)
+            if record is None:
+                yield _sse({'error': 'No questions were generated'}, event='failed')
+                return
+            saved = json.loads(record.questions_json or '[]')
+            for index in range(sent, len(saved)):
+                yield question_event(index, saved[index])
+            sent = len(saved)
+            if saved and record.generating_since is None:
+                yield _sse({'count': len(saved), 'partial': False}, event='done')
+                return
+            if _claim_quiz_generation(evaluation_id, stale_after):
+                break
+            time.sleep(QUIZ_STREAM_POLL_INTERVAL)
+
+        record = db.session.get(SelfEvaluation, evaluation_id)
+        questions = json.loads(record.questions_json or '[]')
+        # A stream taking over after a dead one keeps the saved questions and tops them up
+        resume_from = len(questions)
+        error = None
+        try:
+            for index, question in enumerate(ai_service.get_service().stream_quiz(content, record.quiz_type, context)):
+                if index < resume_from:
+                    continue
+                questions.append(question)
+                # Save as we go so a dropped stream keeps the questions already shown
+                record.questions_json = json.dumps(questions)
+                record.generating_since = datetime.utcnow()
+                db.session.commit()
+                yield question_event(len(questions) - 1, question)
+        except Exception as e:
+            error = str(e)
+
+        if questions:
+            record.generating_since = None
+            db.session.commit()
+            yield _sse({'count': len(questions), 'partial': error is not None}, event='done')
+        else:
+            db.session.delete(record)
+            db.session.commit()
+            yield _sse({'error': error or 'No questions were generated'}, event='failed')
+
+    response = Response(stream_with_context(generate()), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+@views.route('/student/submit_quiz/<int:evaluation_id>', methods=['POST'])
 @login_required
 def student_submit_quiz(evaluation_id):
     if current_user.role != 'student':
@@ -1585,26 +2047,20 @@ def student_submit_quiz(evaluation_id):
         student_id=current_user.id
     ).first_or_404()
     
-    # Get submitted answers
-    answers = []
-    questions = json.loads(evaluation.questions_json)
-    
-    for i, question in enumerate(questions):
-        answer_key = f'answer_{i}'
-        if evaluation.quiz_type == 'essay':
-            answer = request.form.get(answer_key, '').strip()
-        else:
-            answer = request.form.get(answer_key)
-        answers.append(answer)
-    
     try:
-        # Score the quiz using AI
-        score, feedback = ai_service.score_quiz(questions, answers, evaluation.quiz_type)
+        if evaluation.quiz_type in scoring.OBJECTIVE_TYPES:
+            # The compiled key is shared by every submission of these questions
+            key = question_sets.answer_key_for(evaluation)
+            answers = [request.form.get(f'answer_{i}') for i in range(len(key))]
+            score = attempts.save_objective(evaluation, key, answers)
+        else:
+            questions = question_sets.questions_for(evaluation)
+            answers = [request.form.get(f'answer_{i}', '').strip() for i in range(len(questions))]
+            # Score the quiz using AI
+            score, feedback = ai_service.get_service().score_quiz(questions, answers, evaluation.quiz_type)
+            attempts.save_essay(evaluation, answers, score, feedback)
         
         # Update evaluation
-        evaluation.answers_json = json.dumps(answers)
-        evaluation.score = score
-        evaluation.feedback_json = json.dumps(feedback)
         evaluation.completed_at = datetime.utcnow()
         
         db.session.commit()
@@ -1616,14 +2072,14 @@ def student_submit_quiz(evaluation_id):
         flash(f'Error scoring quiz: {str(e)}', 'error')
         return redirect(url_for('student_classroom', classroom_id=evaluation.classroom_id))
 
-@app.route('/student/quiz_result/<int:evaluation_id>')
+@views.route('/student/quiz_result/<int:evaluation_id>')
 @login_required
 def student_quiz_result(evaluation_id):
     if current_user.role != 'student':
         flash('Access denied', 'error')
         return redirect(url_for('index'))
     
-    evaluation = SelfEvaluation.query.filter_by(
+    evaluation = SelfEvaluation.query.options(undefer_group('attempt_body')).filter_by(
         id=evaluation_id,
         student_id=current_user.id
     ).first_or_404()
@@ -1631,21 +2087,23 @@ def student_quiz_result(evaluation_id):
     # Check if the quiz is completed or in progress
     if not evaluation.completed_at:
         # If not completed, render the quiz taking page
-        questions = json.loads(evaluation.questions_json)
+        questions = question_sets.questions_for(evaluation)
         return render_template('student/quiz_new.html',
                              classroom=evaluation.classroom,
                              evaluation=evaluation,
                              questions=questions,
                              quiz_type=evaluation.quiz_type,
+                             # Generation was interrupted before any question was saved
+                             stream_url=url_for('student_stream_quiz', evaluation_id=evaluation.id) if not questions and evaluation.is_ai_generated else None,
                              # Pass any other necessary data for taking the quiz, like time limit if applicable
                              time_limit=None, # AI quizzes don't currently have a time limit
                              started_at=evaluation.started_at.isoformat() if evaluation.started_at else datetime.utcnow().isoformat() # Ensure started_at is set or passed
                             )
 
     # If completed, show the results
-    questions = json.loads(evaluation.questions_json)
+    questions = question_sets.questions_for(evaluation)
     answers = json.loads(evaluation.answers_json)
-    feedback = json.loads(evaluation.feedback_json) if evaluation.feedback_json else []
+    feedback = attempts.feedback_for(evaluation, answers)
     
     return render_template('student/quiz.html',
                          classroom=evaluation.classroom,
@@ -1656,7 +2114,7 @@ def student_quiz_result(evaluation_id):
                          quiz_type=evaluation.quiz_type,
                          show_results=True)
 
-@app.route('/student/classroom/<int:classroom_id>/quiz/<int:quiz_id>')
+@views.route('/student/classroom/<int:classroom_id>/quiz/<int:quiz_id>')
 @login_required
 def student_take_teacher_quiz(classroom_id, quiz_id):
     if current_user.role != 'student':
@@ -1664,10 +2122,8 @@ def student_take_teacher_quiz(classroom_id, quiz_id):
         return redirect(url_for('index'))
     
     # Check enrollment
-    enrollment = Enrollment.query.filter_by(
-        classroom_id=classroom_id,
-        student_id=current_user.id
-    ).first_or_404()
+    if classroom_id not in identity.enrolled_classroom_ids():
+        abort(404)
     
     # Get the quiz
     quiz = Quiz.query.filter_by(id=quiz_id, classroom_id=classroom_id, published=True).first_or_404()
@@ -1707,7 +2163,7 @@ def student_take_teacher_quiz(classroom_id, quiz_id):
             existing_evaluation.started_at = datetime.utcnow()
             db.session.commit()
         
-        questions = json.loads(existing_evaluation.questions_json)
+        questions = question_sets.questions_for(existing_evaluation)
         return render_template('student/quiz_new.html',
                              classroom=quiz.classroom,
                              evaluation=existing_evaluation,
@@ -1717,7 +2173,8 @@ def student_take_teacher_quiz(classroom_id, quiz_id):
                              time_limit=quiz.time_limit_minutes,
                              started_at=existing_evaluation.started_at.isoformat() if existing_evaluation.started_at else None)
     
-    # Create a new evaluation
+    # Create a new evaluation; attempts share one stored copy of the questions
+    question_set_digest = question_sets.get_or_create(quiz.questions_json)
     questions = json.loads(quiz.questions_json)
     
     # Add index to each question for easier access in template
@@ -1731,7 +2188,7 @@ def student_take_teacher_quiz(classroom_id, quiz_id):
         classroom_id=classroom_id,
         quiz_id=quiz_id,
         quiz_type=quiz.quiz_type,
-        questions_json=quiz.questions_json,
+        question_set_digest=question_set_digest,
         answers_json=json.dumps([]),
         is_ai_generated=False,
         started_at=datetime.utcnow()
@@ -1749,7 +2206,7 @@ def student_take_teacher_quiz(classroom_id, quiz_id):
                          time_limit=quiz.time_limit_minutes,
                          started_at=evaluation.started_at.isoformat())
 
-@app.route('/student/submit_teacher_quiz/<int:evaluation_id>', methods=['POST'])
+@views.route('/student/submit_teacher_quiz/<int:evaluation_id>', methods=['POST'])
 @login_required
 def student_submit_teacher_quiz(evaluation_id):
     if current_user.role != 'student':
@@ -1767,47 +2224,21 @@ def student_submit_teacher_quiz(evaluation_id):
         flash('Invalid quiz submission', 'error')
         return redirect(url_for('student_dashboard'))
     
-    # Get submitted answers
-    answers = []
-    questions = json.loads(evaluation.questions_json)
-    
-    for i, question in enumerate(questions):
-        answer_key = f'answer_{i}'
-        if evaluation.quiz_type == 'essay':
-            answer = request.form.get(answer_key, '').strip()
-        else:
-            answer = request.form.get(answer_key)
-        answers.append(answer)
-    
     # Score the quiz
-    if evaluation.quiz_type == 'mcq' or evaluation.quiz_type == 'true_false':
-        # For objective questions, we can score them directly
-        correct_count = 0
-        feedback = []
-        
-        for i, (question, answer) in enumerate(zip(questions, answers)):
-            is_correct = answer == question.get('correct_answer')
-            if is_correct:
-                correct_count += 1
-            
-            feedback.append({
-                'question_index': i,
-                'is_correct': is_correct,
-                'correct_answer': question.get('correct_answer'),
-                'explanation': question.get('explanation', ''),
-                'user_answer': answer
-            })
-        
-        score = (correct_count / len(questions)) * 100 if questions else 0
+    if evaluation.quiz_type in scoring.OBJECTIVE_TYPES:
+        # Objective questions are scored against the cached compiled key
+        key = question_sets.answer_key_for(evaluation)
+        answers = [request.form.get(f'answer_{i}') for i in range(len(key))]
+        score = attempts.save_objective(evaluation, key, answers)
         
     elif evaluation.quiz_type == 'essay':
         # For essays, use AI to score
-        score, feedback = ai_service.score_quiz(questions, answers, evaluation.quiz_type)
+        questions = question_sets.questions_for(evaluation)
+        answers = [request.form.get(f'answer_{i}', '').strip() for i in range(len(questions))]
+        score, feedback = ai_service.get_service().score_quiz(questions, answers, evaluation.quiz_type)
+        attempts.save_essay(evaluation, answers, score, feedback)
     
     # Update evaluation
-    evaluation.answers_json = json.dumps(answers)
-    evaluation.score = score
-    evaluation.feedback_json = json.dumps(feedback)
     evaluation.completed_at = datetime.utcnow()
     
     db.session.commit()
@@ -1815,7 +2246,7 @@ def student_submit_teacher_quiz(evaluation_id):
     flash(f'Quiz submitted! Your score: {score:.1f}%', 'success')
     return redirect(url_for('student_quiz_result', evaluation_id=evaluation_id))
 
-@app.route('/student/classroom/<int:classroom_id>/all_activities')
+@views.route('/student/classroom/<int:classroom_id>/all_activities')
 @login_required
 def student_all_activities(classroom_id):
     if current_user.role != 'student':
@@ -1823,12 +2254,7 @@ def student_all_activities(classroom_id):
         return redirect(url_for('index'))
 
     # Check enrollment
-    enrollment = Enrollment.query.filter_by(
-        classroom_id=classroom_id,
-        student_id=current_user.id
-    ).first_or_404()
-
-    classroom = enrollment.classroom
+    classroom = identity.enrolled_classroom_or_404(classroom_id)
 
     # Get all evaluations for this student in this classroom, ordered by recency
     recent_ai_quizzes = SelfEvaluation.query.filter_by(
@@ -1867,7 +2293,7 @@ def student_all_activities(classroom_id):
                            classroom=classroom,
                            evaluations=all_activities)
 
-@app.route('/student/reports')
+@views.route('/student/reports')
 @login_required
 def student_reports():
     if current_user.role != 'student':
@@ -1919,52 +2345,41 @@ def student_reports():
 
     return render_template('student/reports.html', reports=reports)
 
-@app.route('/uploads/<filename>')
+@views.route('/uploads/<filename>')
 @login_required
 def uploaded_file(filename):
     """Serve uploaded files securely."""
-    # Optionally verify user authorization to access this file
-    material = Material.query.filter_by(file_path=filename).first()
-    if material:
-        if current_user.role == 'teacher':
-            # Teacher can access only materials from their own classrooms
-            if material.classroom.teacher_id != current_user.id:
-                flash('Access denied', 'error')
-                return redirect(url_for('index'))
-        elif current_user.role == 'student':
-            # Student must be enrolled in the classroom of the material
-            enrollment = Enrollment.query.filter_by(
-                classroom_id=material.classroom_id,
-                student_id=current_user.id
-            ).first()
-            if not enrollment:
-                flash('Access denied', 'error')
-                return redirect(url_for('index'))
+    # Identical uploads share a stored file, so any referencing material grants access.
+    # Decisions are cached briefly so repeated range requests skip the DB.
+    allowed, download_name = file_serving.authorize(current_user, filename)
+    if not allowed:
+        flash('Access denied', 'error')
+        return redirect(url_for('index'))
 
     try:
-        return send_from_directory(app.config['UPLOAD_FOLDER'], filename)
+        return file_serving.send_upload(filename, download_name=download_name)
     except FileNotFoundError:
         flash('File not found.', 'error')
         return redirect(url_for('index')) # Or a suitable error page
 
 # Error handlers
-@app.errorhandler(404)
+@views.errorhandler(404)
 def not_found_error(error):
     return render_template('base.html', error_message='Page not found'), 404
 
-@app.errorhandler(500)
+@views.errorhandler(500)
 def internal_error(error):
     db.session.rollback()
     return render_template('base.html', error_message='An internal error occurred'), 500
 
-@app.route('/teacher/classroom/<int:classroom_id>/student/<int:student_id>/reset_password', methods=['POST'])
+@views.route('/teacher/classroom/<int:classroom_id>/student/<int:student_id>/reset_password', methods=['POST'])
 @login_required
 def teacher_reset_student_password(classroom_id, student_id):
     if current_user.role != 'teacher':
         flash('Access denied', 'error')
         return redirect(url_for('index'))
 
-    classroom = Classroom.query.filter_by(id=classroom_id, teacher_id=current_user.id).first_or_404()
+    classroom = identity.owned_classroom_or_404(classroom_id)
     student = User.query.filter_by(id=student_id, role='student').first_or_404()
 
     # Ensure the student is in this classroom
@@ -1988,7 +2403,7 @@ def teacher_reset_student_password(classroom_id, student_id):
 
     return redirect(url_for('teacher_classroom', classroom_id=classroom_id))
 
-@app.route('/teacher/edit_profile', methods=['GET', 'POST'])
+@views.route('/teacher/edit_profile', methods=['GET', 'POST'])
 @login_required
 def teacher_edit_profile():
     if current_user.role != 'teacher':
@@ -2009,7 +2424,7 @@ def teacher_edit_profile():
 
     return render_template('teacher/edit_profile.html', teacher=current_user)
 
-@app.route('/teacher/change_password', methods=['GET', 'POST'])
+@views.route('/teacher/change_password', methods=['GET', 'POST'])
 @login_required
 def teacher_change_password():
     if current_user.role != 'teacher':
@@ -2040,7 +2455,7 @@ def teacher_change_password():
 
     return render_template('teacher/change_password.html')
 
-@app.route('/student/edit_profile', methods=['GET', 'POST'])
+@views.route('/student/edit_profile', methods=['GET', 'POST'])
 @login_required
 def student_edit_profile():
     if current_user.role != 'student':
@@ -2061,7 +2476,7 @@ def student_edit_profile():
 
     return render_template('student/edit_profile.html', student=current_user)
 
-@app.route('/student/change_password', methods=['GET', 'POST'])
+@views.route('/student/change_password', methods=['GET', 'POST'])
 @login_required
 def student_change_password():
     if current_user.role != 'student':
@@ -2096,7 +2511,7 @@ def student_change_password():
     return render_template('student/change_password.html')
 
 
-@app.route('/notifications', methods=['GET', 'POST'])
+@views.route('/notifications', methods=['GET', 'POST'])
 @login_required
 def notifications():
     from models import Notification
@@ -2148,14 +2563,14 @@ def calculate_cpmk_student_scores(cpmk_id):
     results.sort(key=lambda r: r['student'].full_name if r['student'] else '')
     return results
 
-@app.route('/teacher/classroom/<int:classroom_id>/cpmk', methods=['GET', 'POST'])
+@views.route('/teacher/classroom/<int:classroom_id>/cpmk', methods=['GET', 'POST'])
 @login_required
 def teacher_cpmk(classroom_id):
     if current_user.role != 'teacher':
         flash('Access denied', 'error')
         return redirect(url_for('index'))
 
-    classroom = Classroom.query.filter_by(id=classroom_id, teacher_id=current_user.id).first_or_404()
+    classroom = identity.owned_classroom_or_404(classroom_id)
 
     if request.method == 'POST':
         code = request.form.get('code')
@@ -2194,6 +2609,7 @@ def teacher_cpmk(classroom_id):
         angles += angles[:1]
         class_avg_scores += class_avg_scores[:1]
 
+        plt = _pyplot()
         fig, ax = plt.subplots(figsize=(8, 8), subplot_kw=dict(polar=True))
         ax.fill(angles, class_avg_scores, color='blue', alpha=0.25, label='Class Average')
         ax.plot(angles, class_avg_scores, color='blue', linewidth=2)
@@ -2221,14 +2637,14 @@ def teacher_cpmk(classroom_id):
                            progress=progress, selected_cpmk=selected_cpmk, 
                            student_progress=student_progress, radar_chart_img=radar_chart_img)
 
-@app.route('/teacher/classroom/<int:classroom_id>/cpmk/<int:cpmk_id>/delete', methods=['POST'])
+@views.route('/teacher/classroom/<int:classroom_id>/cpmk/<int:cpmk_id>/delete', methods=['POST'])
 @login_required
 def teacher_delete_cpmk(classroom_id, cpmk_id):
     if current_user.role != 'teacher':
         flash('Access denied', 'error')
         return redirect(url_for('index'))
     
-    classroom = Classroom.query.filter_by(id=classroom_id, teacher_id=current_user.id).first_or_404()
+    classroom = identity.owned_classroom_or_404(classroom_id)
     cpmk = CPMK.query.filter_by(id=cpmk_id, classroom_id=classroom.id).first_or_404()
 
     # Remove associations with materials, quizzes, and assignments
@@ -2244,28 +2660,28 @@ def teacher_delete_cpmk(classroom_id, cpmk_id):
     flash('CPMK deleted successfully!', 'success')
     return redirect(url_for('teacher_cpmk', classroom_id=classroom.id))
 
-@app.route('/teacher/classroom/<int:classroom_id>/assignments')
+@views.route('/teacher/classroom/<int:classroom_id>/assignments')
 @login_required
 def teacher_assignments(classroom_id):
     if current_user.role != 'teacher':
         flash('Access denied', 'error')
         return redirect(url_for('index'))
     
-    classroom = Classroom.query.filter_by(id=classroom_id, teacher_id=current_user.id).first_or_404()
+    classroom = identity.owned_classroom_or_404(classroom_id)
     assignments = Assignment.query.filter_by(classroom_id=classroom_id).order_by(Assignment.created_at.desc()).all()
     
     return render_template('teacher/assignments.html', 
                          classroom=classroom, 
                          assignments=assignments)
 
-@app.route('/teacher/classroom/<int:classroom_id>/assignment/create', methods=['GET', 'POST'])
+@views.route('/teacher/classroom/<int:classroom_id>/assignment/create', methods=['GET', 'POST'])
 @login_required
 def teacher_create_assignment(classroom_id):
     if current_user.role != 'teacher':
         flash('Access denied', 'error')
         return redirect(url_for('index'))
     
-    classroom = Classroom.query.filter_by(id=classroom_id, teacher_id=current_user.id).first_or_404()
+    classroom = identity.owned_classroom_or_404(classroom_id)
 
     if request.method == 'POST':
         title = request.form.get('title')
@@ -2316,7 +2732,7 @@ def teacher_create_assignment(classroom_id):
     cpmks = CPMK.query.filter_by(classroom_id=classroom.id).all()
     return render_template('teacher/create_assignment.html', classroom=classroom, cpmks=cpmks)
 
-@app.route('/teacher/assignment/<int:assignment_id>/edit', methods=['GET', 'POST'])
+@views.route('/teacher/assignment/<int:assignment_id>/edit', methods=['GET', 'POST'])
 @login_required
 def teacher_edit_assignment(assignment_id):
     if current_user.role != 'teacher':
@@ -2357,7 +2773,7 @@ def teacher_edit_assignment(assignment_id):
     cpmks = CPMK.query.filter_by(classroom_id=classroom.id).all()
     return render_template('teacher/edit_assignment.html', assignment=assignment, classroom=classroom, cpmks=cpmks)
 
-@app.route('/teacher/assignment/<int:assignment_id>/publish', methods=['POST'])
+@views.route('/teacher/assignment/<int:assignment_id>/publish', methods=['POST'])
 @login_required
 def teacher_publish_assignment(assignment_id):
     if current_user.role != 'teacher':
@@ -2383,7 +2799,7 @@ def teacher_publish_assignment(assignment_id):
 
     return redirect(url_for('teacher_assignments', classroom_id=classroom.id))
 
-@app.route('/teacher/assignment/<int:assignment_id>/delete', methods=['POST'])
+@views.route('/teacher/assignment/<int:assignment_id>/delete', methods=['POST'])
 @login_required
 def teacher_delete_assignment(assignment_id):
     if current_user.role != 'teacher':
@@ -2398,7 +2814,7 @@ def teacher_delete_assignment(assignment_id):
     flash(f'Assignment "{assignment.title}" deleted successfully.', 'success')
     return redirect(url_for('teacher_assignments', classroom_id=classroom_id))
 
-@app.route('/student/classroom/<int:classroom_id>/assignments')
+@views.route('/student/classroom/<int:classroom_id>/assignments')
 @login_required
 def student_assignments(classroom_id):
     if current_user.role != 'student':
@@ -2406,7 +2822,7 @@ def student_assignments(classroom_id):
         return redirect(url_for('index'))
 
     classroom = Classroom.query.filter_by(id=classroom_id).first_or_404()
-    if not Enrollment.query.filter_by(classroom_id=classroom.id, student_id=current_user.id).first():
+    if classroom.id not in identity.enrolled_classroom_ids():
         flash('You are not enrolled in this classroom.', 'error')
         return redirect(url_for('student_dashboard'))
     
@@ -2431,7 +2847,7 @@ def student_assignments(classroom_id):
                            classroom=classroom,
                            assignments_with_submissions=assignments_with_submissions)
 
-@app.route('/student/assignment/<int:assignment_id>', methods=['GET', 'POST'])
+@views.route('/student/assignment/<int:assignment_id>', methods=['GET', 'POST'])
 @login_required
 def student_view_assignment(assignment_id):
     if current_user.role != 'student':
@@ -2527,14 +2943,14 @@ def student_view_assignment(assignment_id):
                            can_resubmit=can_resubmit,
                            classmates=classmates)
 
-@app.route('/teacher/classroom/<int:classroom_id>/assignment/<int:assignment_id>/submissions')
+@views.route('/teacher/classroom/<int:classroom_id>/assignment/<int:assignment_id>/submissions')
 @login_required
 def teacher_view_submissions(classroom_id, assignment_id):
     if current_user.role != 'teacher':
         flash('Access denied', 'error')
         return redirect(url_for('index'))
     
-    classroom = Classroom.query.filter_by(id=classroom_id, teacher_id=current_user.id).first_or_404()
+    classroom = identity.owned_classroom_or_404(classroom_id)
     assignment = Assignment.query.filter_by(id=assignment_id, classroom_id=classroom.id).first_or_404()
     submissions = AssignmentSubmission.query.filter_by(assignment_id=assignment.id).options(joinedload(AssignmentSubmission.student)).order_by(AssignmentSubmission.submitted_at.asc()).all()
 
@@ -2543,14 +2959,14 @@ def teacher_view_submissions(classroom_id, assignment_id):
                            assignment=assignment, 
                            submissions=submissions)
 
-@app.route('/teacher/classroom/<int:classroom_id>/assignment/<int:assignment_id>/submission/<int:submission_id>/grade', methods=['GET', 'POST'])
+@views.route('/teacher/classroom/<int:classroom_id>/assignment/<int:assignment_id>/submission/<int:submission_id>/grade', methods=['GET', 'POST'])
 @login_required
 def teacher_grade_submission(classroom_id, assignment_id, submission_id):
     if current_user.role != 'teacher':
         flash('Access denied', 'error')
         return redirect(url_for('index'))
 
-    classroom = Classroom.query.filter_by(id=classroom_id, teacher_id=current_user.id).first_or_404()
+    classroom = identity.owned_classroom_or_404(classroom_id)
     assignment = Assignment.query.filter_by(id=assignment_id, classroom_id=classroom.id).first_or_404()
     submission = AssignmentSubmission.query.options(joinedload(AssignmentSubmission.student)).filter_by(id=submission_id, assignment_id=assignment.id).first_or_404()
 
@@ -2580,7 +2996,7 @@ def teacher_grade_submission(classroom_id, assignment_id, submission_id):
                            assignment=assignment,
                            submission=submission)
 
-@app.route('/teacher/submission/<int:submission_id>/toggle_resubmission', methods=['POST'])
+@views.route('/teacher/submission/<int:submission_id>/toggle_resubmission', methods=['POST'])
 @login_required
 def teacher_toggle_resubmission(submission_id):
     if current_user.role != 'teacher':
@@ -2604,14 +3020,14 @@ def teacher_toggle_resubmission(submission_id):
     
     return redirect(url_for('teacher_view_submissions', classroom_id=submission.assignment.classroom_id, assignment_id=submission.assignment.id))
 
-@app.route('/teacher/classroom/<int:classroom_id>/cpmk/<int:cpmk_id>/details')
+@views.route('/teacher/classroom/<int:classroom_id>/cpmk/<int:cpmk_id>/details')
 @login_required
 def teacher_cpmk_details(classroom_id, cpmk_id):
     if current_user.role != 'teacher':
         flash('Access denied', 'error')
         return redirect(url_for('index'))
 
-    classroom = Classroom.query.filter_by(id=classroom_id, teacher_id=current_user.id).first_or_404()
+    classroom = identity.owned_classroom_or_404(classroom_id)
     cpmk = CPMK.query.filter_by(id=cpmk_id, classroom_id=classroom.id).first_or_404()
 
     student_progress = calculate_cpmk_student_scores(cpmk.id)
@@ -2632,6 +3048,7 @@ def teacher_cpmk_details(classroom_id, cpmk_id):
     
     student_performance_chart_img = None
     if student_labels:
+        plt = _pyplot()
         fig, ax = plt.subplots(figsize=(10, 6))
         y_pos = range(len(student_labels))
         ax.barh(y_pos, student_scores, color='skyblue')
@@ -2676,6 +3093,7 @@ def teacher_cpmk_details(classroom_id, cpmk_id):
             stats += stats[:1]
             class_avg_scores += class_avg_scores[:1]
 
+            plt = _pyplot()
             fig, ax = plt.subplots(figsize=(6, 6), subplot_kw=dict(polar=True))
             ax.fill(angles, stats, color='red', alpha=0.25, label=f'{cpmk.code} Performance')
             ax.plot(angles, stats, color='red', linewidth=2)
@@ -2703,14 +3121,14 @@ def teacher_cpmk_details(classroom_id, cpmk_id):
                            overall_avg_score=overall_avg_score,
                            radar_chart_img=radar_chart_img)
 
-@app.route('/teacher/classroom/<int:classroom_id>/student/<int:student_id>/cpmk_performance')
+@views.route('/teacher/classroom/<int:classroom_id>/student/<int:student_id>/cpmk_performance')
 @login_required
 def teacher_student_cpmk_performance(classroom_id, student_id):
     if current_user.role != 'teacher':
         flash('Access denied', 'error')
         return redirect(url_for('index'))
     
-    classroom = Classroom.query.filter_by(id=classroom_id, teacher_id=current_user.id).first_or_404()
+    classroom = identity.owned_classroom_or_404(classroom_id)
     student = User.query.filter_by(id=student_id, role='student').first_or_404()
 
     # Get all CPMKs for the classroom
@@ -2755,6 +3173,7 @@ def teacher_student_cpmk_performance(classroom_id, student_id):
         student_scores += student_scores[:1]
         class_avg_scores += class_avg_scores[:1]
 
+        plt = _pyplot()
         fig, ax = plt.subplots(figsize=(8, 8), subplot_kw=dict(polar=True))
         ax.fill(angles, student_scores, color='red', alpha=0.25, label=f'{student.full_name} Performance')
         ax.plot(angles, student_scores, color='red', linewidth=2)
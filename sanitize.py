@@ -0,0 +1,158 @@
+import hashlib
+import os
+import re
+import threading
+from collections import OrderedDict
+
+import bleach
+import markdown
+from sqlalchemy import event
+
+from models import Assignment, AssignmentSubmission
+
+# Tags and attributes kept in sanitized markdown and AI-generated HTML
+ALLOWED_TAGS = [
+    'p', 'br', 'div', 'span', 'a', 'ul', 'ol', 'li',
+    'strong', 'em', 'b', 'i', 'u', 'blockquote', 'code', 'pre',
+    'h1', 'h2', 'h3', 'h4', 'h5', 'h6',
+    'table', 'thead', 'tbody', 'tr', 'th', 'td',
+    'img', 'hr'
+]
+ALLOWED_ATTRS = {
+    '*': ['class', 'id', 'style', re.compile(r'^data-.*$')],
+    'a': ['href', 'title'],
+    'img': ['src', 'alt', 'title'],
+    'th': ['colspan', 'rowspan', 'style'],
+    'td': ['colspan', 'rowspan', 'style'],
+    'table': ['style', 'border', 'cellpadding', 'cellspacing']
+}
+
+# Results kept per process, bounded both by count and by total characters
+CACHE_SIZE = 512
+CACHE_MAX_CHARS = 16 * 1024 * 1024
+
+
+def bleach_clean(html):
+    return bleach.clean(html, tags=ALLOWED_TAGS, attributes=ALLOWED_ATTRS)
+
+
+def nh3_clean(html):
+    """The same allow-list through nh3 (ammonia), which is much faster when installed.
+
+    nh3 cannot match attribute names by pattern, so ``data-*`` is given as a
+    prefix, and it adds no ``rel`` to links, like bleach.
+    """
+    import nh3
+
+    attributes = {tag: {name for name in names if isinstance(name, str)} for tag, names in ALLOWED_ATTRS.items()}
+    return nh3.clean(html, tags=set(ALLOWED_TAGS), attributes=attributes,
+                     generic_attribute_prefixes={'data-'}, link_rel=None)
+
+
+BACKENDS = {
+    'bleach': bleach_clean,
+    'nh3': nh3_clean,
+}
+
+
+def get_backend(name=None):
+    """Return the cleaning function named by ``name`` or the SANITIZER_BACKEND environment variable."""
+    name = (name or os.getenv('SANITIZER_BACKEND') or 'bleach').lower()
+    try:
+        return BACKENDS[name]
+    except KeyError:
+        raise ValueError(f"Unknown sanitizer backend: {name}")
+
+
+class _Memo:
+    """LRU of rendered output keyed by a hash of the input, so large inputs are not kept alive."""
+
+    def __init__(self, max_entries=CACHE_SIZE, max_chars=CACHE_MAX_CHARS):
+        self.max_entries = max_entries
+        self.max_chars = max_chars
+        self._entries = OrderedDict()
+        self._chars = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_render(self, kind, text, render):
+        key = (kind, hashlib.sha256(text.encode()).digest())
+        with self._lock:
+            result = self._entries.get(key)
+            if result is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return result
+            self.misses += 1
+        result = render(text)
+        if len(result) > self.max_chars:
+            return result
+        with self._lock:
+            if key not in self._entries:
+                self._entries[key] = result
+                self._chars += len(result)
+            while len(self._entries) > self.max_entries or self._chars > self.max_chars:
+                _, evicted = self._entries.popitem(last=False)
+                self._chars -= len(evicted)
+        return result
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._chars = 0
+            self.hits = self.misses = 0
+
+
+_memo = _Memo()
+
+
+def clear_cache():
+    _memo.clear()
+
+
+def cache_info():
+    return {'hits': _memo.hits, 'misses': _memo.misses, 'entries': len(_memo._entries), 'chars': _memo._chars}
+
+
+def clean_html(html):
+    """Sanitize HTML against the allow-list, reusing the result for identical input."""
+    clean = get_backend()
+    return _memo.get_or_render(('html', clean.__name__), html, clean)
+
+
+def render_markdown(text):
+    """Render markdown to sanitized HTML, reusing the result for identical input."""
+    clean = get_backend()
+    return _memo.get_or_render(('markdown', clean.__name__), text, lambda text: clean(markdown.markdown(text)))
+
+
+def strip_code_fences(html):
+    """Remove the markdown code fence the model sometimes wraps generated HTML in."""
+    if html.startswith('```html\n'):
+        html = html[len('```html\n'):]
+    if html.endswith('```'):
+        html = html[:-len('```')]
+    return html
+
+
+def clean_study_guide(html):
+    return clean_html(strip_code_fences(html))
+
+
+def _markdown_column_listener(html_attribute):
+    def listener(target, value, oldvalue, initiator):
+        setattr(target, html_attribute, render_markdown(value) if value else None)
+    return listener
+
+
+# Markdown columns and the column holding their rendered, sanitized HTML,
+# kept in step whenever the source is assigned
+RENDERED_COLUMNS = [
+    (Assignment.description, 'description_html'),
+    (AssignmentSubmission.content, 'content_html'),
+    (AssignmentSubmission.feedback, 'feedback_html'),
+]
+
+for _column, _html_attribute in RENDERED_COLUMNS:
+    event.listen(_column, 'set', _markdown_column_listener(_html_attribute))
@@ -0,0 +1,89 @@
+import json
+from functools import lru_cache
+
+import numpy as np
+
+OBJECTIVE_TYPES = ('mcq', 'true_false')
+# Codes for answers outside the key's vocabulary and key entries that can never match
+UNANSWERED = -1
+NO_KEY = -2
+# Compiled keys kept per process; one per distinct question set being answered
+KEY_CACHE_SIZE = 256
+
+
+class AnswerKey:
+    """The answer key of an objective quiz, compiled for fast scoring.
+
+    Correct answers are mapped to small integer codes, so checking a
+    submission is one array comparison and building its feedback needs no
+    access to the question dicts.
+    """
+
+    __slots__ = ('correct_answers', 'explanations', 'codes', '_vocabulary')
+
+    def __init__(self, questions):
+        self.correct_answers = tuple(q.get('correct_answer') for q in questions)
+        self.explanations = tuple(q.get('explanation', '') for q in questions)
+        self._vocabulary = {}
+        for answer in self.correct_answers:
+            if answer is not None:
+                self._vocabulary.setdefault(answer, len(self._vocabulary))
+        self.codes = np.array(
+            [NO_KEY if answer is None else self._vocabulary[answer] for answer in self.correct_answers],
+            dtype=np.int16,
+        )
+
+    def __len__(self):
+        return len(self.correct_answers)
+
+    def encode(self, answers):
+        """Return the answer codes as an array; answers no key entry uses never match."""
+        return np.array([self._vocabulary.get(answer, UNANSWERED) for answer in answers], dtype=np.int16)
+
+    def encode_many(self, rows):
+        """Encode equally long answer lists into an ``(attempts, questions)`` array."""
+        vocabulary = self._vocabulary
+        return np.array(
+            [[vocabulary.get(answer, UNANSWERED) for answer in answers] for answers in rows],
+            dtype=np.int16,
+        ).reshape(len(rows), len(self))
+
+    def feedback(self, answers, correct):
+        return [
+            {
+                'question_index': i,
+                'is_correct': bool(is_correct),
+                'correct_answer': self.correct_answers[i],
+                'explanation': self.explanations[i],
+                'user_answer': answer,
+            }
+            for i, (answer, is_correct) in enumerate(zip(answers, correct))
+        ]
+
+    def check(self, answers):
+        """Return a boolean array marking which of ``answers`` are correct."""
+        return self.encode(answers) == self.codes
+
+    def percentage(self, correct):
+        return (int(correct.sum()) / len(self)) * 100 if len(self) else 0
+
+    def score(self, answers):
+        """Score one submission, returning ``(percentage, feedback)``."""
+        if not len(self):
+            return 0, []
+        correct = self.check(answers)
+        return self.percentage(correct), self.feedback(answers, correct)
+
+
+@lru_cache(maxsize=KEY_CACHE_SIZE)
+def compile_key(questions_json):
+    """Return the AnswerKey for a stored question set, compiling it on first use.
+
+    The cache is keyed by the stored JSON itself, so an edited quiz gets a new
+    entry while every submission against the same version reuses one key.
+    """
+    return AnswerKey(json.loads(questions_json))
+
+
+def score_objective(questions_json, answers):
+    return compile_key(questions_json).score(answers)
@@ -1,18 +1,26 @@
 import re
+import json
 from typing import List, Dict
-from models import Material
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
+from sqlalchemy.orm import undefer
+from models import Material, MATERIAL_SEARCHABLE
 import numpy as np
 import logging
 
 class SimpleVectorSearch:
     def __init__(self):
-        self.vectorizer = TfidfVectorizer(
-            max_features=1000,
-            stop_words='english',
-            ngram_range=(1, 2)
-        )
+        self._vectorizer = None
+
+    @property
+    def vectorizer(self):
+        # scikit-learn takes about a second to import, so load it on the first search
+        if self._vectorizer is None:
+            from sklearn.feature_extraction.text import TfidfVectorizer
+            self._vectorizer = TfidfVectorizer(
+                max_features=1000,
+                stop_words='english',
+                ngram_range=(1, 2)
+            )
+        return self._vectorizer
     
     def chunk_text(self, text: str, chunk_size: int = 300) -> List[str]:
         """Split text into manageable chunks"""
@@ -47,10 +55,14 @@ class SimpleVectorSearch:
         """Get relevant content using TF-IDF similarity"""
         try:
             # Get materials
+            materials_query = Material.query.options(undefer(Material.content), undefer(Material.chunks_json))
             if material_id:
-                materials = Material.query.filter_by(id=material_id).all()
+                materials = materials_query.filter_by(id=material_id).all()
             else:
-                materials = Material.query.filter_by(classroom_id=classroom_id).all()
+                materials = materials_query.filter(
+                    Material.classroom_id == classroom_id,
+                    Material.status.in_(MATERIAL_SEARCHABLE)
+                ).all()
             
             if not materials:
                 return "No materials found."
@@ -61,7 +73,11 @@ class SimpleVectorSearch:
             
             for material in materials:
                 if material.content:
-                    chunks = self.chunk_text(material.content)
+                    # Prefer the chunks stored by the ingestion pipeline
+                    if material.chunks_json:
+                        chunks = json.loads(material.chunks_json)
+                    else:
+                        chunks = self.chunk_text(material.content)
                     for chunk in chunks:
                         if len(chunk.strip()) > 20:  # Skip very short chunks
                             all_chunks.append(chunk)
@@ -81,6 +97,7 @@ class SimpleVectorSearch:
             query_vector = tfidf_matrix[0:1]
             chunk_vectors = tfidf_matrix[1:]
             
+            from sklearn.metrics.pairwise import cosine_similarity
             similarities = cosine_similarity(query_vector, chunk_vectors).flatten()
             
             # Get top 5 most relevant chunks
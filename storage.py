@@ -0,0 +1,117 @@
+import hashlib
+import logging
+import os
+import tempfile
+
+from flask import current_app
+from sqlalchemy.exc import IntegrityError
+from werkzeug.utils import secure_filename
+
+from extensions import db
+from models import StoredFile
+
+# Read uploads in fixed-size blocks so hashing never buffers a whole file
+CHUNK_SIZE = 64 * 1024
+
+
+def _extension(filename):
+    filename = secure_filename(filename)
+    return filename.rsplit('.', 1)[1].lower() if '.' in filename else ''
+
+
+def _storage_name(digest, extension):
+    return f"{digest}.{extension}" if extension else digest
+
+
+def _find(digest):
+    return StoredFile.query.filter_by(digest=digest).first()
+
+
+def _add_reference(stored_file, temp_path):
+    os.remove(temp_path)
+    # Increment in SQL so concurrent uploads of the same file cannot lose a reference
+    stored_file.ref_count = StoredFile.ref_count + 1
+    return stored_file
+
+
+def acquire(digest, extension, temp_path, size):
+    """Take a reference on the stored file for ``digest``.
+
+    ``temp_path`` holds the uploaded bytes. It is moved into place when the
+    digest is new and discarded otherwise. If another worker inserts the same
+    digest first, the unique constraint rejects our row and the reference is
+    taken on theirs instead; that rolls the session back, so call this before
+    adding anything else to it. The caller commits the session.
+    """
+    upload_folder = current_app.config['UPLOAD_FOLDER']
+    stored_file = _find(digest)
+    if stored_file is not None:
+        return _add_reference(stored_file, temp_path)
+
+    file_path = _storage_name(digest, extension)
+    stored_file = StoredFile(digest=digest, file_path=file_path, size=size, ref_count=1)
+    db.session.add(stored_file)
+    try:
+        db.session.flush()
+    except IntegrityError:
+        # SAVEPOINTs would commit early under pysqlite, so recover with a full rollback
+        db.session.rollback()
+        stored_file = _find(digest)
+        if stored_file is None:
+            raise
+        return _add_reference(stored_file, temp_path)
+    os.replace(temp_path, os.path.join(upload_folder, file_path))
+    return stored_file
+
+
+def store_upload(file_storage, original_filename):
+    """Hash and store an uploaded file, returning its StoredFile.
+
+    The file is streamed to a temporary file in the upload folder while its
+    SHA-256 digest is computed, so identical uploads share one copy on disk.
+    """
+    upload_folder = current_app.config['UPLOAD_FOLDER']
+    digest = hashlib.sha256()
+    size = 0
+    fd, temp_path = tempfile.mkstemp(dir=upload_folder, prefix='.upload-')
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            while True:
+                block = file_storage.stream.read(CHUNK_SIZE)
+                if not block:
+                    break
+                digest.update(block)
+                out.write(block)
+                size += len(block)
+    except Exception:
+        os.remove(temp_path)
+        raise
+    return acquire(digest.hexdigest(), _extension(original_filename), temp_path, size)
+
+
+def release(stored_file):
+    """Drop one reference to a stored file.
+
+    Returns the path to unlink once the caller has committed, or None while
+    other materials still reference the file.
+    """
+    stored_file.ref_count = StoredFile.ref_count - 1
+    db.session.flush()
+    db.session.refresh(stored_file)
+    if stored_file.ref_count > 0:
+        return None
+    path = os.path.join(current_app.config['UPLOAD_FOLDER'], stored_file.file_path)
+    db.session.delete(stored_file)
+    return path
+
+
+def unlink_if_unreferenced(path, digest):
+    """Remove a released file unless a concurrent upload has re-acquired it."""
+    if StoredFile.query.filter_by(digest=digest).first() is not None:
+        return
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        logging.error(f"Could not remove stored file {path}: {str(e)}")
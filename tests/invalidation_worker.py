@@ -0,0 +1,39 @@
+"""A stand-in gunicorn worker for the invalidation tests.
+
+Each worker imports the app in its own process, so it has its own LRU cache
+and its own view of the invalidation bus. The database and bus settings come
+from the environment the test spawned it with.
+"""
+from sqlalchemy import event
+
+
+def serve(conn):
+    from main import app
+    from extensions import db
+    from awards_utils import count_gold_awards
+    from models import SelfEvaluation
+
+    queries = []
+
+    def record(*args):
+        queries.append(args[2])
+
+    with app.app_context():
+        event.listen(db.engine, "before_cursor_execute", record)
+    conn.send("ready")
+    while True:
+        command, args = conn.recv()
+        if command == "stop":
+            break
+        with app.app_context():
+            queries.clear()
+            if command == "gold":
+                result = count_gold_awards(*args)
+            elif command == "score":
+                evaluation_id, score = args
+                db.session.get(SelfEvaluation, evaluation_id).score = score
+                db.session.commit()
+                result = None
+            db.session.remove()
+        conn.send((result, len(queries)))
+    conn.close()
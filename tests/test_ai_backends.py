@@ -0,0 +1,65 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from google.api_core import exceptions as google_exceptions
+
+from ai_backends import AIBackend, FakeBackend, create_backend
+from ai_service import AIService
+import rate_limiter
+
+MATERIAL = "Photosynthesis converts light energy into chemical energy stored in glucose. " * 20
+
+
+class FakeBackendTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        rate_limiter._limiter = rate_limiter.RateLimiter(os.path.join(self.tmp, "limits.sqlite3"), burst=100)
+        self.service = AIService(backend=FakeBackend(latency_scale=0))
+
+    def tearDown(self):
+        rate_limiter._limiter = None
+        shutil.rmtree(self.tmp)
+
+    def test_quizzes_match_the_prompt_schema(self):
+        mcq = self.service.generate_quiz(MATERIAL, "mcq")
+        self.assertEqual(len(mcq), 20)
+        for question in mcq:
+            self.assertEqual(len(question["options"]), 4)
+            self.assertIn(question["correct_answer"], "ABCD")
+
+        true_false = self.service.generate_quiz(MATERIAL, "true_false")
+        self.assertTrue(all(q["correct_answer"] in ("True", "False") for q in true_false))
+
+        essay = self.service.generate_quiz(MATERIAL, "essay")
+        self.assertEqual(len(essay), 3)
+        score, feedback = self.service.score_quiz(essay, ["Light energy becomes glucose. " * 10, "", "no idea"], "essay")
+        self.assertGreater(feedback[0]["score"], 0)
+        self.assertEqual(feedback[1]["score"], 0)
+
+    def test_output_is_deterministic_per_prompt(self):
+        other = AIService(backend=FakeBackend(latency_scale=0))
+        self.assertEqual(self.service.generate_quiz(MATERIAL, "mcq"), other.generate_quiz(MATERIAL, "mcq"))
+        self.assertIn("<h2>", self.service.generate_study_guide(MATERIAL, "Biology"))
+
+    def test_latency_and_errors_are_simulated(self):
+        slept = []
+        backend = FakeBackend(latency_scale=1.0, error_rate=1.0, sleep=slept.append)
+        with self.assertRaises(google_exceptions.ResourceExhausted):
+            backend.generate("score_essay", "prompt")
+        self.assertGreater(slept[0], 0)
+
+    def test_unknown_backend_is_rejected(self):
+        with self.assertRaises(ValueError):
+            create_backend("carrier-pigeon")
+
+    def test_backends_must_implement_generate(self):
+        class Incomplete(AIBackend):
+            name = 'incomplete'
+
+        with self.assertRaises(TypeError):
+            Incomplete()
+
+if __name__ == '__main__':
+    unittest.main()
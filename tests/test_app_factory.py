@@ -0,0 +1,65 @@
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from datetime import date
+
+os.environ["GEMINI_API_KEY"] = "dummy"
+from app import create_app, preload
+from extensions import db
+from models import User, DailyQuoteCache
+
+
+class AppFactoryTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def _app(self, name):
+        app = create_app({
+            "TESTING": True,
+            "SQLALCHEMY_DATABASE_URI": "sqlite:///" + os.path.join(self.tmp, f"{name}.db"),
+            "UPLOAD_FOLDER": os.path.join(self.tmp, f"{name}-uploads"),
+        })
+        with app.app_context():
+            db.create_all()
+            db.session.add(DailyQuoteCache(date=date.today(), quote=f"Quote from {name}"))
+            db.session.commit()
+        return app
+
+    def test_apps_are_isolated(self):
+        first, second = self._app("first"), self._app("second")
+        with first.app_context():
+            teacher = User(email="factory_t@example.com", role="teacher", first_name="T", last_name="Teach")
+            teacher.set_password("pass")
+            db.session.add(teacher)
+            db.session.commit()
+        with second.app_context():
+            self.assertEqual(User.query.count(), 0)
+        self.assertTrue(os.path.isdir(first.config["UPLOAD_FOLDER"]))
+
+        # Each app serves every view against its own database
+        self.assertEqual(first.url_map.bind("localhost").match("/"), ("index", {}))
+        for app, name in ((first, "first"), (second, "second")):
+            page = app.test_client().get("/login").get_data(as_text=True)
+            self.assertIn(f"Quote from {name}", page)
+        self.assertEqual(first.test_client().get("/no-such-page").status_code, 404)
+
+    def test_preload_warms_templates_without_connecting(self):
+        app = self._app("preload")
+        with app.app_context():
+            db.engine.dispose()
+            templates = preload(app)
+            self.assertEqual(db.engine.pool.checkedout(), 0)
+            self.assertEqual(db.engine.pool.checkedin(), 0)
+        self.assertIn("base.html", templates)
+        self.assertEqual(len(app.jinja_env.cache), len(templates))
+        for name in ("matplotlib.pyplot", "sklearn.feature_extraction.text", "PyPDF2", "docx"):
+            self.assertIn(name, sys.modules)
+
+
+if __name__ == '__main__':
+    unittest.main()
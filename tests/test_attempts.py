@@ -0,0 +1,87 @@
+import json
+import os
+import tempfile
+import unittest
+
+os.environ["GEMINI_API_KEY"] = "dummy"
+# Bind the app to a throwaway database before it is first imported
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.gettempdir(), f"atlverse-tests-{os.getpid()}.db")
+from main import app
+from extensions import db
+from models import User, Classroom, SelfEvaluation
+import attempts
+import question_sets
+import scoring
+
+QUESTIONS = [
+    {"question": f"Q{i}", "options": ["A) a", "B) b"], "correct_answer": "AB"[i % 2],
+     "explanation": f"A long explanation of question {i} " * 5}
+    for i in range(11)
+]
+
+
+class AttemptStorageTest(unittest.TestCase):
+    def setUp(self):
+        with app.app_context():
+            db.drop_all()
+            db.create_all()
+            student = User(email="attempts_s@example.com", role="student", first_name="S", last_name="Stu")
+            student.set_password("pass")
+            db.session.add(student)
+            db.session.commit()
+            classroom = Classroom(name="Art", description="", teacher_id=student.id)
+            db.session.add(classroom)
+            db.session.commit()
+            self.student_id = student.id
+            self.classroom_id = classroom.id
+
+    def tearDown(self):
+        with app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def _evaluation(self, quiz_type, **fields):
+        evaluation = SelfEvaluation(student_id=self.student_id, classroom_id=self.classroom_id,
+                                    quiz_type=quiz_type, answers_json="[]", **fields)
+        db.session.add(evaluation)
+        return evaluation
+
+    def test_bits_round_trip(self):
+        correct = [True, False, True] * 4
+        self.assertEqual(attempts.unpack_bits(attempts.pack_bits(correct), len(correct)).tolist(), correct)
+        self.assertEqual(len(attempts.pack_bits(correct)), 2)
+
+    def test_objective_feedback_is_rebuilt_from_the_question_set(self):
+        answers = ["A", "A", None] + ["AB"[i % 2] for i in range(3, 11)]
+        with app.app_context():
+            digest = question_sets.get_or_create(json.dumps(QUESTIONS))
+            evaluation = self._evaluation("mcq", question_set_digest=digest)
+            key = question_sets.answer_key_for(evaluation)
+            score = attempts.save_objective(evaluation, key, answers)
+            db.session.commit()
+
+            _, expected = scoring.AnswerKey(QUESTIONS).score(answers)
+            self.assertAlmostEqual(score, 900 / 11)
+            self.assertIsNone(evaluation.feedback_json)
+            self.assertEqual(attempts.feedback_for(evaluation), expected)
+            self.assertLess(len(evaluation.answers_json) + len(evaluation.correct_bitmap), len(json.dumps(expected)) / 10)
+
+    def test_essay_keeps_only_ai_feedback(self):
+        feedback = [{"question_index": 0, "score": 80, "feedback": "Good", "user_answer": "Because"}]
+        with app.app_context():
+            evaluation = self._evaluation("essay", questions_json="[]")
+            attempts.save_essay(evaluation, ["Because"], 80, feedback)
+            self.assertEqual(json.loads(evaluation.feedback_json), [{"score": 80, "feedback": "Good"}])
+            self.assertEqual(attempts.feedback_for(evaluation), feedback)
+
+    def test_attempts_stored_before_the_compact_format_still_render(self):
+        feedback = [{"question_index": 0, "is_correct": True, "correct_answer": "A", "explanation": "",
+                     "user_answer": "A"}]
+        with app.app_context():
+            evaluation = self._evaluation("mcq", questions_json="[]", feedback_json=json.dumps(feedback))
+            evaluation.answers_json = '["A"]'
+            self.assertEqual(attempts.feedback_for(evaluation), feedback)
+
+
+if __name__ == '__main__':
+    unittest.main()
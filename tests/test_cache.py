@@ -0,0 +1,160 @@
+import os
+import shutil
+import tempfile
+import unittest
+from datetime import datetime
+
+from sqlalchemy import event
+
+os.environ["GEMINI_API_KEY"] = "dummy"
+# Bind the app to a throwaway database before it is first imported
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.gettempdir(), f"atlverse-tests-{os.getpid()}.db")
+from main import app
+from extensions import db
+from models import User, Classroom, Enrollment, Assignment, AssignmentSubmission, SelfEvaluation
+from awards_utils import count_gold_awards
+import cache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class BackendTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.clock = FakeClock()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def backends(self):
+        return [
+            cache.LRUBackend(clock=self.clock),
+            cache.FileSystemBackend(os.path.join(self.directory, "fs"), clock=self.clock),
+            cache.SQLiteBackend(os.path.join(self.directory, "cache.sqlite3"), clock=self.clock),
+        ]
+
+    def test_get_set_expire_and_versions(self):
+        for backend in self.backends():
+            with self.subTest(backend=type(backend).__name__):
+                self.assertIs(backend.get("k"), cache.MISSING)
+                backend.set("k", {"scores": [1, None]}, ttl=10)
+                backend.set("none", None, ttl=10)
+                self.assertEqual(backend.get("k"), {"scores": [1, None]})
+                self.assertIsNone(backend.get("none"))
+                self.clock.now += 11
+                self.assertIs(backend.get("k"), cache.MISSING)
+
+                backend.set("k", 1)
+                backend.delete("k")
+                self.assertIs(backend.get("k"), cache.MISSING)
+
+                self.assertEqual(backend.get_version("classroom:1"), 0)
+                self.assertEqual([backend.incr_version("classroom:1") for _ in range(3)], [1, 2, 3])
+                backend.clear()
+                self.assertEqual(backend.get_version("classroom:1"), 3)
+
+    def test_lru_evicts_least_recently_used(self):
+        backend = cache.LRUBackend(max_entries=2)
+        backend.set("a", 1)
+        backend.set("b", 2)
+        backend.get("a")
+        backend.set("c", 3)
+        self.assertIs(backend.get("b"), cache.MISSING)
+        self.assertEqual((backend.get("a"), backend.get("c")), (1, 3))
+
+
+class ModelInvalidationTest(unittest.TestCase):
+    def setUp(self):
+        app.config["TESTING"] = True
+        self.previous = cache.set_backend(cache.LRUBackend())
+        with app.app_context():
+            db.drop_all()
+            db.create_all()
+            teacher = User(email="cache_t@example.com", role="teacher", first_name="T", last_name="Teach")
+            student = User(email="cache_s@example.com", role="student", first_name="S", last_name="Stu")
+            teacher.set_password("pass")
+            student.set_password("pass")
+            db.session.add_all([teacher, student])
+            db.session.commit()
+            classroom = Classroom(name="Biology", description="", teacher_id=teacher.id)
+            db.session.add(classroom)
+            db.session.commit()
+            db.session.add(Enrollment(classroom_id=classroom.id, student_id=student.id))
+            db.session.commit()
+            self.teacher_id = teacher.id
+            self.student_id = student.id
+            self.classroom_id = classroom.id
+
+    def tearDown(self):
+        cache.set_backend(self.previous)
+        with app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def _count_queries(self, fn):
+        statements = []
+
+        def record(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        event.listen(db.engine, "before_cursor_execute", record)
+        try:
+            result = fn()
+        finally:
+            event.remove(db.engine, "before_cursor_execute", record)
+        return result, len(statements)
+
+    def test_cached_result_follows_inserts_updates_and_deletes(self):
+        with app.app_context():
+            self.assertEqual(count_gold_awards(self.classroom_id), {})
+            _, queries = self._count_queries(lambda: count_gold_awards(self.classroom_id))
+            self.assertEqual(queries, 0)
+
+            evaluation = SelfEvaluation(student_id=self.student_id, classroom_id=self.classroom_id, quiz_type="mcq",
+                                        answers_json="[]", score=90.0, completed_at=datetime.utcnow())
+            db.session.add(evaluation)
+            db.session.commit()
+            self.assertEqual(count_gold_awards(self.classroom_id), {self.student_id: 1})
+
+            evaluation.score = 40.0
+            db.session.commit()
+            self.assertEqual(count_gold_awards(self.classroom_id), {})
+
+            evaluation.score = 95.0
+            # Pending changes are flushed before the lookup, as autoflush would
+            self.assertEqual(count_gold_awards(self.classroom_id), {self.student_id: 1})
+            db.session.commit()
+
+            db.session.delete(evaluation)
+            db.session.commit()
+            self.assertEqual(count_gold_awards(self.classroom_id), {})
+
+    def test_listeners_bump_on_flush_and_commit(self):
+        with app.app_context():
+            assignment = Assignment(title="Essay", description="", classroom_id=self.classroom_id,
+                                    teacher_id=self.teacher_id, published=True)
+            db.session.add(assignment)
+            db.session.commit()
+            before = cache.classroom_version(self.classroom_id)
+            db.session.add(AssignmentSubmission(assignment_id=assignment.id, student_id=self.student_id,
+                                                content="Cells"))
+            db.session.flush()
+            self.assertEqual(cache.classroom_version(self.classroom_id), before + 1)
+            db.session.commit()
+            self.assertEqual(cache.classroom_version(self.classroom_id), before + 2)
+
+            db.session.add(SelfEvaluation(student_id=self.student_id, classroom_id=self.classroom_id,
+                                          quiz_type="mcq", answers_json="[]"))
+            db.session.flush()
+            db.session.rollback()
+            self.assertEqual(cache.classroom_version(self.classroom_id), before + 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,141 @@
+import io
+import os
+import shutil
+import tempfile
+import re
+import unittest
+from datetime import date
+from unittest.mock import patch
+
+os.environ["GEMINI_API_KEY"] = "dummy"
+# Bind the app to a throwaway database before it is first imported
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.gettempdir(), f"atlverse-tests-{os.getpid()}.db")
+from main import app
+from extensions import db
+from sqlalchemy.exc import IntegrityError
+from models import User, Classroom, UploadSession, Material, StoredFile, DailyQuoteCache
+import chunked_upload
+import routes
+
+LECTURE = b"Lecture 3 introduces consensus protocols and leader election. " * 100
+
+class ChunkedUploadTest(unittest.TestCase):
+    def setUp(self):
+        app.config["TESTING"] = True
+        app.config["INGESTION_SYNC"] = True
+        self.original_part_size = app.config["UPLOAD_PART_SIZE"]
+        self.original_pool_size = app.config["QUIZ_POOL_SIZE"]
+        app.config["UPLOAD_PART_SIZE"] = 1000
+        app.config["QUIZ_POOL_SIZE"] = 0
+        self.upload_dir = tempfile.mkdtemp()
+        self.original_upload_folder = app.config["UPLOAD_FOLDER"]
+        app.config["UPLOAD_FOLDER"] = self.upload_dir
+        with app.app_context():
+            db.drop_all()
+            db.create_all()
+            teacher = User(email="chunked_t@example.com", role="teacher", first_name="T", last_name="Teach")
+            teacher.set_password("pass")
+            db.session.add(teacher)
+            db.session.commit()
+            classroom = Classroom(name="Distributed Systems", description="", teacher_id=teacher.id)
+            db.session.add(classroom)
+            # The classroom page reads the daily quote; seed it so no AI call is made
+            db.session.add(DailyQuoteCache(date=date.today(), quote="Keep learning!"))
+            db.session.commit()
+            self.teacher_id = teacher.id
+            self.classroom_id = classroom.id
+
+    def tearDown(self):
+        app.config["UPLOAD_FOLDER"] = self.original_upload_folder
+        app.config["UPLOAD_PART_SIZE"] = self.original_part_size
+        app.config["QUIZ_POOL_SIZE"] = self.original_pool_size
+        app.config.pop("INGESTION_SYNC", None)
+        shutil.rmtree(self.upload_dir)
+        with app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def test_parts_resume_and_assemble_into_stored_file(self):
+        with app.app_context():
+            session = chunked_upload.create_session(self.classroom_id, self.teacher_id,
+                                                    "lecture.txt", len(LECTURE))
+            db.session.commit()
+            parts = [LECTURE[i:i + 1000] for i in range(0, len(LECTURE), 1000)]
+            self.assertEqual(session.part_count, len(parts))
+
+            # Upload out of order, then see which parts a resuming client still needs
+            for number in range(len(parts), 1, -1):
+                chunked_upload.write_part(session, number, io.BytesIO(parts[number - 1]))
+            self.assertEqual(chunked_upload.received_parts(session), list(range(2, len(parts) + 1)))
+            with self.assertRaises(chunked_upload.UploadError):
+                chunked_upload.assemble(session)
+
+            with self.assertRaises(chunked_upload.UploadError):
+                chunked_upload.write_part(session, 1, io.BytesIO(parts[0][:-1]))
+            self.assertNotIn(1, chunked_upload.received_parts(session))
+
+            chunked_upload.write_part(session, 1, io.BytesIO(parts[0]))
+            stored_file = chunked_upload.assemble(session)
+            chunked_upload.discard(session)
+            db.session.commit()
+
+            with open(os.path.join(self.upload_dir, stored_file.file_path), "rb") as f:
+                self.assertEqual(f.read(), LECTURE)
+            self.assertEqual(stored_file.size, len(LECTURE))
+            self.assertEqual(UploadSession.query.count(), 0)
+            self.assertEqual(os.listdir(os.path.join(self.upload_dir, ".parts")), [])
+
+    def _client_with_csrf_token(self):
+        client = app.test_client()
+        with client.session_transaction() as sess:
+            sess["_user_id"] = str(self.teacher_id)
+            sess["_fresh"] = True
+        page = client.get(f"/teacher/classroom/{self.classroom_id}").get_data(as_text=True)
+        token = re.search(r'name="csrf_token" value="([^"]+)"', page).group(1)
+        return client, {"X-CSRFToken": token}
+
+    def _init_and_send_parts(self, client, headers):
+        base = f"/teacher/classroom/{self.classroom_id}/uploads"
+        response = client.post(base, json={"filename": "lecture.txt", "size": len(LECTURE)},
+                               headers=headers)
+        self.assertEqual(response.status_code, 201)
+        upload = response.get_json()
+        for number in range(1, upload["part_count"] + 1):
+            part = LECTURE[(number - 1) * 1000:number * 1000]
+            response = client.put(f"{base}/{upload['upload_id']}/parts/{number}", data=part, headers=headers)
+            self.assertEqual(response.status_code, 200)
+        return f"{base}/{upload['upload_id']}"
+
+    def test_protocol_over_http_with_csrf_header(self):
+        client, headers = self._client_with_csrf_token()
+        response = client.post(f"/teacher/classroom/{self.classroom_id}/uploads",
+                               json={"filename": "lecture.txt", "size": len(LECTURE)})
+        self.assertEqual(response.status_code, 400)
+
+        upload_url = self._init_and_send_parts(client, headers)
+        response = client.post(f"{upload_url}/complete", headers=headers)
+        self.assertEqual(response.status_code, 200)
+        with app.app_context():
+            material = db.session.get(Material, response.get_json()["material_id"])
+            self.assertEqual(material.original_filename, "lecture.txt")
+            self.assertEqual(material.stored_file.size, len(LECTURE))
+            self.assertEqual(UploadSession.query.count(), 0)
+
+    def test_failed_commit_keeps_parts_for_another_attempt(self):
+        client, headers = self._client_with_csrf_token()
+        upload_url = self._init_and_send_parts(client, headers)
+        with patch.object(routes, "create_material_from_stored_file",
+                          side_effect=IntegrityError("INSERT", {}, Exception("constraint failed"))):
+            response = client.post(f"{upload_url}/complete", headers=headers)
+        self.assertEqual(response.status_code, 500)
+        self.assertIn("error", response.get_json())
+        with app.app_context():
+            self.assertEqual(UploadSession.query.count(), 1)
+            self.assertEqual(StoredFile.query.count(), 0)
+        self.assertEqual([n for n in os.listdir(self.upload_dir) if not n.startswith(".")], [])
+
+        response = client.post(f"{upload_url}/complete", headers=headers)
+        self.assertEqual(response.status_code, 200)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,142 @@
+import os
+import tempfile
+import unittest
+from datetime import date, datetime, timedelta
+
+os.environ["GEMINI_API_KEY"] = "dummy"
+# Bind the app to a throwaway database before it is first imported
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.gettempdir(), f"atlverse-tests-{os.getpid()}.db")
+from main import app
+from extensions import db
+from models import User, Classroom, Enrollment, Material, SelfEvaluation, DailyQuoteCache
+from awards_utils import calculate_awards_for_student, count_gold_awards
+import classroom_results
+
+START = datetime(2026, 3, 1)
+
+
+class ClassroomResultsTest(unittest.TestCase):
+    def setUp(self):
+        app.config["TESTING"] = True
+        self.original_per_page = app.config["RESULTS_ATTEMPTS_PER_PAGE"]
+        with app.app_context():
+            db.drop_all()
+            db.create_all()
+            teacher = User(email="cresults_t@example.com", role="teacher", first_name="T", last_name="Teach")
+            teacher.set_password("pass")
+            students = [User(email=f"cresults_s{i}@example.com", role="student", first_name=name, last_name="Q")
+                        for i, name in enumerate(["Ann", "Ben", "Cal"])]
+            for student in students:
+                student.set_password("pass")
+            db.session.add_all([teacher] + students)
+            db.session.commit()
+            classroom = Classroom(name="Geometry", description="", teacher_id=teacher.id)
+            db.session.add(classroom)
+            db.session.commit()
+            materials = [Material(classroom_id=classroom.id, title=title, file_path=f"{title}.txt", file_type="txt")
+                         for title in ("Angles", "Circles")]
+            db.session.add_all(materials)
+            db.session.add(DailyQuoteCache(date=date.today(), quote="Keep learning!"))
+            for student in students:
+                db.session.add(Enrollment(classroom_id=classroom.id, student_id=student.id))
+            db.session.commit()
+
+            ann, ben, cal = students
+            angles, circles = materials
+            # (student, material, quiz type, score, completed, day)
+            attempts = [
+                (ann, angles, "mcq", 90.0, True, 0),     # gold on Angles
+                (ann, angles, "mcq", 50.0, True, 1),
+                (ann, circles, "essay", 85.0, True, 2),  # gold on Circles
+                (ben, angles, "mcq", 70.0, True, 3),     # not gold: the first attempt failed
+                (ben, angles, "mcq", 95.0, True, 4),
+                (ben, circles, "true_false", None, False, 5),
+                (cal, None, "mcq", 80.0, True, 6),       # gold on "All Materials"
+            ]
+            for student, material, quiz_type, score, completed, day in attempts:
+                db.session.add(SelfEvaluation(
+                    student_id=student.id, classroom_id=classroom.id, material_id=material.id if material else None,
+                    quiz_type=quiz_type, questions_json="[]", answers_json="[]", score=score,
+                    created_at=START + timedelta(days=day),
+                    completed_at=START + timedelta(days=day, hours=1) if completed else None,
+                ))
+            db.session.commit()
+            self.teacher_id = teacher.id
+            self.classroom_id = classroom.id
+            self.student_ids = [student.id for student in students]
+            self.angles_id = angles.id
+
+    def tearDown(self):
+        app.config["RESULTS_ATTEMPTS_PER_PAGE"] = self.original_per_page
+        with app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def _login(self, client):
+        with client.session_transaction() as sess:
+            sess["_user_id"] = str(self.teacher_id)
+            sess["_fresh"] = True
+
+    def test_gold_counts_match_per_student_awards(self):
+        with app.app_context():
+            counts = count_gold_awards(self.classroom_id)
+            for student_id in self.student_ids:
+                awards = calculate_awards_for_student(self.classroom_id, student_id)
+                expected = sum(1 for info in awards.values() if info["award"] == "gold")
+                self.assertEqual(counts.get(student_id, 0), expected)
+        self.assertEqual(sorted(counts.values()), [1, 2])
+
+    def test_student_summaries_are_grouped_in_sql(self):
+        with app.app_context():
+            summaries = {row.User.first_name: row for row in classroom_results.student_summaries(self.classroom_id)}
+            totals = classroom_results.totals(self.classroom_id)
+        ben = summaries["Ben"]
+        self.assertEqual((ben.total_evaluations, ben.completed_count, ben.in_progress_count), (3, 2, 1))
+        self.assertEqual(ben.materials_attempted, 2)
+        self.assertAlmostEqual(ben.avg_score, 82.5)
+        self.assertEqual((totals.evaluations, totals.completed, totals.active_students), (7, 6, 3))
+
+    def test_keyset_pages_cover_every_attempt_once_in_order(self):
+        with app.app_context():
+            for sort, key in (("newest", lambda r: (r.created_at, r.id)), ("score_low", lambda r: (r.score or -1, r.id))):
+                seen, cursor = [], None
+                while True:
+                    rows, cursor = classroom_results.attempts_page(self.classroom_id, 2, sort=sort, cursor=cursor)
+                    seen.extend(rows)
+                    if not cursor:
+                        break
+                self.assertEqual(len({row.id for row in seen}), 7)
+                self.assertEqual(seen, sorted(seen, key=key, reverse=sort == "newest"))
+
+    def test_filters(self):
+        with app.app_context():
+            rows, _ = classroom_results.attempts_page(self.classroom_id, 50, material_id=self.angles_id, quiz_type="mcq")
+            self.assertEqual(len(rows), 4)
+            rows, _ = classroom_results.attempts_page(self.classroom_id, 50, date_from=date(2026, 3, 3),
+                                                      date_to=date(2026, 3, 4))
+            self.assertEqual([row.score for row in rows], [70.0, 85.0])
+            with self.assertRaises(ValueError):
+                classroom_results.attempts_page(self.classroom_id, 50, cursor="garbage")
+
+    def test_results_page_and_attempts_fragment(self):
+        app.config["RESULTS_ATTEMPTS_PER_PAGE"] = 3
+        client = app.test_client()
+        self._login(client)
+        page = client.get(f"/teacher/classroom/{self.classroom_id}/results").get_data(as_text=True)
+        self.assertIn("Ann Q", page)
+        self.assertIn("2 Gold Awards", page)
+        self.assertIn("attemptRows", page)
+
+        fragment = client.get(f"/teacher/classroom/{self.classroom_id}/results/attempts?quiz_type=mcq")
+        html = fragment.get_data(as_text=True)
+        self.assertEqual(fragment.status_code, 200)
+        self.assertEqual(html.count("<tr>"), 3)
+        self.assertIn("data-next-url", html)
+        self.assertIn("quiz_type=mcq", html)
+
+        bad = client.get(f"/teacher/classroom/{self.classroom_id}/results/attempts?date_from=yesterday")
+        self.assertEqual(bad.status_code, 400)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,7 +1,8 @@
 import os
 import unittest
 os.environ["GEMINI_API_KEY"] = "dummy"
-from app import app, db
+from main import app
+from extensions import db
 from models import User, Classroom, CPMK, Material, Quiz, Assignment
 
 class CPMKModelTest(unittest.TestCase):
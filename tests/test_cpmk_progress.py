@@ -2,7 +2,8 @@ import os
 import unittest
 from datetime import datetime
 
-from app import app, db
+from main import app
+from extensions import db
 from models import User, Classroom, CPMK, Quiz, SelfEvaluation, Assignment, AssignmentSubmission
 from routes import calculate_cpmk_student_scores
 
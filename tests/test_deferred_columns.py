@@ -0,0 +1,112 @@
+import json
+import os
+import tempfile
+import unittest
+from datetime import date, datetime
+
+from sqlalchemy import event
+
+os.environ["GEMINI_API_KEY"] = "dummy"
+# Bind the app to a throwaway database before it is first imported
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.gettempdir(), f"atlverse-tests-{os.getpid()}.db")
+from main import app
+from extensions import db
+from models import User, Classroom, Enrollment, Material, SelfEvaluation, DailyQuoteCache, MATERIAL_READY
+
+BIG_TEXT = "lorem ipsum dolor sit amet " * 8000  # about 200 KB
+# Anything a list page loads beyond metadata would blow through this
+LIST_BUDGET = 20_000
+
+
+class BytesFetched:
+    """Count the text and binary bytes the ORM loads into instances, including deferred loads."""
+
+    def __init__(self):
+        self.total = 0
+
+    def _count(self, values):
+        self.total += sum(len(value) for value in values if isinstance(value, (str, bytes)))
+
+    def on_load(self, target, context):
+        self._count(target.__dict__.values())
+
+    def on_refresh(self, target, context, attrs):
+        self._count(target.__dict__.get(attr) for attr in attrs or target.__dict__)
+
+    def __enter__(self):
+        event.listen(db.Model, "load", self.on_load, propagate=True)
+        event.listen(db.Model, "refresh", self.on_refresh, propagate=True)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(db.Model, "load", self.on_load)
+        event.remove(db.Model, "refresh", self.on_refresh)
+
+
+class DeferredColumnsTest(unittest.TestCase):
+    def setUp(self):
+        app.config["TESTING"] = True
+        with app.app_context():
+            db.drop_all()
+            db.create_all()
+            teacher = User(email="defer_t@example.com", role="teacher", first_name="T", last_name="Teach")
+            student = User(email="defer_s@example.com", role="student", first_name="S", last_name="Stu")
+            teacher.set_password("pass")
+            student.set_password("pass")
+            db.session.add_all([teacher, student])
+            db.session.commit()
+            classroom = Classroom(name="Literature", description="", teacher_id=teacher.id)
+            db.session.add(classroom)
+            db.session.commit()
+            db.session.add(Enrollment(classroom_id=classroom.id, student_id=student.id))
+            db.session.add(DailyQuoteCache(date=date.today(), quote="Keep learning!"))
+            materials = [
+                Material(classroom_id=classroom.id, title=f"Novel {i}", file_path=f"novel{i}.txt", file_type="txt",
+                         status=MATERIAL_READY, content=BIG_TEXT, chunks_json=json.dumps([BIG_TEXT]))
+                for i in range(3)
+            ]
+            db.session.add_all(materials)
+            db.session.commit()
+            evaluation = SelfEvaluation(
+                student_id=student.id, classroom_id=classroom.id, material_id=materials[0].id, quiz_type="essay",
+                questions_json=json.dumps([{"question": BIG_TEXT}]), answers_json=json.dumps([BIG_TEXT]),
+                feedback_json=json.dumps([{"score": 50, "feedback": BIG_TEXT}]), score=50.0,
+                completed_at=datetime.utcnow(),
+            )
+            db.session.add(evaluation)
+            db.session.commit()
+            self.teacher_id = teacher.id
+            self.student_id = student.id
+            self.classroom_id = classroom.id
+            self.evaluation_id = evaluation.id
+
+    def tearDown(self):
+        with app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def _fetch(self, user_id, url):
+        client = app.test_client()
+        with client.session_transaction() as sess:
+            sess["_user_id"] = str(user_id)
+            sess["_fresh"] = True
+        with BytesFetched() as fetched:
+            response = client.get(url)
+        self.assertEqual(response.status_code, 200, url)
+        return fetched.total
+
+    def test_list_pages_do_not_load_bodies(self):
+        for user_id, url in [
+            (self.teacher_id, f"/teacher/classroom/{self.classroom_id}"),
+            (self.teacher_id, f"/teacher/classroom/{self.classroom_id}/student/{self.student_id}"),
+            (self.teacher_id, f"/teacher/classroom/{self.classroom_id}/results"),
+            (self.student_id, f"/student/classroom/{self.classroom_id}"),
+        ]:
+            self.assertLess(self._fetch(user_id, url), LIST_BUDGET, url)
+
+    def test_detail_page_still_loads_the_attempt(self):
+        self.assertGreater(self._fetch(self.student_id, f"/student/quiz_result/{self.evaluation_id}"), 3 * len(BIG_TEXT))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,130 @@
+import os
+import shutil
+import tempfile
+import unittest
+from datetime import date
+from unittest.mock import patch
+
+os.environ["GEMINI_API_KEY"] = "dummy"
+# Bind the app to a throwaway database before it is first imported
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.gettempdir(), f"atlverse-tests-{os.getpid()}.db")
+from main import app
+from extensions import db
+from models import User, Classroom, Enrollment, Material, DailyQuoteCache
+import file_serving
+
+DIGEST = "3b" * 32
+BODY = b"0123456789" * 100
+
+
+class FileServingTest(unittest.TestCase):
+    def setUp(self):
+        app.config["TESTING"] = True
+        app.config["WTF_CSRF_ENABLED"] = False
+        self.original_upload_folder = app.config["UPLOAD_FOLDER"]
+        self.original_send_mode = app.config["UPLOAD_SEND_MODE"]
+        self.original_ttl = app.config["UPLOAD_AUTH_CACHE_TTL"]
+        self.upload_dir = tempfile.mkdtemp()
+        app.config["UPLOAD_FOLDER"] = self.upload_dir
+        self.filename = f"{DIGEST}.txt"
+        with open(os.path.join(self.upload_dir, self.filename), "wb") as f:
+            f.write(BODY)
+        file_serving.clear_auth_cache()
+        with app.app_context():
+            db.drop_all()
+            db.create_all()
+            teacher = User(email="serve_t@example.com", role="teacher", first_name="T", last_name="Teach")
+            student = User(email="serve_s@example.com", role="student", first_name="S", last_name="Stu")
+            outsider = User(email="serve_o@example.com", role="student", first_name="O", last_name="Out")
+            for user in (teacher, student, outsider):
+                user.set_password("pass")
+            db.session.add_all([teacher, student, outsider])
+            db.session.commit()
+            classroom = Classroom(name="Physics", description="", teacher_id=teacher.id)
+            db.session.add(classroom)
+            db.session.commit()
+            enrollment = Enrollment(classroom_id=classroom.id, student_id=student.id)
+            db.session.add(enrollment)
+            # Redirect targets render pages that read the daily quote
+            db.session.add(DailyQuoteCache(date=date.today(), quote="Keep learning!"))
+            db.session.add(Material(classroom_id=classroom.id, title="Notes", file_path=self.filename,
+                                    file_type="txt", original_filename="notes.txt", status="notified"))
+            db.session.commit()
+            self.student_id = student.id
+            self.outsider_id = outsider.id
+            self.enrollment_id = enrollment.id
+        self.client = app.test_client()
+
+    def tearDown(self):
+        app.config["UPLOAD_FOLDER"] = self.original_upload_folder
+        app.config["UPLOAD_SEND_MODE"] = self.original_send_mode
+        app.config["UPLOAD_AUTH_CACHE_TTL"] = self.original_ttl
+        app.config["WTF_CSRF_ENABLED"] = True
+        file_serving.clear_auth_cache()
+        shutil.rmtree(self.upload_dir)
+        with app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def _login(self, user_id):
+        with self.client.session_transaction() as sess:
+            sess["_user_id"] = str(user_id)
+            sess["_fresh"] = True
+
+    def test_accel_modes_return_headers_and_empty_body(self):
+        self._login(self.student_id)
+        app.config["UPLOAD_SEND_MODE"] = "x-accel"
+        response = self.client.get(f"/uploads/{self.filename}")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers["X-Accel-Redirect"], f"/protected-uploads/{self.filename}")
+        self.assertEqual(response.data, b"")
+
+        app.config["UPLOAD_SEND_MODE"] = "x-sendfile"
+        response = self.client.get(f"/uploads/{self.filename}")
+        self.assertEqual(response.headers["X-Sendfile"], os.path.join(os.path.abspath(self.upload_dir), self.filename))
+        self.assertEqual(response.data, b"")
+        self.assertIn("private", response.headers["Cache-Control"])
+
+    def test_range_request_returns_partial_content(self):
+        self._login(self.student_id)
+        response = self.client.get(f"/uploads/{self.filename}", headers={"Range": "bytes=10-19"})
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response.data, BODY[10:20])
+        self.assertEqual(response.headers["Content-Range"], f"bytes 10-19/{len(BODY)}")
+        response.close()
+
+    def test_digest_etag_revalidates_with_304(self):
+        self._login(self.student_id)
+        response = self.client.get(f"/uploads/{self.filename}")
+        self.assertEqual(response.headers["ETag"], f'"{DIGEST}"')
+        self.assertIn('filename=notes.txt', response.headers["Content-Disposition"])
+        response.close()
+
+        response = self.client.get(f"/uploads/{self.filename}", headers={"If-None-Match": f'"{DIGEST}"'})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.data, b"")
+
+    def test_student_outside_classroom_is_redirected(self):
+        self._login(self.outsider_id)
+        response = self.client.get(f"/uploads/{self.filename}")
+        self.assertEqual(response.status_code, 302)
+        self.assertNotIn("X-Accel-Redirect", response.headers)
+
+    def test_cached_decision_expires_after_ttl(self):
+        app.config["UPLOAD_AUTH_CACHE_TTL"] = 30
+        with app.app_context():
+            student = db.session.get(User, self.student_id)
+            with patch("file_serving.time.monotonic", return_value=1000.0):
+                self.assertEqual(file_serving.authorize(student, self.filename), (True, "notes.txt"))
+
+            db.session.delete(db.session.get(Enrollment, self.enrollment_id))
+            db.session.commit()
+
+            with patch("file_serving.time.monotonic", return_value=1029.0):
+                self.assertTrue(file_serving.authorize(student, self.filename)[0])
+            with patch("file_serving.time.monotonic", return_value=1031.0):
+                self.assertEqual(file_serving.authorize(student, self.filename), (False, None))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+import itertools
+import os
+import tempfile
+import unittest
+from datetime import date
+
+from flask import render_template_string
+from flask_login import login_user
+from flask_wtf.csrf import generate_csrf
+
+os.environ["GEMINI_API_KEY"] = "dummy"
+# Bind the app to a throwaway database before it is first imported
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.gettempdir(), f"atlverse-tests-{os.getpid()}.db")
+from main import app
+from extensions import db
+from models import User, Classroom, Material, DailyQuoteCache
+import cache
+
+TEMPLATE = '{% cache "counter", classroom_id %}{{ counter() }} <input name="csrf_token" value="{{ csrf_token() }}">{% endcache %}'
+
+
+class FragmentCacheTest(unittest.TestCase):
+    def setUp(self):
+        app.config["TESTING"] = True
+        self.previous = cache.set_backend(cache.LRUBackend())
+        with app.app_context():
+            db.drop_all()
+            db.create_all()
+            teacher = User(email="frag_t@example.com", role="teacher", first_name="T", last_name="Teach")
+            student = User(email="frag_s@example.com", role="student", first_name="S", last_name="Stu")
+            teacher.set_password("pass")
+            student.set_password("pass")
+            db.session.add_all([teacher, student])
+            db.session.add(DailyQuoteCache(date=date.today(), quote="Keep learning!"))
+            db.session.commit()
+            classroom = Classroom(name="Chemistry", description="", teacher_id=teacher.id)
+            db.session.add(classroom)
+            db.session.commit()
+            self.teacher_id = teacher.id
+            self.student_id = student.id
+            self.classroom_id = classroom.id
+
+    def tearDown(self):
+        cache.set_backend(self.previous)
+        with app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def _render(self, user_id, counter):
+        with app.test_request_context():
+            login_user(db.session.get(User, user_id))
+            html = render_template_string(TEMPLATE, classroom_id=self.classroom_id, counter=lambda: next(counter))
+            return html, generate_csrf()
+
+    def test_fragment_is_reused_until_the_classroom_changes(self):
+        counter = itertools.count()
+        first, _ = self._render(self.teacher_id, counter)
+        second, token = self._render(self.teacher_id, counter)
+        self.assertTrue(first.startswith("0 "))
+        self.assertTrue(second.startswith("0 "))
+        # Each request gets its own CSRF token, even from a cached fragment
+        self.assertIn(f'value="{token}"', second)
+        self.assertNotEqual(first, second)
+
+        # Roles are cached separately
+        self.assertTrue(self._render(self.student_id, counter)[0].startswith("1 "))
+
+        with app.app_context():
+            db.session.add(Material(classroom_id=self.classroom_id, title="Acids", file_path="acids.txt",
+                                    file_type="txt"))
+            db.session.commit()
+        self.assertTrue(self._render(self.teacher_id, counter)[0].startswith("2 "))
+
+    def test_classroom_page_shows_changes(self):
+        client = app.test_client()
+        with client.session_transaction() as sess:
+            sess["_user_id"] = str(self.teacher_id)
+            sess["_fresh"] = True
+        with app.app_context():
+            material = Material(classroom_id=self.classroom_id, title="Bases", file_path="bases.txt", file_type="txt")
+            db.session.add(material)
+            db.session.commit()
+            material_id = material.id
+        url = f"/teacher/classroom/{self.classroom_id}"
+        self.assertIn("Bases", client.get(url).get_data(as_text=True))
+        with app.app_context():
+            db.session.get(Material, material_id).title = "Salts"
+            db.session.commit()
+        page = client.get(url).get_data(as_text=True)
+        self.assertIn("Salts", page)
+        self.assertNotIn("Bases", page)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -3,7 +3,8 @@ import json
 import unittest
 
 os.environ["GEMINI_API_KEY"] = "dummy"
-from app import app, db
+from main import app
+from extensions import db
 from models import User, Classroom, Enrollment, Assignment, AssignmentSubmission
 
 class GroupAssignmentTest(unittest.TestCase):
@@ -0,0 +1,150 @@
+import os
+import tempfile
+import unittest
+from datetime import date
+
+from sqlalchemy import event
+
+os.environ["GEMINI_API_KEY"] = "dummy"
+# Bind the app to a throwaway database before it is first imported
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.gettempdir(), f"atlverse-tests-{os.getpid()}.db")
+from main import app
+from extensions import db
+from models import User, Classroom, Enrollment, DailyQuoteCache
+import cache
+import identity
+import invalidation
+
+
+class Statements:
+    """Record the SQL sent to the database."""
+
+    def __init__(self):
+        self.sql = []
+
+    def record(self, conn, cursor, statement, parameters, context, executemany):
+        self.sql.append((statement, parameters))
+
+    def touching(self, table, *parameters):
+        """Statements reading ``table``, optionally only those bound to all of ``parameters``."""
+        return [sql for sql, bound in self.sql
+                if f"FROM {table}" in sql and all(parameter in bound for parameter in parameters)]
+
+    def __enter__(self):
+        with app.app_context():
+            self.engine = db.engine
+        event.listen(self.engine, "before_cursor_execute", self.record)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(self.engine, "before_cursor_execute", self.record)
+
+
+class IdentityTest(unittest.TestCase):
+    def setUp(self):
+        app.config["TESTING"] = True
+        self.previous = cache.set_backend(cache.LRUBackend())
+        with app.app_context():
+            db.drop_all()
+            db.create_all()
+            teacher = User(email="id_t@example.com", role="teacher", first_name="T", last_name="Teach")
+            other = User(email="id_o@example.com", role="teacher", first_name="O", last_name="Other")
+            student = User(email="id_s@example.com", role="student", first_name="S", last_name="Stu")
+            for user in (teacher, other, student):
+                user.set_password("pass")
+            db.session.add_all([teacher, other, student])
+            db.session.add(DailyQuoteCache(date=date.today(), quote="Keep learning!"))
+            db.session.commit()
+            classroom = Classroom(name="Physics", description="", teacher_id=teacher.id)
+            db.session.add(classroom)
+            db.session.commit()
+            db.session.add(Enrollment(classroom_id=classroom.id, student_id=student.id))
+            db.session.commit()
+            self.teacher_id = teacher.id
+            self.other_id = other.id
+            self.student_id = student.id
+            self.classroom_id = classroom.id
+
+    def tearDown(self):
+        cache.set_backend(self.previous)
+        with app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def _client(self, user_id):
+        client = app.test_client()
+        with client.session_transaction() as sess:
+            sess["_user_id"] = str(user_id)
+            sess["_fresh"] = True
+        return client
+
+    def test_repeat_requests_skip_user_and_enrollment_queries(self):
+        client = self._client(self.student_id)
+        url = f"/student/classroom/{self.classroom_id}"
+        self.assertEqual(client.get(url).status_code, 200)
+        with Statements() as statements:
+            self.assertEqual(client.get(url).status_code, 200)
+        # The classroom's teacher is still loaded for the page, but not the student
+        self.assertEqual(statements.touching("user", self.student_id), [])
+        self.assertEqual(statements.touching("enrollment"), [])
+
+    def test_cached_user_is_attached_to_the_session(self):
+        with app.test_request_context():
+            identity.load_user(self.student_id)
+        with app.test_request_context():
+            user = identity.load_user(str(self.student_id))
+            self.assertIn(user, db.session)
+            self.assertEqual(user.full_name, "S Stu")
+            # The password hash is not cached; it loads when it is read
+            self.assertTrue(user.check_password("pass"))
+            self.assertIsNone(identity.load_user(9999))
+
+    def test_profile_change_is_picked_up(self):
+        with app.test_request_context():
+            identity.load_user(self.student_id)
+        with app.app_context():
+            db.session.get(User, self.student_id).first_name = "Sam"
+            db.session.commit()
+        with app.test_request_context():
+            self.assertEqual(identity.load_user(self.student_id).first_name, "Sam")
+
+    def test_removed_enrollment_revokes_access(self):
+        client = self._client(self.student_id)
+        url = f"/student/classroom/{self.classroom_id}"
+        self.assertEqual(client.get(url).status_code, 200)
+        with app.app_context():
+            db.session.delete(Enrollment.query.filter_by(student_id=self.student_id).one())
+            db.session.commit()
+        self.assertEqual(client.get(url).status_code, 404)
+
+    def test_only_the_owner_opens_a_classroom(self):
+        url = f"/teacher/classroom/{self.classroom_id}"
+        self.assertEqual(self._client(self.teacher_id).get(url).status_code, 200)
+        other = self._client(self.other_id)
+        self.assertEqual(other.get(url).status_code, 404)
+        with Statements() as statements:
+            self.assertEqual(other.get(url).status_code, 404)
+        self.assertEqual(statements.touching("classroom"), [])
+
+        # A new classroom is visible to its teacher straight away
+        with app.app_context():
+            classroom = Classroom(name="Optics", description="", teacher_id=self.other_id)
+            db.session.add(classroom)
+            db.session.commit()
+            new_id = classroom.id
+        self.assertEqual(self._client(self.other_id).get(f"/teacher/classroom/{new_id}").status_code, 200)
+
+    def test_change_in_another_worker_drops_local_identities(self):
+        with app.test_request_context():
+            identity.load_user(self.student_id)
+            with Statements() as statements:
+                identity.load_user(self.student_id)
+            self.assertEqual(statements.touching("user"), [])
+            identity._apply_remote_change(invalidation.Event("User", None, 1))
+            with Statements() as statements:
+                identity.load_user(self.student_id)
+            self.assertNotEqual(statements.touching("user"), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,117 @@
+import os
+import shutil
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+os.environ["GEMINI_API_KEY"] = "dummy"
+from main import app
+from extensions import db
+from models import User, Classroom, Enrollment, Material, Notification
+import ingestion
+
+class IngestionPipelineTest(unittest.TestCase):
+    def setUp(self):
+        os.environ["DATABASE_URL"] = "sqlite:///:memory:"
+        app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///:memory:"
+        app.config["TESTING"] = True
+        app.config["INGESTION_SYNC"] = True
+        self.original_pool_size = app.config["QUIZ_POOL_SIZE"]
+        app.config["QUIZ_POOL_SIZE"] = 0
+        self.upload_dir = tempfile.mkdtemp()
+        self.original_upload_folder = app.config["UPLOAD_FOLDER"]
+        app.config["UPLOAD_FOLDER"] = self.upload_dir
+        with open(os.path.join(self.upload_dir, "notes.txt"), "w") as f:
+            f.write("Photosynthesis converts light into chemical energy. " * 20)
+        with app.app_context():
+            db.drop_all()
+            db.create_all()
+            teacher = User(email="ingest_t@example.com", role="teacher", first_name="T", last_name="Teach")
+            teacher.set_password("pass")
+            student = User(email="ingest_s@example.com", role="student", first_name="S", last_name="Stu")
+            student.set_password("pass")
+            db.session.add_all([teacher, student])
+            db.session.commit()
+            classroom = Classroom(name="Class", description="", teacher_id=teacher.id)
+            db.session.add(classroom)
+            db.session.commit()
+            db.session.add(Enrollment(classroom_id=classroom.id, student_id=student.id))
+            material = Material(classroom_id=classroom.id, title="Notes", file_path="notes.txt", file_type="txt")
+            db.session.add(material)
+            db.session.commit()
+            self.student_id = student.id
+            self.material_id = material.id
+
+    def tearDown(self):
+        app.config["UPLOAD_FOLDER"] = self.original_upload_folder
+        app.config.pop("INGESTION_SYNC", None)
+        app.config["QUIZ_POOL_SIZE"] = self.original_pool_size
+        shutil.rmtree(self.upload_dir)
+        with app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def test_pipeline_runs_all_stages(self):
+        with app.app_context():
+            ingestion.submit(self.material_id, "/student/classroom/1")
+            material = db.session.get(Material, self.material_id)
+            self.assertEqual(material.status, ingestion.READY_STATUS)
+            self.assertIn("Photosynthesis", material.content)
+            self.assertTrue(material.chunks_json)
+            self.assertEqual(Notification.query.filter_by(user_id=self.student_id).count(), 1)
+            self.assertEqual(ingestion.progress_percent(material), 100)
+
+    def test_failed_stage_is_retried_without_reupload(self):
+        with app.app_context():
+            with patch.dict(ingestion._STAGE_HANDLERS, {"chunked": lambda m, link: 1 / 0}):
+                ingestion.submit(self.material_id, "/student/classroom/1")
+            material = db.session.get(Material, self.material_id)
+            self.assertEqual(material.status, ingestion.FAILED_STATUS)
+            self.assertEqual(material.failed_stage, "chunked")
+            self.assertEqual(ingestion.pending_stages(material), ["chunked", "indexed", "notified"])
+
+            ingestion.submit(self.material_id, "/student/classroom/1")
+            db.session.expire_all()
+            material = db.session.get(Material, self.material_id)
+            self.assertEqual(material.status, ingestion.READY_STATUS)
+            self.assertIsNone(material.failed_stage)
+
+    def test_retry_resets_failed_status_before_resubmitting(self):
+        with app.app_context():
+            with patch.dict(ingestion._STAGE_HANDLERS, {"chunked": lambda m, link: 1 / 0}):
+                ingestion.submit(self.material_id, "/student/classroom/1")
+            material = db.session.get(Material, self.material_id)
+            self.assertTrue(ingestion.can_retry(material))
+
+            ingestion.prepare_retry(material)
+            self.assertEqual(material.status, "extracted")
+            self.assertIsNone(material.failed_stage)
+            # A second click sees a pending, recently updated material
+            self.assertFalse(ingestion.can_retry(material))
+            self.assertEqual(ingestion.pending_stages(material), ["chunked", "indexed", "notified"])
+
+    def test_stalled_material_can_be_retried(self):
+        with app.app_context():
+            material = db.session.get(Material, self.material_id)
+            material.status = "extracted"
+            material.status_updated_at = datetime.utcnow()
+            db.session.commit()
+            self.assertFalse(ingestion.is_stale(material))
+
+            material.status_updated_at = datetime.utcnow() - timedelta(hours=1)
+            db.session.commit()
+            self.assertTrue(ingestion.is_stale(material))
+            self.assertTrue(ingestion.can_retry(material))
+
+            ingestion.prepare_retry(material)
+            db.session.commit()
+            self.assertFalse(ingestion.is_stale(material))
+            ingestion.submit(self.material_id, "/student/classroom/1")
+            db.session.expire_all()
+            material = db.session.get(Material, self.material_id)
+            self.assertEqual(material.status, ingestion.READY_STATUS)
+            self.assertEqual(Notification.query.filter_by(user_id=self.student_id).count(), 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,166 @@
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+import unittest
+from datetime import datetime
+
+os.environ["GEMINI_API_KEY"] = "dummy"
+# Bind the app to a throwaway database before it is first imported
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.gettempdir(), f"atlverse-tests-{os.getpid()}.db")
+from main import app
+from extensions import db
+from models import User, Classroom, Enrollment, SelfEvaluation
+import invalidation
+
+sys.path.insert(0, os.path.dirname(__file__))
+import invalidation_worker
+
+INTERVAL = 0.2
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class SQLiteBusTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "bus.sqlite3")
+        self.clock = FakeClock()
+        self.received = []
+        self.handler = invalidation.subscribe(self.received.append)
+
+    def tearDown(self):
+        invalidation._subscribers.remove(self.handler)
+        shutil.rmtree(self.directory)
+
+    def test_events_reach_other_workers_within_the_interval(self):
+        publisher = invalidation.SQLiteBus(self.path, interval=1.0)
+        reader = invalidation.SQLiteBus(self.path, interval=1.0, clock=self.clock)
+        publisher.publish("Quiz", 7, 3)
+        reader.publish("Material", 8, 1)
+
+        self.clock.now += 0.5
+        self.assertTrue(reader.sync_if_due())
+        self.assertEqual(self.received, [])
+
+        self.clock.now += 0.5
+        self.assertTrue(reader.sync_if_due())
+        # A worker's own events are already applied locally
+        self.assertEqual(self.received, [invalidation.Event("Quiz", 7, 3)])
+
+    def test_missed_events_reset_the_reader(self):
+        publisher = invalidation.SQLiteBus(self.path)
+        reader = invalidation.SQLiteBus(self.path)
+        publisher.publish("Quiz", 1, 1)
+        publisher.publish("Quiz", 1, 2)
+        reader._connect().execute("DELETE FROM event WHERE seq = (SELECT MIN(seq) FROM event)")
+        self.assertEqual(reader.sync(), [invalidation.RESET])
+        publisher.publish("Quiz", 1, 3)
+        self.assertEqual(reader.sync(), [invalidation.Event("Quiz", 1, 3)])
+
+    def test_unreachable_bus_bypasses_local_caches(self):
+        reader = invalidation.SQLiteBus(self.path, clock=self.clock)
+        reader._connect().execute("DROP TABLE event")
+        self.clock.now += 2
+        self.assertFalse(reader.sync_if_due())
+
+
+class MultiWorkerTest(unittest.TestCase):
+    """Run several app processes with process-local caches against one database."""
+
+    WORKERS = 3
+
+    def setUp(self):
+        app.config["TESTING"] = True
+        self.directory = tempfile.mkdtemp()
+        with app.app_context():
+            db.drop_all()
+            db.create_all()
+            teacher = User(email="bus_t@example.com", role="teacher", first_name="T", last_name="Teach")
+            student = User(email="bus_s@example.com", role="student", first_name="S", last_name="Stu")
+            teacher.set_password("pass")
+            student.set_password("pass")
+            db.session.add_all([teacher, student])
+            db.session.commit()
+            classroom = Classroom(name="Physics", description="", teacher_id=teacher.id)
+            db.session.add(classroom)
+            db.session.commit()
+            db.session.add(Enrollment(classroom_id=classroom.id, student_id=student.id))
+            evaluation = SelfEvaluation(student_id=student.id, classroom_id=classroom.id, quiz_type="mcq",
+                                        answers_json="[]", score=90.0, completed_at=datetime.utcnow())
+            db.session.add(evaluation)
+            db.session.commit()
+            self.student_id = student.id
+            self.classroom_id = classroom.id
+            self.evaluation_id = evaluation.id
+        self.workers = self._start_workers()
+
+    def tearDown(self):
+        for process, conn in self.workers:
+            conn.send(("stop", ()))
+            process.join(10)
+        shutil.rmtree(self.directory)
+        with app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def _start_workers(self):
+        with app.app_context():
+            database_url = db.engine.url.render_as_string(hide_password=False)
+        settings = {
+            # Some older tests point DATABASE_URL elsewhere after the app is created
+            "DATABASE_URL": database_url,
+            "CACHE_BACKEND": "lru",
+            "CACHE_BUS_PATH": os.path.join(self.directory, "bus.sqlite3"),
+            "CACHE_BUS_INTERVAL": str(INTERVAL),
+        }
+        previous = {name: os.environ.get(name) for name in settings}
+        os.environ.update(settings)
+        context = multiprocessing.get_context("spawn")
+        workers = []
+        try:
+            for _ in range(self.WORKERS):
+                parent, child = context.Pipe()
+                process = context.Process(target=invalidation_worker.serve, args=(child,), daemon=True)
+                process.start()
+                workers.append((process, parent))
+        finally:
+            for name, value in previous.items():
+                if value is None:
+                    os.environ.pop(name)
+                else:
+                    os.environ[name] = value
+        for _, conn in workers:
+            self.assertTrue(conn.poll(60), "worker did not start")
+            self.assertEqual(conn.recv(), "ready")
+        return workers
+
+    def _call(self, worker, command, *args):
+        conn = self.workers[worker][1]
+        conn.send((command, args))
+        self.assertTrue(conn.poll(30))
+        return conn.recv()
+
+    def test_change_in_one_worker_reaches_the_others_within_the_interval(self):
+        for worker in range(self.WORKERS):
+            self.assertEqual(self._call(worker, "gold", self.classroom_id), ({self.student_id: 1}, 1))
+            # Served from the worker's own cache
+            self.assertEqual(self._call(worker, "gold", self.classroom_id), ({self.student_id: 1}, 0))
+
+        self._call(0, "score", self.evaluation_id, 40.0)
+        self.assertEqual(self._call(0, "gold", self.classroom_id)[0], {})
+        time.sleep(INTERVAL)
+        for worker in range(1, self.WORKERS):
+            self.assertEqual(self._call(worker, "gold", self.classroom_id), ({}, 1))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,125 @@
+import json
+import os
+import tempfile
+import unittest
+from datetime import date, datetime, timedelta
+
+import numpy as np
+
+os.environ["GEMINI_API_KEY"] = "dummy"
+# Bind the app to a throwaway database before it is first imported
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.gettempdir(), f"atlverse-tests-{os.getpid()}.db")
+from main import app
+from extensions import db
+from models import User, Classroom, Quiz, SelfEvaluation, DailyQuoteCache
+import item_analysis
+
+QUESTIONS = [
+    {"question": f"Q{i}", "options": ["A) a", "B) b", "C) c"], "correct_answer": "A"}
+    for i in range(3)
+]
+ANSWERS = [
+    ["A", "A", "A"],
+    ["A", "A", "B"],
+    ["A", "B", "C"],
+    ["B", "C", None],
+]
+
+
+class ItemAnalysisTest(unittest.TestCase):
+    def setUp(self):
+        app.config["TESTING"] = True
+        item_analysis.clear_cache()
+        self.start = datetime(2026, 1, 1)
+        with app.app_context():
+            db.drop_all()
+            db.create_all()
+            teacher = User(email="items_t@example.com", role="teacher", first_name="T", last_name="Teach")
+            teacher.set_password("pass")
+            students = [User(email=f"items_s{i}@example.com", role="student", first_name="S", last_name=str(i))
+                        for i in range(len(ANSWERS))]
+            for student in students:
+                student.set_password("pass")
+            db.session.add_all([teacher] + students)
+            db.session.commit()
+            classroom = Classroom(name="Music", description="", teacher_id=teacher.id)
+            db.session.add(classroom)
+            db.session.commit()
+            quiz = Quiz(title="Scales", teacher_id=teacher.id, classroom_id=classroom.id, quiz_type="mcq",
+                        questions_json=json.dumps(QUESTIONS), published=True)
+            db.session.add(quiz)
+            db.session.add(DailyQuoteCache(date=date.today(), quote="Keep learning!"))
+            db.session.commit()
+            self.teacher_id = teacher.id
+            self.classroom_id = classroom.id
+            self.quiz_id = quiz.id
+            self.student_ids = [student.id for student in students]
+            for i, (student_id, answers) in enumerate(zip(self.student_ids, ANSWERS)):
+                self._complete(student_id, answers, self.start + timedelta(hours=i))
+
+    def tearDown(self):
+        item_analysis.clear_cache()
+        with app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def _complete(self, student_id, answers, completed_at):
+        db.session.add(SelfEvaluation(
+            student_id=student_id, classroom_id=self.classroom_id, quiz_id=self.quiz_id, quiz_type="mcq",
+            is_ai_generated=False, answers_json=json.dumps(answers), completed_at=completed_at,
+        ))
+        db.session.commit()
+
+    def test_statistics_match_their_definitions(self):
+        with app.app_context():
+            report = item_analysis.analyze(db.session.get(Quiz, self.quiz_id))
+        correct = np.array([[answer == "A" for answer in row] for row in ANSWERS], dtype=float)
+        totals = correct.sum(axis=1)
+        self.assertEqual(report["students"], 4)
+        self.assertEqual([item["p_value"] for item in report["items"]], correct.mean(axis=0).tolist())
+        for q, item in enumerate(report["items"]):
+            expected = np.corrcoef(correct[:, q], totals - correct[:, q])[0, 1]
+            self.assertAlmostEqual(item["discrimination"], expected)
+        p = correct.mean(axis=0)
+        self.assertAlmostEqual(report["reliability"], 3 / 2 * (1 - (p * (1 - p)).sum() / totals.var()))
+
+        third = report["items"][2]
+        self.assertEqual(third["correct_choice"], "A")
+        self.assertEqual(third["choices"], {"A": 0.25, "B": 0.25, "C": 0.25})
+        self.assertEqual(third["no_choice"], 0.25)
+
+    def test_refresh_reads_new_attempts_and_keeps_each_students_latest(self):
+        with app.app_context():
+            quiz = db.session.get(Quiz, self.quiz_id)
+            item_analysis.analyze(quiz)
+            self._complete(self.student_ids[3], ["A", "A", "A"], self.start + timedelta(days=1))
+            report = item_analysis.analyze(quiz)
+        self.assertEqual(report["students"], 4)
+        self.assertEqual(report["items"][0]["p_value"], 1.0)
+        # Every student now answers the first question correctly, so it cannot discriminate
+        self.assertIsNone(report["items"][0]["discrimination"])
+
+    def test_changing_the_key_rebuilds_the_matrix(self):
+        with app.app_context():
+            quiz = db.session.get(Quiz, self.quiz_id)
+            item_analysis.analyze(quiz)
+            questions = json.loads(quiz.questions_json)
+            questions[1]["correct_answer"] = "B"
+            quiz.questions_json = json.dumps(questions)
+            db.session.commit()
+            report = item_analysis.analyze(quiz)
+        self.assertEqual(report["items"][1]["p_value"], 0.25)
+        self.assertEqual(report["items"][1]["correct_choice"], "B")
+
+    def test_item_analysis_page(self):
+        client = app.test_client()
+        with client.session_transaction() as sess:
+            sess["_user_id"] = str(self.teacher_id)
+            sess["_fresh"] = True
+        page = client.get(f"/teacher/quiz/{self.quiz_id}/items").get_data(as_text=True)
+        self.assertIn("Item Analysis", page)
+        self.assertIn("75%", page)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,104 @@
+import json
+import os
+import tempfile
+import unittest
+from datetime import date
+
+from sqlalchemy import event
+
+os.environ["GEMINI_API_KEY"] = "dummy"
+# Bind the app to a throwaway database before it is first imported
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.gettempdir(), f"atlverse-tests-{os.getpid()}.db")
+from main import app
+from extensions import db
+from models import User, Classroom, Enrollment, Quiz, QuestionSet, SelfEvaluation, DailyQuoteCache
+import question_sets
+
+QUESTIONS = [
+    {"question": "Q1", "options": ["A) a", "B) b"], "correct_answer": "A", "explanation": ""},
+    {"question": "Q2", "options": ["A) a", "B) b"], "correct_answer": "B", "explanation": ""},
+]
+
+
+class QuestionSetTest(unittest.TestCase):
+    def setUp(self):
+        app.config["TESTING"] = True
+        app.config["WTF_CSRF_ENABLED"] = False
+        with app.app_context():
+            db.drop_all()
+            db.create_all()
+            teacher = User(email="qset_t@example.com", role="teacher", first_name="T", last_name="Teach")
+            teacher.set_password("pass")
+            students = [User(email=f"qset_s{i}@example.com", role="student", first_name="S", last_name=str(i))
+                        for i in range(2)]
+            for student in students:
+                student.set_password("pass")
+            db.session.add_all([teacher] + students)
+            db.session.commit()
+            classroom = Classroom(name="Biology", description="", teacher_id=teacher.id)
+            db.session.add(classroom)
+            db.session.commit()
+            for student in students:
+                db.session.add(Enrollment(classroom_id=classroom.id, student_id=student.id))
+            db.session.add(DailyQuoteCache(date=date.today(), quote="Keep learning!"))
+            quiz = Quiz(title="Cells", teacher_id=teacher.id, classroom_id=classroom.id, quiz_type="mcq",
+                        questions_json=json.dumps(QUESTIONS), published=True)
+            db.session.add(quiz)
+            db.session.commit()
+            self.student_ids = [student.id for student in students]
+            self.classroom_id = classroom.id
+            self.quiz_id = quiz.id
+
+    def tearDown(self):
+        app.config["WTF_CSRF_ENABLED"] = True
+        with app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def _take(self, student_id):
+        client = app.test_client()
+        with client.session_transaction() as sess:
+            sess["_user_id"] = str(student_id)
+            sess["_fresh"] = True
+        response = client.get(f"/student/classroom/{self.classroom_id}/quiz/{self.quiz_id}")
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("Q2", response.get_data(as_text=True))
+        return client
+
+    def test_attempts_share_one_stored_copy(self):
+        for student_id in self.student_ids:
+            self._take(student_id)
+        with app.app_context():
+            self.assertEqual(QuestionSet.query.count(), 1)
+            digests = db.session.query(SelfEvaluation.question_set_digest, SelfEvaluation.questions_json).all()
+            self.assertEqual(len(digests), 2)
+            self.assertEqual({digest for digest, _ in digests}, {question_sets.content_hash(json.dumps(QUESTIONS))})
+            self.assertEqual({inline for _, inline in digests}, {None})
+
+    def test_submission_scores_against_the_shared_set(self):
+        client = self._take(self.student_ids[0])
+        with app.app_context():
+            evaluation_id = SelfEvaluation.query.one().id
+        client.post(f"/student/submit_teacher_quiz/{evaluation_id}", data={"answer_0": "A", "answer_1": "A"})
+        with app.app_context():
+            self.assertEqual(db.session.get(SelfEvaluation, evaluation_id).score, 50.0)
+
+    def test_attempt_listing_does_not_load_question_text(self):
+        self._take(self.student_ids[0])
+        statements = []
+
+        def record(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        with app.app_context():
+            event.listen(db.engine, "before_cursor_execute", record)
+            try:
+                SelfEvaluation.query.filter_by(quiz_id=self.quiz_id).all()
+            finally:
+                event.remove(db.engine, "before_cursor_execute", record)
+        self.assertEqual(len(statements), 1)
+        self.assertNotIn("questions_json", statements[0])
+
+
+if __name__ == '__main__':
+    unittest.main()
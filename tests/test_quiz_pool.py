@@ -0,0 +1,107 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch, Mock
+
+os.environ["GEMINI_API_KEY"] = "dummy"
+# Bind the app to a throwaway database before it is first imported
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.gettempdir(), f"atlverse-tests-{os.getpid()}.db")
+from datetime import date
+from main import app
+from extensions import db
+from models import User, Classroom, Enrollment, Material, GeneratedContent, SelfEvaluation, DailyQuoteCache
+from ai_backends import FakeBackend
+from ai_service import AIService
+import ai_service
+import ingestion
+import quiz_pool
+import rate_limiter
+import routes
+
+
+class QuizPoolTest(unittest.TestCase):
+    def setUp(self):
+        app.config["TESTING"] = True
+        app.config["INGESTION_SYNC"] = True
+        app.config["QUIZ_POOL_SYNC"] = True
+        self.tmp = tempfile.mkdtemp()
+        rate_limiter._limiter = rate_limiter.RateLimiter(os.path.join(self.tmp, "limits.sqlite3"), burst=1000)
+        self.service = AIService(backend=FakeBackend(latency_scale=0))
+        self.service_patch = patch.object(ai_service, "_service", self.service)
+        self.service_patch.start()
+        with app.app_context():
+            db.drop_all()
+            db.create_all()
+            teacher = User(email="pool_t@example.com", role="teacher", first_name="T", last_name="Teach")
+            student = User(email="pool_s@example.com", role="student", first_name="S", last_name="Stu")
+            teacher.set_password("pass")
+            student.set_password("pass")
+            db.session.add_all([teacher, student])
+            db.session.commit()
+            classroom = Classroom(name="Chemistry", description="", teacher_id=teacher.id)
+            db.session.add(classroom)
+            db.session.commit()
+            db.session.add(Enrollment(classroom_id=classroom.id, student_id=student.id))
+            # Page renders read the daily quote; seed it so no AI call is made
+            db.session.add(DailyQuoteCache(date=date.today(), quote="Keep learning!"))
+            material = Material(classroom_id=classroom.id, title="Bonds", file_path="bonds.txt", file_type="txt",
+                                status="indexed", chunks_json="[]",
+                                content="Covalent bonds share electrons between atoms. " * 30)
+            db.session.add(material)
+            db.session.commit()
+            self.classroom_id = classroom.id
+            self.student_id = student.id
+            self.material_id = material.id
+            self.digest = quiz_pool.content_hash(material.content)
+
+    def tearDown(self):
+        self.service_patch.stop()
+        rate_limiter._limiter = None
+        shutil.rmtree(self.tmp)
+        for key in ("INGESTION_SYNC", "QUIZ_POOL_SYNC"):
+            app.config.pop(key, None)
+        with app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def test_material_ready_warms_pool_and_students_are_served_from_it(self):
+        with app.app_context():
+            ingestion.run_pipeline(app, self.material_id, "/student/classroom/1")
+            for kind in quiz_pool.QUIZ_KINDS:
+                self.assertEqual(quiz_pool.available(self.digest, kind), 2)
+            self.assertIsNotNone(quiz_pool.get_study_guide(self.digest))
+
+        client = app.test_client()
+        with client.session_transaction() as sess:
+            sess["_user_id"] = str(self.student_id)
+            sess["_fresh"] = True
+        unavailable = Mock(side_effect=AssertionError("should be served from the pool"))
+        with patch.object(self.service, "generate_quiz", unavailable), \
+                patch.object(self.service, "stream_quiz", unavailable):
+            response = client.get(f"/student/classroom/{self.classroom_id}/create_quiz?type=mcq&material_id={self.material_id}")
+        self.assertEqual(response.status_code, 200)
+
+        with app.app_context():
+            evaluation = SelfEvaluation.query.one()
+            self.assertEqual(len(json.loads(evaluation.questions_json)), 20)
+            self.assertEqual(quiz_pool.available(self.digest, "mcq"), 1)
+
+            # Dropping below the low-water mark refills the pool
+            self.assertIsNotNone(quiz_pool.take_quiz(self.digest, "mcq"))
+            content, context = quiz_pool.material_source(db.session.get(Material, self.material_id))
+            quiz_pool.refill_if_low(self.digest, content, context, "mcq")
+            self.assertEqual(quiz_pool.available(self.digest, "mcq"), 2)
+
+    def test_pooled_sets_are_handed_out_once(self):
+        with app.app_context():
+            for payload in ("[1]", "[2]"):
+                db.session.add(GeneratedContent(content_hash=self.digest, kind="mcq", payload=payload))
+            db.session.commit()
+            self.assertEqual(quiz_pool.take_quiz(self.digest, "mcq"), [1])
+            self.assertEqual(quiz_pool.take_quiz(self.digest, "mcq"), [2])
+            self.assertIsNone(quiz_pool.take_quiz(self.digest, "mcq"))
+
+if __name__ == '__main__':
+    unittest.main()
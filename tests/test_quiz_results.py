@@ -0,0 +1,103 @@
+import json
+import os
+import tempfile
+import unittest
+from datetime import date, datetime, timedelta
+
+os.environ["GEMINI_API_KEY"] = "dummy"
+# Bind the app to a throwaway database before it is first imported
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.gettempdir(), f"atlverse-tests-{os.getpid()}.db")
+from main import app
+from extensions import db
+from models import User, Classroom, Enrollment, Quiz, SelfEvaluation, DailyQuoteCache
+import quiz_results
+
+# Each student's attempts as (score, completed); None means the student never started
+ATTEMPTS = {
+    "Ada": [(90.0, True), (40.0, True)],   # passed first, failed the latest
+    "Bob": [(70.0, True), (None, False)],  # retaking after a pass
+    "Cy": [(None, False)],
+    "Dee": [(100.0, True)],
+    "Eve": None,
+}
+
+
+class QuizResultsTest(unittest.TestCase):
+    def setUp(self):
+        app.config["TESTING"] = True
+        self.original_per_page = app.config["QUIZ_RESULTS_PER_PAGE"]
+        with app.app_context():
+            db.drop_all()
+            db.create_all()
+            teacher = User(email="results_t@example.com", role="teacher", first_name="T", last_name="Teach")
+            teacher.set_password("pass")
+            db.session.add(teacher)
+            db.session.commit()
+            classroom = Classroom(name="Chemistry", description="", teacher_id=teacher.id)
+            db.session.add(classroom)
+            db.session.commit()
+            quiz = Quiz(title="Bonds", teacher_id=teacher.id, classroom_id=classroom.id, quiz_type="mcq",
+                        questions_json="[]", published=True, passing_score=60.0)
+            db.session.add(quiz)
+            db.session.add(DailyQuoteCache(date=date.today(), quote="Keep learning!"))
+            db.session.commit()
+            start = datetime(2026, 1, 1)
+            for name, attempts in ATTEMPTS.items():
+                student = User(email=f"results_{name}@example.com", role="student", first_name=name, last_name="Z")
+                student.set_password("pass")
+                db.session.add(student)
+                db.session.commit()
+                db.session.add(Enrollment(classroom_id=classroom.id, student_id=student.id))
+                for i, (score, completed) in enumerate(attempts or []):
+                    db.session.add(SelfEvaluation(
+                        student_id=student.id, classroom_id=classroom.id, quiz_id=quiz.id, quiz_type="mcq",
+                        is_ai_generated=False, answers_json=json.dumps([]), score=score,
+                        started_at=start + timedelta(days=i),
+                        completed_at=start + timedelta(days=i, hours=1) if completed else None,
+                    ))
+            db.session.commit()
+            self.teacher_id = teacher.id
+            self.quiz_id = quiz.id
+
+    def tearDown(self):
+        app.config["QUIZ_RESULTS_PER_PAGE"] = self.original_per_page
+        with app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def test_summary_counts_only_each_students_latest_attempt(self):
+        with app.app_context():
+            stats = quiz_results.summary(db.session.get(Quiz, self.quiz_id))
+        self.assertEqual(stats["students"], 5)
+        self.assertEqual((stats["completed_count"], stats["in_progress_count"], stats["not_started_count"]), (3, 1, 1))
+        self.assertAlmostEqual(stats["avg_score"], (40 + 70 + 100) / 3)
+        self.assertAlmostEqual(stats["pass_rate"], 200 / 3)
+
+    def test_histogram_buckets_latest_completed_scores(self):
+        with app.app_context():
+            counts = quiz_results.histogram(db.session.get(Quiz, self.quiz_id))
+        self.assertEqual(counts, [0, 0, 0, 0, 1, 0, 0, 1, 0, 1])
+
+    def test_student_page_is_paginated_by_name(self):
+        with app.app_context():
+            quiz = db.session.get(Quiz, self.quiz_id)
+            first = quiz_results.student_page(quiz, 1, 2)
+            last = quiz_results.student_page(quiz, 3, 2)
+        self.assertEqual([(row.User.first_name, row.score) for row in first], [("Ada", 40.0), ("Bob", 70.0)])
+        self.assertEqual([(row.User.first_name, row.evaluation_id) for row in last], [("Eve", None)])
+
+    def test_results_page_renders_requested_page(self):
+        app.config["QUIZ_RESULTS_PER_PAGE"] = 2
+        client = app.test_client()
+        with client.session_transaction() as sess:
+            sess["_user_id"] = str(self.teacher_id)
+            sess["_fresh"] = True
+        page = client.get(f"/teacher/quiz/{self.quiz_id}/results?page=2").get_data(as_text=True)
+        self.assertIn("Page 2 of 3", page)
+        self.assertIn("Cy Z", page)
+        self.assertNotIn("Ada Z", page)
+        self.assertIn("66.7%", page)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,147 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+
+os.environ["GEMINI_API_KEY"] = "dummy"
+# Bind the app to a throwaway database before it is first imported
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.gettempdir(), f"atlverse-tests-{os.getpid()}.db")
+from main import app
+from extensions import db
+from models import User, Classroom, Enrollment, Material, SelfEvaluation
+from ai_backends import FakeBackend
+from ai_service import AIService
+import ai_service
+from json_stream import JSONArrayParser, parse_array
+import rate_limiter
+import routes
+
+QUESTIONS = [
+    {"question": "Which {brace} and [bracket] are \"quoted\"?", "options": ["A) x", "B) y"],
+     "correct_answer": "A", "explanation": "Escapes \\\\ and ] inside strings"},
+    {"question": "Second?", "options": ["A) x", "B) y"], "correct_answer": "B", "explanation": ""},
+]
+RESPONSE = "```json\n" + json.dumps(QUESTIONS, indent=2) + "\n```"
+
+
+class JSONArrayParserTest(unittest.TestCase):
+    def test_objects_are_emitted_as_they_close(self):
+        for size in (1, 2, 5, 17):
+            parser = JSONArrayParser()
+            items = []
+            for i in range(0, len(RESPONSE), size):
+                items.extend(parser.feed(RESPONSE[i:i + size]))
+            self.assertEqual(items, QUESTIONS)
+            self.assertFalse(parser.truncated)
+
+    def test_truncated_stream_keeps_completed_objects(self):
+        cut = RESPONSE.index('"Second?"')
+        items, parser = parse_array(RESPONSE[:cut])
+        self.assertEqual(items, QUESTIONS[:1])
+        self.assertTrue(parser.truncated)
+
+    def test_brackets_in_leading_prose_are_skipped(self):
+        items, parser = parse_array('Here are the [20] questions:\n[{"question":"a"}]')
+        self.assertEqual(items, [{"question": "a"}])
+        self.assertFalse(parser.truncated)
+
+        parser = JSONArrayParser()
+        self.assertEqual(parser.feed("Sure [see below]:\n```json\n[\n "), [])
+        self.assertEqual(parser.feed(' "x", {"question": "b"}]'), [{"question": "b"}])
+
+
+class TruncatedBackend(FakeBackend):
+    def generate(self, operation, prompt, temperature=None):
+        return RESPONSE[:RESPONSE.index('"Second?"')]
+
+
+class QuizStreamTest(unittest.TestCase):
+    def setUp(self):
+        app.config["TESTING"] = True
+        self.tmp = tempfile.mkdtemp()
+        rate_limiter._limiter = rate_limiter.RateLimiter(os.path.join(self.tmp, "limits.sqlite3"), burst=100)
+        with app.app_context():
+            db.drop_all()
+            db.create_all()
+            teacher = User(email="quizstream_t@example.com", role="teacher", first_name="T", last_name="Teach")
+            student = User(email="quizstream_s@example.com", role="student", first_name="S", last_name="Stu")
+            teacher.set_password("pass")
+            student.set_password("pass")
+            db.session.add_all([teacher, student])
+            db.session.commit()
+            classroom = Classroom(name="Biology", description="", teacher_id=teacher.id)
+            db.session.add(classroom)
+            db.session.commit()
+            db.session.add(Enrollment(classroom_id=classroom.id, student_id=student.id))
+            db.session.add(Material(classroom_id=classroom.id, title="Cells", file_path="cells.txt",
+                                    file_type="txt", status="notified",
+                                    content="Mitochondria produce energy for the cell. " * 30))
+            evaluation = SelfEvaluation(student_id=student.id, classroom_id=classroom.id, quiz_type="mcq",
+                                        questions_json="[]", answers_json="[]")
+            db.session.add(evaluation)
+            db.session.commit()
+            self.student_id = student.id
+            self.evaluation_id = evaluation.id
+
+    def tearDown(self):
+        rate_limiter._limiter = None
+        shutil.rmtree(self.tmp)
+        with app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def test_truncated_response_keeps_complete_questions(self):
+        service = AIService(backend=TruncatedBackend(latency_scale=0))
+        self.assertEqual(service.generate_quiz("content", "mcq"), QUESTIONS[:1])
+
+    def test_questions_stream_without_answers_and_are_saved(self):
+        client = app.test_client()
+        with client.session_transaction() as sess:
+            sess["_user_id"] = str(self.student_id)
+            sess["_fresh"] = True
+        service = AIService(backend=FakeBackend(latency_scale=0))
+        with patch.object(ai_service, "_service", service):
+            body = client.get(f"/student/quiz/{self.evaluation_id}/stream").get_data(as_text=True)
+
+        events = [block for block in body.split("\n\n") if block]
+        self.assertTrue(events[-1].startswith("event: done"))
+        streamed = [json.loads(e[len("data: "):])["question"] for e in events[:-1]]
+        self.assertEqual(len(streamed), 20)
+        self.assertNotIn("correct_answer", streamed[0])
+        with app.app_context():
+            saved = json.loads(db.session.get(SelfEvaluation, self.evaluation_id).questions_json)
+        self.assertEqual([q["question"] for q in saved], [q["question"] for q in streamed])
+        self.assertIn("correct_answer", saved[0])
+
+    def test_second_stream_replays_while_first_is_generating(self):
+        client = app.test_client()
+        with client.session_transaction() as sess:
+            sess["_user_id"] = str(self.student_id)
+            sess["_fresh"] = True
+        with app.app_context():
+            self.assertTrue(routes._claim_quiz_generation(self.evaluation_id, 120))
+            self.assertFalse(routes._claim_quiz_generation(self.evaluation_id, 120))
+            record = db.session.get(SelfEvaluation, self.evaluation_id)
+            record.questions_json = json.dumps(QUESTIONS[:1])
+            db.session.commit()
+
+        def first_stream_finishes(seconds):
+            record = db.session.get(SelfEvaluation, self.evaluation_id)
+            record.questions_json = json.dumps(QUESTIONS)
+            record.generating_since = None
+            db.session.commit()
+
+        failing_service = AIService(backend=TruncatedBackend(latency_scale=0))
+        with patch.object(ai_service, "_service", failing_service), \
+                patch.object(failing_service, "stream_quiz", side_effect=AssertionError("generated twice")), \
+                patch("routes.time.sleep", side_effect=first_stream_finishes):
+            body = client.get(f"/student/quiz/{self.evaluation_id}/stream").get_data(as_text=True)
+
+        events = [block for block in body.split("\n\n") if block]
+        self.assertEqual([json.loads(e[len("data: "):])["index"] for e in events[:-1]], [0, 1])
+        self.assertTrue(events[-1].startswith("event: done"))
+
+if __name__ == '__main__':
+    unittest.main()
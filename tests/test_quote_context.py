@@ -3,7 +3,8 @@ import unittest
 from unittest.mock import patch
 
 os.environ["GEMINI_API_KEY"] = "dummy"
-from app import app, db, inject_daily_quote
+from main import app
+from app import db, inject_daily_quote
 
 class QuoteContextProcessorTest(unittest.TestCase):
     def setUp(self):
@@ -18,7 +19,7 @@ class QuoteContextProcessorTest(unittest.TestCase):
             db.session.remove()
             db.drop_all()
 
-    @patch('app.AIService')
+    @patch('ai_service.get_service')
     def test_inject_daily_quote_returns_quote(self, mock_service):
         mock_service.return_value.get_daily_quote.return_value = 'CS fact'
         with app.app_context():
@@ -26,5 +27,18 @@ class QuoteContextProcessorTest(unittest.TestCase):
             self.assertIn('daily_quote', context)
             self.assertTrue(context['daily_quote'])
 
+    @patch('ai_service.get_service')
+    def test_fallback_quote_is_not_cached(self, mock_service):
+        from models import DailyQuoteCache
+        mock_service.return_value.get_daily_quote.side_effect = Exception('No AI capacity')
+        with app.app_context():
+            self.assertEqual(inject_daily_quote()['daily_quote'], 'Keep learning!')
+            self.assertEqual(DailyQuoteCache.query.count(), 0)
+
+            mock_service.return_value.get_daily_quote.side_effect = None
+            mock_service.return_value.get_daily_quote.return_value = 'CS fact'
+            self.assertEqual(inject_daily_quote()['daily_quote'], 'CS fact')
+            self.assertEqual(DailyQuoteCache.query.count(), 1)
+
 if __name__ == '__main__':
     unittest.main()
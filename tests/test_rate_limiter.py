@@ -0,0 +1,77 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from google.api_core import exceptions as google_exceptions
+
+import rate_limiter
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+class RateLimiterTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.clock = FakeClock()
+        self.limiter = rate_limiter.RateLimiter(
+            os.path.join(self.tmp, "limits.sqlite3"), rate_per_minute=60, burst=2,
+            clock=self.clock.time, sleep=self.clock.sleep,
+        )
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_bucket_refills_at_configured_rate(self):
+        self.assertEqual(self.limiter.acquire("generate_quiz"), 0)
+        self.assertEqual(self.limiter.acquire("generate_quiz"), 0)
+        waited = self.limiter.acquire("generate_quiz")
+        self.assertAlmostEqual(waited, 1.0, delta=rate_limiter.POLL_INTERVAL * 2)
+
+        stats = self.limiter.metrics()["generate_quiz"]
+        self.assertEqual(stats["calls"], 3)
+        self.assertAlmostEqual(stats["wait_max"], waited)
+
+    def test_higher_priority_waiter_is_served_first(self):
+        conn = self.limiter._connect()
+        now = self.clock.time()
+        conn.execute("INSERT INTO waiter VALUES ('scorer', 0, ?, ?)", (now, now))
+        conn.execute("INSERT INTO waiter VALUES ('quote', 2, ?, ?)", (now - 1, now))
+        self.assertFalse(self.limiter._try_acquire(conn, "quote", 2, now))
+        self.assertTrue(self.limiter._try_acquire(conn, "scorer", 0, now))
+        self.assertTrue(self.limiter._try_acquire(conn, "quote", 2, now))
+        conn.close()
+
+    def test_daily_quote_gives_up_when_capacity_is_exhausted(self):
+        self.limiter.throttle(60)
+        with self.assertRaises(rate_limiter.RateLimitTimeout):
+            self.limiter.acquire("daily_quote")
+        self.assertEqual(self.limiter.metrics()["daily_quote"]["timeouts"], 1)
+
+    def test_throttled_calls_back_off_and_retry(self):
+        responses = [google_exceptions.ResourceExhausted("quota"), "ok"]
+
+        def fake_call():
+            result = responses.pop(0)
+            if isinstance(result, Exception):
+                raise result
+            return result
+
+        with patch("rate_limiter.backoff_delay", return_value=5.0):
+            self.assertEqual(rate_limiter.call("score_essay", fake_call, limiter=self.limiter), "ok")
+        stats = self.limiter.metrics()["score_essay"]
+        self.assertEqual(stats["retries"], 1)
+        self.assertGreaterEqual(stats["wait_max"], 5.0)
+
+if __name__ == '__main__':
+    unittest.main()
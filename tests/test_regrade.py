@@ -0,0 +1,142 @@
+import json
+import os
+import tempfile
+import unittest
+from datetime import date, datetime
+
+os.environ["GEMINI_API_KEY"] = "dummy"
+# Bind the app to a throwaway database before it is first imported
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.gettempdir(), f"atlverse-tests-{os.getpid()}.db")
+from main import app
+from extensions import db
+from models import User, Classroom, Quiz, SelfEvaluation, QuizRegrade, DailyQuoteCache
+import attempts
+import regrade
+
+QUESTIONS = [
+    {"question": f"Q{i}", "options": ["A) a", "B) b", "C) c", "D) d"], "correct_answer": "A", "explanation": ""}
+    for i in range(4)
+]
+# Each student's answers to the four questions
+ANSWERS = [
+    ["A", "A", "A", "A"],
+    ["A", "B", "A", "A"],
+    ["B", "B", "C", None],
+]
+
+
+class RegradeTest(unittest.TestCase):
+    def setUp(self):
+        app.config["TESTING"] = True
+        app.config["WTF_CSRF_ENABLED"] = False
+        with app.app_context():
+            db.drop_all()
+            db.create_all()
+            teacher = User(email="regrade_t@example.com", role="teacher", first_name="T", last_name="Teach")
+            teacher.set_password("pass")
+            students = [User(email=f"regrade_s{i}@example.com", role="student", first_name="S", last_name=str(i))
+                        for i in range(len(ANSWERS))]
+            for student in students:
+                student.set_password("pass")
+            db.session.add_all([teacher] + students)
+            db.session.commit()
+            classroom = Classroom(name="History", description="", teacher_id=teacher.id)
+            db.session.add(classroom)
+            db.session.commit()
+            quiz = Quiz(title="Dates", teacher_id=teacher.id, classroom_id=classroom.id, quiz_type="mcq",
+                        questions_json=json.dumps(QUESTIONS), published=True, passing_score=60.0)
+            db.session.add(quiz)
+            db.session.add(DailyQuoteCache(date=date.today(), quote="Keep learning!"))
+            db.session.commit()
+            for student, answers in zip(students, ANSWERS):
+                correct = sum(answer == "A" for answer in answers)
+                db.session.add(SelfEvaluation(
+                    student_id=student.id, classroom_id=classroom.id, quiz_id=quiz.id, quiz_type="mcq",
+                    is_ai_generated=False, questions_json=json.dumps(QUESTIONS),
+                    answers_json=json.dumps(answers), score=correct * 25.0, feedback_json="[]",
+                    completed_at=datetime.utcnow(),
+                ))
+            db.session.commit()
+            self.teacher_id = teacher.id
+            self.quiz_id = quiz.id
+
+    def tearDown(self):
+        app.config["WTF_CSRF_ENABLED"] = True
+        with app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def _fix_second_answer(self):
+        quiz = db.session.get(Quiz, self.quiz_id)
+        questions = json.loads(quiz.questions_json)
+        questions[1]["correct_answer"] = "B"
+        quiz.questions_json = json.dumps(questions)
+        db.session.commit()
+        return quiz
+
+    def _scores(self):
+        return [e.score for e in SelfEvaluation.query.order_by(SelfEvaluation.id)]
+
+    def test_preview_apply_and_revert(self):
+        with app.app_context():
+            quiz = self._fix_second_answer()
+            deltas = {d["evaluation_id"]: d for d in regrade.preview(quiz)}
+            self.assertEqual(len(deltas), 3)
+            self.assertEqual([d["new_score"] for d in deltas.values()], [75.0, 100.0, 25.0])
+            self.assertEqual([d["pass_changed"] for d in deltas.values()], [False, False, False])
+            self.assertEqual(self._scores(), [100.0, 75.0, 0.0])
+
+            run = regrade.apply(quiz, self.teacher_id, batch_size=2)
+            self.assertEqual(run.changed_count, 3)
+            db.session.expire_all()
+            self.assertEqual(self._scores(), [75.0, 100.0, 25.0])
+            feedback = attempts.feedback_for(SelfEvaluation.query.order_by(SelfEvaluation.id).first())
+            self.assertEqual([f["is_correct"] for f in feedback], [True, False, True, True])
+            self.assertEqual(regrade.preview(quiz), [])
+
+            regrade.revert(run)
+            db.session.expire_all()
+            self.assertEqual(self._scores(), [100.0, 75.0, 0.0])
+            self.assertEqual(SelfEvaluation.query.first().feedback_json, "[]")
+            self.assertIsNone(SelfEvaluation.query.first().correct_bitmap)
+            with self.assertRaises(regrade.RegradeError):
+                regrade.revert(run)
+
+    def test_only_latest_regrade_can_be_reverted(self):
+        with app.app_context():
+            quiz = self._fix_second_answer()
+            first = regrade.apply(quiz, self.teacher_id)
+            questions = json.loads(quiz.questions_json)
+            questions[2]["correct_answer"] = "C"
+            quiz.questions_json = json.dumps(questions)
+            db.session.commit()
+            second = regrade.apply(quiz, self.teacher_id)
+            with self.assertRaises(regrade.RegradeError):
+                regrade.revert(first)
+            regrade.revert(second)
+            regrade.revert(first)
+            db.session.expire_all()
+            self.assertEqual(self._scores(), [100.0, 75.0, 0.0])
+
+    def test_regrade_routes(self):
+        client = app.test_client()
+        with client.session_transaction() as sess:
+            sess["_user_id"] = str(self.teacher_id)
+            sess["_fresh"] = True
+        with app.app_context():
+            self._fix_second_answer()
+
+        page = client.get(f"/teacher/quiz/{self.quiz_id}/regrade").get_data(as_text=True)
+        self.assertIn("+25.0", page)
+        response = client.post(f"/teacher/quiz/{self.quiz_id}/regrade")
+        self.assertEqual(response.status_code, 302)
+        with app.app_context():
+            self.assertEqual(self._scores(), [75.0, 100.0, 25.0])
+            run_id = QuizRegrade.query.one().id
+        client.post(f"/teacher/quiz/regrade/{run_id}/revert")
+        with app.app_context():
+            self.assertEqual(self._scores(), [100.0, 75.0, 0.0])
+
+
+if __name__ == '__main__':
+    unittest.main()
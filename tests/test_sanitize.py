@@ -0,0 +1,114 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+os.environ["GEMINI_API_KEY"] = "dummy"
+# Bind the app to a throwaway database before it is first imported
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.gettempdir(), f"atlverse-tests-{os.getpid()}.db")
+from datetime import date
+from flask import render_template_string
+from main import app
+from extensions import db
+from models import User, Classroom, Assignment, AssignmentSubmission, GeneratedContent, DailyQuoteCache
+import quiz_pool
+import routes
+import sanitize
+
+
+class SanitizeTest(unittest.TestCase):
+    def setUp(self):
+        app.config["TESTING"] = True
+        sanitize.clear_cache()
+        with app.app_context():
+            db.drop_all()
+            db.create_all()
+            teacher = User(email="san_t@example.com", role="teacher", first_name="T", last_name="Teach")
+            student = User(email="san_s@example.com", role="student", first_name="S", last_name="Stu")
+            teacher.set_password("pass")
+            student.set_password("pass")
+            db.session.add_all([teacher, student])
+            db.session.add(DailyQuoteCache(date=date.today(), quote="Keep learning!"))
+            db.session.commit()
+            classroom = Classroom(name="Chemistry", description="", teacher_id=teacher.id)
+            db.session.add(classroom)
+            db.session.commit()
+            self.teacher_id = teacher.id
+            self.student_id = student.id
+            self.classroom_id = classroom.id
+
+    def tearDown(self):
+        sanitize.clear_cache()
+        with app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def test_allow_list_is_shared(self):
+        self.assertIs(routes.ALLOWED_TAGS, sanitize.ALLOWED_TAGS)
+        self.assertIs(routes.ALLOWED_ATTRS, sanitize.ALLOWED_ATTRS)
+
+    def test_unsafe_markup_is_removed(self):
+        html = sanitize.clean_html('<p onclick="x()" class="note">Hi</p><script>alert(1)</script>')
+        self.assertIn('<p class="note">Hi</p>', html)
+        self.assertNotIn('<script>', html)
+        self.assertNotIn('onclick', html)
+        self.assertNotIn('<script>', sanitize.render_markdown('**bold** <script>alert(1)</script>'))
+
+    def test_repeated_input_is_rendered_once(self):
+        with patch.object(sanitize.bleach, "clean", wraps=sanitize.bleach.clean) as clean:
+            first = sanitize.render_markdown("# Title\n\nSome *text*")
+            second = sanitize.render_markdown("# Title\n\nSome *text*")
+        self.assertEqual(first, second)
+        self.assertEqual(clean.call_count, 1)
+        self.assertEqual(sanitize.cache_info()["hits"], 1)
+
+    def test_memo_is_bounded(self):
+        memo = sanitize._Memo(max_entries=2, max_chars=100)
+        for text in ("a", "b", "c"):
+            memo.get_or_render("kind", text, str.upper)
+        self.assertEqual(len(memo._entries), 2)
+        memo.get_or_render("kind", "x" * 60, str.upper)
+        memo.get_or_render("kind", "y" * 60, str.upper)
+        self.assertLessEqual(memo._chars, 100)
+
+    def test_rendered_columns_follow_the_markdown(self):
+        with app.app_context():
+            assignment = Assignment(title="Lab", description="Use **gloves**", classroom_id=self.classroom_id,
+                                    teacher_id=self.teacher_id)
+            db.session.add(assignment)
+            db.session.commit()
+            submission = AssignmentSubmission(assignment_id=assignment.id, student_id=self.student_id,
+                                              content="My *answer*")
+            db.session.add(submission)
+            db.session.commit()
+            self.assertIn("<strong>gloves</strong>", assignment.description_html)
+            self.assertIn("<em>answer</em>", submission.content_html)
+            self.assertIsNone(submission.feedback_html)
+
+            submission.feedback = "Good <script>alert(1)</script>"
+            assignment.description = ""
+            db.session.commit()
+            self.assertIn("Good", submission.feedback_html)
+            self.assertNotIn("<script>", submission.feedback_html)
+            self.assertIsNone(assignment.description_html)
+
+    def test_filter_uses_stored_html(self):
+        with app.test_request_context():
+            self.assertEqual(render_template_string("{{ text | markdown(html) }}", text="*a*", html="<p>stored</p>"),
+                             "<p>stored</p>")
+            self.assertEqual(render_template_string("{{ text | markdown(html) }}", text="*a*", html=None),
+                             "<p><em>a</em></p>")
+
+    def test_pooled_study_guide_is_served_from_stored_html(self):
+        with app.app_context():
+            db.session.add(GeneratedContent(content_hash="h", kind="study_guide", payload="<p>raw</p>",
+                                            html="<p>stored</p>"))
+            db.session.add(GeneratedContent(content_hash="old", kind="study_guide",
+                                            payload="```html\n<p>legacy</p><script>x</script>```"))
+            db.session.commit()
+            self.assertEqual(quiz_pool.get_study_guide("h"), "<p>stored</p>")
+            self.assertEqual(quiz_pool.get_study_guide("old"), "<p>legacy</p>&lt;script&gt;x&lt;/script&gt;")
+
+
+if __name__ == '__main__':
+    unittest.main()
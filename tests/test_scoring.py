@@ -0,0 +1,115 @@
+import json
+import os
+import tempfile
+import unittest
+from datetime import date, datetime
+
+os.environ["GEMINI_API_KEY"] = "dummy"
+# Bind the app to a throwaway database before it is first imported
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.gettempdir(), f"atlverse-tests-{os.getpid()}.db")
+from main import app
+from extensions import db
+from models import User, Classroom, Enrollment, Quiz, SelfEvaluation, DailyQuoteCache
+import attempts
+import scoring
+
+QUESTIONS = [
+    {"question": "Q1", "options": ["A) a", "B) b"], "correct_answer": "A", "explanation": "Because A"},
+    {"question": "Q2", "options": ["A) a", "B) b"], "correct_answer": "B", "explanation": "Because B"},
+    {"question": "Q3", "options": ["A) a", "B) b"], "correct_answer": "B"},
+]
+
+
+class AnswerKeyTest(unittest.TestCase):
+    def test_score_and_feedback_match_question_by_question_comparison(self):
+        answers = ["A", "A", None]
+        score, feedback = scoring.AnswerKey(QUESTIONS).score(answers)
+        self.assertAlmostEqual(score, 100 / 3)
+        self.assertEqual(feedback, [
+            {"question_index": i, "is_correct": answer == q["correct_answer"],
+             "correct_answer": q["correct_answer"], "explanation": q.get("explanation", ""),
+             "user_answer": answer}
+            for i, (q, answer) in enumerate(zip(QUESTIONS, answers))
+        ])
+
+    def test_unknown_answers_never_match(self):
+        key = scoring.AnswerKey([{"question": "Q", "correct_answer": "True"}, {"question": "Q"}])
+        self.assertEqual(key.score(["Maybe", None])[0], 0)
+        self.assertEqual(key.score(["True", None])[0], 50)
+        self.assertEqual(scoring.AnswerKey([]).score([]), (0, []))
+
+    def test_compiled_key_is_reused_per_question_set(self):
+        scoring.compile_key.cache_clear()
+        stored = json.dumps(QUESTIONS)
+        for answers in (["A", "B", "B"], ["B", "B", "B"], ["A", "A", "A"]):
+            scoring.score_objective(stored, answers)
+        info = scoring.compile_key.cache_info()
+        self.assertEqual((info.misses, info.hits), (1, 2))
+
+        edited = json.loads(stored)
+        edited[2]["correct_answer"] = "A"
+        self.assertEqual(scoring.score_objective(json.dumps(edited), ["A", "B", "A"])[0], 100)
+        self.assertEqual(scoring.compile_key.cache_info().misses, 2)
+
+    def test_batch_encoding_matches_single_scoring(self):
+        key = scoring.AnswerKey(QUESTIONS)
+        rows = [["A", "B", "B"], ["B", None, "B"], ["A", "A", "A"]]
+        correct = key.encode_many(rows) == key.codes
+        self.assertEqual(correct.sum(axis=1).tolist(), [3, 1, 1])
+        self.assertEqual([key.score(row)[0] for row in rows], (correct.sum(axis=1) / 3 * 100).tolist())
+
+
+class TeacherQuizSubmissionTest(unittest.TestCase):
+    def setUp(self):
+        app.config["TESTING"] = True
+        app.config["WTF_CSRF_ENABLED"] = False
+        with app.app_context():
+            db.drop_all()
+            db.create_all()
+            teacher = User(email="scoring_t@example.com", role="teacher", first_name="T", last_name="Teach")
+            student = User(email="scoring_s@example.com", role="student", first_name="S", last_name="Stu")
+            teacher.set_password("pass")
+            student.set_password("pass")
+            db.session.add_all([teacher, student])
+            db.session.commit()
+            classroom = Classroom(name="Logic", description="", teacher_id=teacher.id)
+            db.session.add(classroom)
+            db.session.commit()
+            db.session.add(Enrollment(classroom_id=classroom.id, student_id=student.id))
+            db.session.add(DailyQuoteCache(date=date.today(), quote="Keep learning!"))
+            quiz = Quiz(title="Basics", teacher_id=teacher.id, classroom_id=classroom.id, quiz_type="mcq",
+                        questions_json=json.dumps(QUESTIONS), published=True)
+            db.session.add(quiz)
+            db.session.commit()
+            evaluation = SelfEvaluation(student_id=student.id, classroom_id=classroom.id, quiz_id=quiz.id,
+                                        quiz_type="mcq", is_ai_generated=False, questions_json=quiz.questions_json,
+                                        answers_json="[]", started_at=datetime.utcnow())
+            db.session.add(evaluation)
+            db.session.commit()
+            self.student_id = student.id
+            self.evaluation_id = evaluation.id
+
+    def tearDown(self):
+        app.config["WTF_CSRF_ENABLED"] = True
+        with app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def test_submission_is_scored_with_the_compiled_key(self):
+        client = app.test_client()
+        with client.session_transaction() as sess:
+            sess["_user_id"] = str(self.student_id)
+            sess["_fresh"] = True
+        response = client.post(f"/student/submit_teacher_quiz/{self.evaluation_id}",
+                               data={"answer_0": "A", "answer_1": "B", "answer_2": "A"})
+        self.assertEqual(response.status_code, 302)
+        with app.app_context():
+            evaluation = db.session.get(SelfEvaluation, self.evaluation_id)
+            self.assertAlmostEqual(evaluation.score, 200 / 3)
+            self.assertEqual(json.loads(evaluation.answers_json), ["A", "B", "A"])
+            self.assertIsNone(evaluation.feedback_json)
+            self.assertEqual([f["is_correct"] for f in attempts.feedback_for(evaluation)], [True, True, False])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,41 @@
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Loaded on first use by the requests that need them, never at boot
+HEAVY_MODULES = ('matplotlib', 'sklearn', 'PyPDF2', 'docx', 'google.generativeai')
+
+
+class StartupTest(unittest.TestCase):
+    def _modules_after_import(self, code):
+        env = dict(os.environ)
+        env["GEMINI_API_KEY"] = "dummy"
+        env["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.gettempdir(), f"atlverse-startup-{os.getpid()}.db")
+        script = "import sys\n" + code + f"\nprint('loaded:' + ','.join(name for name in {HEAVY_MODULES!r} if name in sys.modules))"
+        result = subprocess.run([sys.executable, "-c", script], cwd=ROOT, env=env, capture_output=True, text=True,
+                                timeout=120)
+        self.assertEqual(result.returncode, 0, result.stderr)
+        loaded = result.stdout.splitlines()[-1][len("loaded:"):]
+        return [name for name in loaded.split(",") if name]
+
+    def test_importing_the_app_skips_heavy_dependencies(self):
+        self.assertEqual(self._modules_after_import("import main"), [])
+
+    def test_importing_the_factory_builds_nothing(self):
+        self._modules_after_import("import app\nassert 'routes' not in sys.modules, 'routes imported'")
+
+    def test_ai_service_is_built_on_first_use(self):
+        loaded = self._modules_after_import(
+            "import ai_service\n"
+            "assert ai_service._service is None\n"
+            "assert ai_service.get_service() is ai_service.get_service()"
+        )
+        self.assertIn("google.generativeai", loaded)
+        self.assertNotIn("sklearn", loaded)
+
+
+if __name__ == '__main__':
+    unittest.main()
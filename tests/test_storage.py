@@ -0,0 +1,138 @@
+import io
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+
+os.environ["GEMINI_API_KEY"] = "dummy"
+from sqlalchemy import orm
+from werkzeug.datastructures import FileStorage
+from main import app
+from extensions import db
+from models import User, Classroom, Material, StoredFile
+import file_serving
+import ingestion
+import storage
+
+SYLLABUS = b"Week 1 covers sorting algorithms. Week 2 covers graphs. " * 40
+
+class ContentAddressedStorageTest(unittest.TestCase):
+    def setUp(self):
+        os.environ["DATABASE_URL"] = "sqlite:///:memory:"
+        app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///:memory:"
+        app.config["TESTING"] = True
+        app.config["INGESTION_SYNC"] = True
+        self.original_pool_size = app.config["QUIZ_POOL_SIZE"]
+        app.config["QUIZ_POOL_SIZE"] = 0
+        self.upload_dir = tempfile.mkdtemp()
+        self.original_upload_folder = app.config["UPLOAD_FOLDER"]
+        app.config["UPLOAD_FOLDER"] = self.upload_dir
+        with app.app_context():
+            db.drop_all()
+            db.create_all()
+            teacher = User(email="storage_t@example.com", role="teacher", first_name="T", last_name="Teach")
+            teacher.set_password("pass")
+            db.session.add(teacher)
+            db.session.commit()
+            sections = [Classroom(name=f"Section {i}", description="", teacher_id=teacher.id) for i in range(2)]
+            db.session.add_all(sections)
+            db.session.commit()
+            self.classroom_ids = [c.id for c in sections]
+
+    def tearDown(self):
+        app.config["UPLOAD_FOLDER"] = self.original_upload_folder
+        app.config.pop("INGESTION_SYNC", None)
+        app.config["QUIZ_POOL_SIZE"] = self.original_pool_size
+        shutil.rmtree(self.upload_dir)
+        with app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def _upload(self, classroom_id):
+        upload = FileStorage(stream=io.BytesIO(SYLLABUS), filename="syllabus.txt")
+        stored_file = storage.store_upload(upload, upload.filename)
+        material = Material(classroom_id=classroom_id, title="Syllabus",
+                            file_path=stored_file.file_path, file_type="txt",
+                            stored_file=stored_file)
+        db.session.add(material)
+        db.session.commit()
+        ingestion.submit(material.id, "/student/classroom/1")
+        return material.id
+
+    def test_identical_uploads_are_stored_and_extracted_once(self):
+        with app.app_context():
+            with patch("ingestion.extract_text_from_file", wraps=ingestion.extract_text_from_file) as extract:
+                first = self._upload(self.classroom_ids[0])
+                second = self._upload(self.classroom_ids[1])
+            self.assertEqual(extract.call_count, 1)
+
+            stored_file = StoredFile.query.one()
+            self.assertEqual(stored_file.ref_count, 2)
+            self.assertEqual(len([n for n in os.listdir(self.upload_dir) if not n.startswith('.')]), 1)
+            self.assertEqual(db.session.get(Material, second).content, db.session.get(Material, first).content)
+            self.assertEqual(db.session.get(Material, second).chunks_json, stored_file.chunks_json)
+
+    def test_file_unlinked_only_after_last_reference_released(self):
+        with app.app_context():
+            ids = [self._upload(cid) for cid in self.classroom_ids]
+            path = os.path.join(self.upload_dir, StoredFile.query.one().file_path)
+            digest = StoredFile.query.one().digest
+
+            for material_id in ids:
+                material = db.session.get(Material, material_id)
+                stored_file = material.stored_file
+                db.session.delete(material)
+                release_path = storage.release(stored_file)
+                db.session.commit()
+                if release_path:
+                    storage.unlink_if_unreferenced(release_path, digest)
+                if material_id == ids[0]:
+                    self.assertTrue(os.path.exists(path))
+
+            self.assertFalse(os.path.exists(path))
+            self.assertEqual(StoredFile.query.count(), 0)
+
+    def test_concurrent_first_upload_takes_reference_on_winning_row(self):
+        with app.app_context():
+            digest = "ab" * 32
+            real_find = storage._find
+
+            def other_worker_inserts_first(lookup_digest):
+                # Another worker commits the same digest between our lookup and insert
+                if not StoredFile.query.filter_by(digest=lookup_digest).first():
+                    other = orm.Session(db.engine)
+                    other.add(StoredFile(digest=lookup_digest, file_path=f"{lookup_digest}.txt",
+                                         size=len(SYLLABUS), ref_count=1))
+                    other.commit()
+                    other.close()
+                    return None
+                return real_find(lookup_digest)
+
+            temp_path = os.path.join(self.upload_dir, ".upload-race")
+            with open(temp_path, "wb") as f:
+                f.write(SYLLABUS)
+            with patch("storage._find", side_effect=other_worker_inserts_first):
+                stored_file = storage.acquire(digest, "txt", temp_path, len(SYLLABUS))
+            db.session.add(Material(classroom_id=self.classroom_ids[0], title="Syllabus",
+                                    file_path=stored_file.file_path, file_type="txt",
+                                    stored_file=stored_file))
+            db.session.commit()
+
+            self.assertEqual(StoredFile.query.count(), 1)
+            self.assertEqual(StoredFile.query.one().ref_count, 2)
+            self.assertFalse(os.path.exists(temp_path))
+
+    def test_original_filename_is_used_as_download_name(self):
+        with app.app_context():
+            material_id = self._upload(self.classroom_ids[0])
+            material = db.session.get(Material, material_id)
+            material.original_filename = "Week 1 syllabus.txt"
+            db.session.commit()
+            with app.test_request_context():
+                response = file_serving.send_upload(material.file_path, download_name=material.original_filename)
+            response.close()
+            self.assertIn('filename="Week 1 syllabus.txt"', response.headers["Content-Disposition"])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,118 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+
+os.environ["GEMINI_API_KEY"] = "dummy"
+# Bind the app to a throwaway database before it is first imported
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.gettempdir(), f"atlverse-tests-{os.getpid()}.db")
+from main import app
+from extensions import db
+from models import User, Classroom, Enrollment, Material
+from ai_backends import FakeBackend
+from ai_service import AIService
+import ai_service
+from html_stream import IncrementalSanitizer
+import rate_limiter
+import routes
+
+GUIDE = (
+    "```html\n<h2>Key Concepts</h2><ul><li><strong>Graph</strong>: nodes &amp; edges</li></ul>"
+    "<p>Use <script>alert(1)</script> carefully.</p><hr><table><tr><td>BFS</td></tr></table>\n```"
+)
+
+
+class IncrementalSanitizerTest(unittest.TestCase):
+    def test_any_split_produces_the_same_safe_output(self):
+        whole = IncrementalSanitizer(routes.ALLOWED_TAGS, routes.ALLOWED_ATTRS)
+        expected = whole.feed(GUIDE) + whole.close()
+        self.assertNotIn("<script>", expected)
+        self.assertNotIn("```", expected)
+        self.assertTrue(expected.startswith("<h2>Key Concepts</h2>"))
+
+        for size in (1, 3, 7, 20):
+            sanitizer = IncrementalSanitizer(routes.ALLOWED_TAGS, routes.ALLOWED_ATTRS)
+            fragments = [sanitizer.feed(GUIDE[i:i + size]) for i in range(0, len(GUIDE), size)]
+            fragments.append(sanitizer.close())
+            self.assertEqual("".join(fragments), expected)
+            for fragment in fragments:
+                self.assertNotIn("<script>", fragment)
+
+    def test_wrapped_response_is_flushed_before_the_wrapper_closes(self):
+        sections = "".join(f"<h2>Topic {i}</h2><p>{'Detail about the topic. ' * 10}</p>" for i in range(40))
+        wrapped = f"<div class=\"guide\">{sections}</div>"
+        sanitizer = IncrementalSanitizer(routes.ALLOWED_TAGS, routes.ALLOWED_ATTRS)
+        fragments = [sanitizer.feed(wrapped[i:i + 100]) for i in range(0, len(wrapped), 100)]
+        # Output arrives while the stream is still inside the wrapper
+        self.assertTrue(any(fragments[:len(fragments) // 2]))
+        fragments.append(sanitizer.close())
+        for fragment in filter(None, fragments):
+            self.assertEqual(fragment.count("<div"), fragment.count("</div>"))
+        joined = "".join(fragments)
+        self.assertEqual(joined.count("<h2>"), 40)
+        self.assertNotIn("</div></div>", joined)
+
+    def test_unclosed_paragraphs_and_items_are_flushed_as_they_end(self):
+        sanitizer = IncrementalSanitizer(routes.ALLOWED_TAGS, routes.ALLOWED_ATTRS)
+        self.assertEqual(sanitizer.feed("<p>First point"), "")
+        self.assertEqual(sanitizer.feed("<p>Second point"), "<p>First point</p>")
+        self.assertEqual(sanitizer.feed("<ul><li>one<li>two"), "<p>Second point</p>")
+        self.assertEqual(sanitizer.feed("</ul><li>loose<li>items"), "<ul><li>one</li><li>two</li></ul><li>loose</li>")
+        self.assertEqual(sanitizer.close(), "<li>items</li>")
+
+
+class StudyGuideStreamTest(unittest.TestCase):
+    def setUp(self):
+        app.config["TESTING"] = True
+        app.config["WTF_CSRF_ENABLED"] = False
+        self.tmp = tempfile.mkdtemp()
+        rate_limiter._limiter = rate_limiter.RateLimiter(os.path.join(self.tmp, "limits.sqlite3"), burst=100)
+        with app.app_context():
+            db.drop_all()
+            db.create_all()
+            teacher = User(email="stream_t@example.com", role="teacher", first_name="T", last_name="Teach")
+            student = User(email="stream_s@example.com", role="student", first_name="S", last_name="Stu")
+            teacher.set_password("pass")
+            student.set_password("pass")
+            db.session.add_all([teacher, student])
+            db.session.commit()
+            classroom = Classroom(name="Algorithms", description="", teacher_id=teacher.id)
+            db.session.add(classroom)
+            db.session.commit()
+            db.session.add(Enrollment(classroom_id=classroom.id, student_id=student.id))
+            db.session.add(Material(classroom_id=classroom.id, title="Graphs", file_path="graphs.txt",
+                                    file_type="txt", status="notified",
+                                    content="Graphs have vertices and edges. " * 30))
+            db.session.commit()
+            self.classroom_id = classroom.id
+            self.student_id = student.id
+
+    def tearDown(self):
+        rate_limiter._limiter = None
+        shutil.rmtree(self.tmp)
+        app.config["WTF_CSRF_ENABLED"] = True
+        with app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def test_guide_streams_as_sanitized_events(self):
+        client = app.test_client()
+        with client.session_transaction() as sess:
+            sess["_user_id"] = str(self.student_id)
+            sess["_fresh"] = True
+        service = AIService(backend=FakeBackend(latency_scale=0))
+        with patch.object(ai_service, "_service", service):
+            response = client.get(f"/student/classroom/{self.classroom_id}/study_guide/stream")
+            body = response.get_data(as_text=True)
+
+        self.assertEqual(response.mimetype, "text/event-stream")
+        events = [block for block in body.split("\n\n") if block]
+        self.assertGreater(len(events), 2)
+        self.assertTrue(events[-1].startswith("event: done"))
+        html = "".join(json.loads(e[len("data: "):]).get("html", "") for e in events[:-1])
+        self.assertTrue(html.startswith("<h2>Key Concepts and Definitions</h2>"))
+
+if __name__ == '__main__':
+    unittest.main()
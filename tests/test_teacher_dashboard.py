@@ -0,0 +1,99 @@
+import os
+import tempfile
+import unittest
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import event
+
+os.environ["GEMINI_API_KEY"] = "dummy"
+# Bind the app to a throwaway database before it is first imported
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.gettempdir(), f"atlverse-tests-{os.getpid()}.db")
+from main import app
+from extensions import db
+from models import User, Classroom, Enrollment, Quiz, Assignment, DailyQuoteCache
+
+
+class TeacherDashboardTest(unittest.TestCase):
+    def setUp(self):
+        app.config["TESTING"] = True
+        with app.app_context():
+            db.drop_all()
+            db.create_all()
+            teacher = User(email="dash_t@example.com", role="teacher", first_name="T", last_name="Teach")
+            student = User(email="dash_s@example.com", role="student", first_name="S", last_name="Stu")
+            teacher.set_password("pass")
+            student.set_password("pass")
+            db.session.add_all([teacher, student])
+            db.session.add(DailyQuoteCache(date=date.today(), quote="Keep learning!"))
+            db.session.commit()
+            self.teacher_id = teacher.id
+            self.student_id = student.id
+
+    def tearDown(self):
+        with app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def _add_classroom(self, name):
+        now = datetime.utcnow()
+        classroom = Classroom(name=name, description="", teacher_id=self.teacher_id)
+        db.session.add(classroom)
+        db.session.commit()
+        db.session.add(Enrollment(classroom_id=classroom.id, student_id=self.student_id))
+        for published, available_from, available_until in [
+            (True, None, None),                          # active
+            (True, now - timedelta(days=1), now + timedelta(days=1)),  # active
+            (True, now + timedelta(days=1), None),       # upcoming
+            (True, None, now - timedelta(days=1)),       # expired
+            (False, None, None),                         # draft
+        ]:
+            db.session.add(Quiz(title="Q", teacher_id=self.teacher_id, classroom_id=classroom.id, quiz_type="mcq",
+                                questions_json="[]", published=published,
+                                available_from=available_from, available_until=available_until))
+        for published, deadline in [(True, None), (True, now - timedelta(days=1)), (False, None)]:
+            db.session.add(Assignment(title="A", description="", classroom_id=classroom.id, teacher_id=self.teacher_id,
+                                      published=published, deadline=deadline))
+        db.session.commit()
+        return classroom
+
+    def _get_dashboard(self):
+        client = app.test_client()
+        with client.session_transaction() as sess:
+            sess["_user_id"] = str(self.teacher_id)
+            sess["_fresh"] = True
+        statements = []
+
+        def record(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        with app.app_context():
+            event.listen(db.engine, "before_cursor_execute", record)
+            try:
+                response = client.get("/teacher/dashboard")
+            finally:
+                event.remove(db.engine, "before_cursor_execute", record)
+        self.assertEqual(response.status_code, 200)
+        return response.get_data(as_text=True), len(statements)
+
+    def test_counts_are_grouped_per_classroom(self):
+        with app.app_context():
+            self._add_classroom("Algebra")
+        page, _ = self._get_dashboard()
+        self.assertIn("1 students", page)
+        self.assertIn("2 active quizzes", page)
+        self.assertIn("5 total quizzes", page)
+        self.assertIn("1 active assignment", page)
+
+    def test_query_count_does_not_grow_with_classrooms(self):
+        with app.app_context():
+            self._add_classroom("One")
+        _, one = self._get_dashboard()
+        with app.app_context():
+            for name in ("Two", "Three", "Four"):
+                self._add_classroom(name)
+        _, four = self._get_dashboard()
+        self.assertEqual(one, four)
+
+
+if __name__ == '__main__':
+    unittest.main()
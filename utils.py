@@ -1,7 +1,5 @@
 import os
-import PyPDF2
 from werkzeug.utils import secure_filename
-from docx import Document
 
 ALLOWED_EXTENSIONS = {'txt', 'pdf', 'doc', 'docx'}
 
@@ -10,8 +8,12 @@ def allowed_file(filename):
     return '.' in filename and \
            filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
-def extract_text_from_file(file_path, original_filename):
-    """Extract text content from uploaded files"""
+def extract_text_from_file(file_path, original_filename, strict=False):
+    """Extract text content from uploaded files.
+
+    Errors are returned as text unless ``strict`` is set, in which case they
+    are raised so the caller can record and retry the failure.
+    """
     file_extension = original_filename.rsplit('.', 1)[1].lower()
     
     try:
@@ -24,10 +26,14 @@ def extract_text_from_file(file_path, original_filename):
         else:
             return f"File uploaded: {original_filename}"
     except Exception as e:
+        if strict:
+            raise
         return f"Error extracting text from {original_filename}: {str(e)}"
 
 def extract_text_from_pdf(file_path):
     """Extract text from PDF file"""
+    import PyPDF2
+
     text = ""
     try:
         with open(file_path, 'rb') as file:
@@ -55,6 +61,8 @@ def extract_text_from_txt(file_path):
 
 def extract_text_from_docx(file_path):
     """Extract text from DOCX file"""
+    from docx import Document
+
     try:
         doc = Document(file_path)
         text = ""